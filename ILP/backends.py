@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Open-source solver backends for the matrix form of the formulations.
+
+The builders in modelmatrix.py describe every formulation as a
+solver-neutral LinearModel; this module hands that model to
+  - "gurobi": the solve_multi_vehicle_* functions (builder="matrix"),
+  - "highs":  HiGHS through highspy,
+  - "cpsat":  OR-Tools CP-SAT (multi-worker search, integer rows only),
+  - "scipy":  scipy.optimize.milp, which also runs HiGHS but takes neither
+              threads nor a MIP start.
+The time limit, threads and MIP start (Tours, a result dict or a solved
+model, or the greedy routes with heuristic=True) mean the same on every
+backend, and the result dict has the keys of modelcommon.extract_solution
+plus "backend" and "nodes" ("model" is None outside Gurobi).
+
+GSEC has no static connectivity rows, so outside Gurobi the subtours of
+each solution are cut off with GSEC rows and the model is re-solved until
+no subtour is left. highspy and ortools are only imported when used.
+"""
+
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from gurobipy import GRB
+
+from formulations import BUILDERS, SOLVERS
+from heuristic import greedy_routes
+from modelcommon import arc_arrays, graph
+from modelgsec import _cycle_sets
+from modelmatrix import gsec_matrices, mcf_cluster_matrices, mcf_matrices, mtz_matrices, scf_matrices
+from solution import Tours, as_tours
+
+BACKENDS = ("gurobi", "highs", "cpsat", "scipy")
+
+MATRICES = {
+    "mtz": mtz_matrices,
+    "scf": scf_matrices,
+    "mcf": mcf_matrices,
+    "mcf_cluster": mcf_cluster_matrices,
+    "gsec": gsec_matrices,
+}
+
+# Largest power of ten CP-SAT rows are scaled by to make their coefficients integral
+CPSAT_MAX_SCALE = 6
+
+
+class Problem:
+    """A LinearModel flattened to arrays, plus the GSEC rows added so far."""
+
+    def __init__(self, lm):
+        self.lm = lm
+        self.A, senses, rhs = lm.matrix()
+        self.row_lb = np.where(senses == "<", -np.inf, rhs)
+        self.row_ub = np.where(senses == ">", np.inf, rhs)
+        self.lb, self.ub, self.obj = lm.lb, lm.ub, lm.obj
+        self.integer = np.isin(lm.vtype, ["B", "I"])
+
+    def add_rows(self, rows, lower):
+        self.A = sp.vstack([self.A, rows], format="csr")
+        self.row_lb = np.concatenate([self.row_lb, lower])
+        self.row_ub = np.concatenate([self.row_ub, np.full(len(lower), np.inf)])
+
+
+def _solve_highs(problem, time_limit, threads, seed, start):
+    import highspy
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    h.setOptionValue("time_limit", float(time_limit))
+    h.setOptionValue("threads", int(threads))
+    h.setOptionValue("random_seed", int(seed))
+    lp = highspy.HighsLp()
+    lp.num_col_ = problem.A.shape[1]
+    lp.num_row_ = problem.A.shape[0]
+    lp.col_cost_ = problem.obj
+    lp.col_lower_ = problem.lb
+    lp.col_upper_ = problem.ub
+    lp.row_lower_ = np.where(np.isinf(problem.row_lb), -highspy.kHighsInf, problem.row_lb)
+    lp.row_upper_ = np.where(np.isinf(problem.row_ub), highspy.kHighsInf, problem.row_ub)
+    lp.sense_ = highspy.ObjSense.kMaximize
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.start_ = problem.A.indptr
+    lp.a_matrix_.index_ = problem.A.indices
+    lp.a_matrix_.value_ = problem.A.data
+    lp.integrality_ = [highspy.HighsVarType.kInteger if i else highspy.HighsVarType.kContinuous
+                       for i in problem.integer]
+    h.passModel(lp)
+    if start is not None:
+        solution = highspy.HighsSolution()
+        solution.col_value = list(start)
+        solution.value_valid = True
+        h.setSolution(solution)
+    h.run()
+
+    status = h.getModelStatus()
+    info = h.getInfo()
+    has_solution = info.primal_solution_status == 2     # kSolutionStatusFeasible
+    if status == highspy.HighsModelStatus.kOptimal:
+        code = GRB.OPTIMAL
+    elif status == highspy.HighsModelStatus.kInfeasible:
+        code = GRB.INFEASIBLE
+    elif status == highspy.HighsModelStatus.kTimeLimit:
+        code = GRB.TIME_LIMIT
+    else:
+        code = GRB.INTERRUPTED
+    values = np.array(h.getSolution().col_value) if has_solution else None
+    return code, values, info.mip_dual_bound, info.mip_node_count
+
+
+def _integral_row(coefs, rhs):
+    # Scale a row to integer coefficients; CP-SAT has no continuous coefficients
+    for power in range(CPSAT_MAX_SCALE + 1):
+        scaled = coefs * 10 ** power
+        if np.allclose(scaled, np.round(scaled)) and (np.isinf(rhs).all() or
+                                                      np.allclose(rhs * 10 ** power, np.round(rhs * 10 ** power))):
+            return np.round(scaled).astype(np.int64), 10 ** power
+    raise ValueError("CP-SAT needs rows with (scaled) integer coefficients")
+
+
+def _solve_cpsat(problem, time_limit, threads, seed, start):
+    from ortools.sat.python import cp_model
+
+    if not (np.allclose(problem.lb, np.round(problem.lb)) and np.allclose(problem.ub, np.round(problem.ub))):
+        raise ValueError("CP-SAT needs integer variable bounds")
+    # u (MTZ) and f (SCF/MCF) have integral optimal values, so every column can be integer
+    model = cp_model.CpModel()
+    variables = [model.NewIntVar(int(lo), int(hi), f"v{k}")
+                 for k, (lo, hi) in enumerate(zip(problem.lb, problem.ub))]
+    A = problem.A
+    for r in range(A.shape[0]):
+        cols = A.indices[A.indptr[r]:A.indptr[r + 1]]
+        coefs, scale = _integral_row(A.data[A.indptr[r]:A.indptr[r + 1]], np.array([problem.row_lb[r],
+                                                                                    problem.row_ub[r]]))
+        expr = cp_model.LinearExpr.WeightedSum([variables[c] for c in cols], coefs.tolist())
+        lo, hi = problem.row_lb[r] * scale, problem.row_ub[r] * scale
+        if lo == hi:
+            model.Add(expr == int(round(lo)))
+        else:
+            if not np.isinf(lo):
+                model.Add(expr >= int(np.ceil(lo - 1e-9)))
+            if not np.isinf(hi):
+                model.Add(expr <= int(np.floor(hi + 1e-9)))
+    objective = np.flatnonzero(problem.obj)
+    obj_coefs, _ = _integral_row(problem.obj[objective], np.array([np.inf]))
+    model.Maximize(cp_model.LinearExpr.WeightedSum([variables[c] for c in objective], obj_coefs.tolist()))
+    if start is not None:
+        for variable, value in zip(variables, start):
+            model.AddHint(variable, int(round(value)))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = float(time_limit)
+    solver.parameters.num_workers = int(threads)
+    solver.parameters.random_seed = int(seed)
+    status = solver.Solve(model)
+
+    codes = {cp_model.OPTIMAL: GRB.OPTIMAL, cp_model.FEASIBLE: GRB.TIME_LIMIT, cp_model.INFEASIBLE: GRB.INFEASIBLE,
+             cp_model.UNKNOWN: GRB.TIME_LIMIT}
+    has_solution = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    values = np.array([solver.Value(v) for v in variables], dtype=float) if has_solution else None
+    scale = problem.obj[objective][0] / obj_coefs[0] if len(objective) else 1.0
+    return codes.get(status, GRB.INTERRUPTED), values, solver.BestObjectiveBound() * scale, solver.NumBranches()
+
+
+def _solve_scipy(problem, time_limit, threads, seed, start):
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    res = milp(-problem.obj, integrality=problem.integer.astype(int), bounds=Bounds(problem.lb, problem.ub),
+               constraints=LinearConstraint(problem.A, problem.row_lb, problem.row_ub),
+               options={"time_limit": float(time_limit), "disp": False})
+    codes = {0: GRB.OPTIMAL, 1: GRB.TIME_LIMIT, 2: GRB.INFEASIBLE, 3: GRB.UNBOUNDED}
+    bound = -res.mip_dual_bound if getattr(res, "mip_dual_bound", None) is not None else None
+    return codes.get(res.status, GRB.INTERRUPTED), res.x, bound, getattr(res, "mip_node_count", None)
+
+
+_SOLVE = {
+    "highs": _solve_highs,
+    "cpsat": _solve_cpsat,
+    "scipy": _solve_scipy,
+}
+
+
+def _gsec_rows(lm, cycles):
+    # x(δ⁺(S)) - y_i >= 0 for every cycle S and i ∈ S
+    tail, head = np.array(lm.blocks["x"][2]).T
+    ypos = {i: k for k, i in enumerate(lm.blocks["y"][2])}
+    x_offset, y_offset = lm.blocks["x"][0], lm.blocks["y"][0]
+    rows, cols, vals = [], [], []
+    num_rows = 0
+    for S in cycles:
+        leaving = np.flatnonzero(np.isin(tail, S) & ~np.isin(head, S)) + x_offset
+        for i in S:
+            rows += [num_rows] * (len(leaving) + 1)
+            cols += leaving.tolist() + [y_offset + ypos[i]]
+            vals += [1.0] * len(leaving) + [-1.0]
+            num_rows += 1
+    return sp.csr_matrix((vals, (rows, cols)), shape=(num_rows, lm.num_vars))
+
+
+def _result(lm, instance, m, tmax, seed, values, status, bound, runtime, build_time, nodes, backend):
+    has_solution = values is not None
+    blocks = {}
+    for name in ("x", "y", "z"):
+        offset, size, keys = lm.blocks[name]
+        blocks[name] = dict(zip(keys, values[offset:offset + size])) if has_solution else {}
+    objective = float(lm.obj @ values) if has_solution else None
+    solution = {
+        "model": None,
+        "status": status,
+        "objective": objective,
+        "selected_nodes": [i for i, v in blocks["y"].items() if v > 0.5],
+        "covered_clusters": [k for k, v in blocks["z"].items() if v > 0.5],
+        "edges_used": [a for a, v in blocks["x"].items() if v > 0.5],
+        "runtime": runtime,
+        "build_time": build_time,
+        "vehicles_used": sum(1 for (i, j), v in blocks["x"].items() if i == 1 and v > 0.5),
+        "gap": None,
+        "bound": bound if has_solution else None,
+        "config": {"m": m, "tmax": tmax, "seed": seed},
+        "backend": backend,
+        "nodes": nodes,
+    }
+    if has_solution and bound is not None:
+        solution["gap"] = (bound - objective) / bound if bound != 0 else 0.0
+    return solution
+
+
+def solve_backend(instance, m, formulation, backend="highs", tmax_override=None, time_limit=300, threads=12,
+                  seed=0, heuristic=False, start=None, warm_start_model=None, **gurobi_kwargs):
+    """
+    Solve a formulation on any backend. Options that only exist for Gurobi
+    (builder, model, callbacks, lazy) are passed on to it; the other
+    backends always solve the matrix form and raise ValueError on any of
+    them they cannot honour. seed is Gurobi's Seed or the random seed of the
+    other solvers.
+    """
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+    if backend == "gurobi":
+        model = gurobi_kwargs.pop("model", None)
+        build_time = 0.0
+        if model is None:
+            build_start = time.perf_counter()
+            build_kwargs = {"builder": "matrix"}
+            build_kwargs.update((key, gurobi_kwargs.pop(key)) for key in ("builder", "lazy") if key in gurobi_kwargs)
+            model = BUILDERS[formulation](instance, m, tmax, **build_kwargs)
+            build_time = time.perf_counter() - build_start
+            if "lazy" in build_kwargs:
+                gurobi_kwargs["lazy"] = build_kwargs["lazy"]
+        model.Params.Seed = seed
+        result = SOLVERS[formulation](instance, m, tmax_override=tmax, time_limit=time_limit, threads=threads,
+                                      heuristic=heuristic, start=start, warm_start_model=warm_start_model,
+                                      model=model, **gurobi_kwargs)
+        result.update(build_time=build_time, backend="gurobi", nodes=model.NodeCount)
+        return result
+    if backend not in _SOLVE:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    # the matrix form without lazy rows is the only model the other backends solve
+    honoured = {"builder": "matrix", "model": None, "lazy": False}
+    unsupported = sorted(key for key, value in gurobi_kwargs.items()
+                         if not (key == "callbacks" and not value) and (key not in honoured or value != honoured[key]))
+    if unsupported:
+        raise ValueError(f"Backend {backend!r} cannot honour {unsupported}, only the gurobi backend does")
+
+    build_start = time.perf_counter()
+    tail, head = arc_arrays(instance)
+    customers = np.array(graph(instance)[1], dtype=np.int64)
+    lm = MATRICES[formulation](instance, tail, head, customers, m, tmax)
+    problem = Problem(lm)
+    build_time = time.perf_counter() - build_start
+
+    # MIP START (optional)
+    if start is None:
+        start = warm_start_model
+    if start is None and heuristic:
+        start = Tours.from_routes(len(instance.xy), greedy_routes(instance, m, tmax))
+    start_vector = None
+    if start is not None:
+        keys = lm.blocks
+        values = as_tours(instance, start).start_values(instance, formulation, keys["x"][2], keys["y"][2],
+                                                        keys["z"][1])
+        start_vector = np.concatenate([values[name] for name in keys])
+
+    solve_start = time.perf_counter()
+    nodes = 0
+    while True:
+        remaining = max(time_limit - (time.perf_counter() - solve_start), 1.0)
+        status, values, bound, block_nodes = _SOLVE[backend](problem, remaining, threads, seed, start_vector)
+        nodes += block_nodes or 0
+        if formulation != "gsec" or values is None:
+            break
+        x_offset, x_size, arcs = lm.blocks["x"]
+        cycles = _cycle_sets(arcs, values[x_offset:x_offset + x_size])
+        if not cycles:
+            break
+        if status != GRB.OPTIMAL:
+            # out of time with subtours left: the bound holds, the solution does not
+            values = None
+            break
+        problem.add_rows(_gsec_rows(lm, cycles), np.zeros(sum(len(S) for S in cycles)))
+    runtime = time.perf_counter() - solve_start
+
+    return _result(lm, instance, m, tmax, seed, values, status, bound, runtime, build_time, nodes, backend)
+
+
+def backend_solver(formulation, backend):
+    """solve(instance, m, **kwargs) for a formulation on a backend, like the entries of formulations.SOLVERS."""
+    def solve(instance, m, **kwargs):
+        return solve_backend(instance, m, formulation, backend, **kwargs)
+    return solve
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the formulations on the shipped instances, with a regression
+check against a stored baseline.
+
+Every (instance, formulation, backend, threads) is solved once per seed,
+one solve at a time so the timings do not compete for cores. Per solve it
+records the build time, solve time, root gap, final gap and nodes explored
+(instrument.py; the open-source backends of backends.py report no root
+gap). The seeds are aggregated with shifted geometric means, as usual for
+MIP benchmarks. The result can be saved as a baseline, and a
+later run compared against it:
+
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json --threshold 0.2
+
+A row regresses when its solve or build time grows by more than the
+threshold (and by more than --min-time seconds, to ignore noise on fast
+solves), when its score drops, or when its final gap grows. The exit code
+is 1 if any row regresses.
+
+--sizes only prints the number of variables, rows and nonzeros of every
+formulation, e.g. to compare mcf with the compact mcf_cluster:
+
+    python benchmark.py --sizes --formulations mcf mcf_cluster --instances eil76s10 pr76s20
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import gurobipy as gp
+import numpy as np
+import pandas as pd
+
+from backends import BACKENDS, MATRICES, solve_backend
+from data import load_instance
+from formulations import BUILDERS, CHECKERS, SOLVERS
+from instrument import solve_instrumented
+from modelcommon import arc_arrays, graph
+
+# Default suite: small to mid-size instances that solve in seconds to minutes
+INSTANCES = ["eil15s3", "pr20s5", "st35s10", "berlin52s10"]
+FORMULATIONS = ["mtz", "scf", "gsec"]
+
+# Shifts of the geometric means (seconds, nodes)
+TIME_SHIFT = 1.0
+NODE_SHIFT = 10.0
+
+KEY = ["instance", "formulation", "backend", "threads"]
+
+
+def shifted_geomean(values, shift):
+    values = np.asarray(values, dtype=float)
+    return float(np.exp(np.mean(np.log(values + shift))) - shift)
+
+
+def _gap(bound, objective):
+    if bound is None or objective is None:
+        return None
+    return (bound - objective) / bound if bound != 0 else 0.0
+
+
+def environment():
+    return {
+        "gurobi": ".".join(map(str, gp.gurobi.version())),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _row(result, seed, build_time, nodes, stats):
+    return {
+        "seed": seed,
+        "status": result["status"],
+        "objective": result["objective"],
+        "build_time": build_time,
+        "solve_time": result["runtime"],
+        "presolve_time": stats.get("presolve_time"),
+        "root_lp_time": stats.get("root_lp_time"),
+        "root_gap": _gap(stats.get("root_bound"), result["objective"]),
+        "gap": result["gap"],
+        "nodes": nodes,
+        "time_to_first_incumbent": stats.get("time_to_first_incumbent"),
+        "primal_integral": stats.get("primal_integral"),
+    }
+
+
+def run_one(instance, formulation, m, tmax, seed, threads, time_limit, builder, backend="gurobi"):
+    """Build and solve one configuration with a fixed seed; returns one benchmark row."""
+    if backend != "gurobi":
+        result = solve_backend(instance, m, formulation, backend, tmax_override=tmax, time_limit=time_limit,
+                               threads=threads, seed=seed)
+        row = _row(result, seed, result["build_time"], result["nodes"], {})
+    elif formulation not in BUILDERS:
+        # colgen builds its master during the solve, so it takes the seed as an option
+        result = solve_instrumented(SOLVERS[formulation], instance, m, tmax_override=tmax, time_limit=time_limit,
+                                    threads=threads, seed=seed)
+        row = _row(result, seed, result["build_time"], result["model"].NodeCount, result["instrumentation"])
+        result["model"].dispose()
+    else:
+        build_start = time.perf_counter()
+        model = BUILDERS[formulation](instance, m, tmax, builder=builder)
+        build_time = time.perf_counter() - build_start
+        model.Params.Seed = seed
+        try:
+            result = solve_instrumented(SOLVERS[formulation], instance, m, tmax_override=tmax, model=model,
+                                        time_limit=time_limit, threads=threads)
+            row = _row(result, seed, build_time, model.NodeCount, result["instrumentation"])
+        finally:
+            model.dispose()
+    row["feasible"] = CHECKERS[formulation](instance, result)[0] if result["objective"] is not None else False
+    return row
+
+
+def model_size(instance, formulation, m, tmax):
+    """(variables, rows, nonzeros) of a formulation, from its matrix form where there is one."""
+    if formulation not in BUILDERS:
+        raise ValueError(f"{formulation} has no model to measure before the solve")
+    if formulation in MATRICES:
+        tail, head = arc_arrays(instance)
+        customers = np.array(graph(instance)[1], dtype=np.int64)
+        return MATRICES[formulation](instance, tail, head, customers, m, tmax).size()
+    model = BUILDERS[formulation](instance, m, tmax)
+    model.update()
+    try:
+        return model.NumVars, model.NumConstrs, model.NumNZs
+    finally:
+        model.dispose()
+
+
+def model_sizes(instance_dir, instances, formulations, m, tmax_factor):
+    """One row per (instance, formulation) with the model size, without solving."""
+    rows = []
+    for name in instances:
+        instance = load_instance(os.path.join(instance_dir, f"{name}.data"))
+        tmax = round(tmax_factor * instance["tmax"])
+        for formulation in formulations:
+            variables, constraints, nonzeros = model_size(instance, formulation, m, tmax)
+            rows.append({"instance": name, "formulation": formulation, "variables": variables,
+                         "rows": constraints, "nonzeros": nonzeros})
+    return pd.DataFrame(rows)
+
+
+def run_benchmark(instance_dir, instances, formulations, seeds, threads_values, m, tmax_factor, time_limit,
+                  builder="matrix", backends=("gurobi",)):
+    """One row per (instance, formulation, backend, threads, seed)."""
+    rows = []
+    for name in instances:
+        instance = load_instance(os.path.join(instance_dir, f"{name}.data")).copy()
+        tmax = round(tmax_factor * instance["tmax"])
+        instance["tmax"] = tmax
+        for formulation in formulations:
+            for backend in backends:
+                for threads in threads_values:
+                    for seed in seeds:
+                        print(f"{name} {formulation} {backend} threads={threads} seed={seed}")
+                        row = {"instance": name, "formulation": formulation, "backend": backend, "threads": threads}
+                        try:
+                            row.update(run_one(instance, formulation, m, tmax, seed, threads, time_limit, builder,
+                                               backend))
+                        except Exception as e:
+                            row["error"] = str(e)
+                            print(f"Error: {e}")
+                        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def aggregate(runs):
+    """
+    Shifted geometric means of times and nodes over the seeds, worst gap and
+    score. Runs that raised are counted under "errors"; a key whose runs all
+    failed keeps a row with runs = 0 and no metrics.
+    """
+    runs = runs.copy()
+    for column in ("build_time", "solve_time", "root_gap", "gap", "nodes", "objective", "feasible"):
+        if column not in runs:
+            # every run errored
+            runs[column] = np.nan
+    keys = pd.MultiIndex.from_frame(runs[KEY].drop_duplicates())
+    solved = runs.dropna(subset=["solve_time"])
+    grouped = solved.groupby(KEY)
+    summary = pd.DataFrame({
+        "runs": grouped.size(),
+        "build_time": grouped["build_time"].agg(shifted_geomean, TIME_SHIFT),
+        "solve_time": grouped["solve_time"].agg(shifted_geomean, TIME_SHIFT),
+        "root_gap": grouped["root_gap"].max(),
+        "gap": grouped["gap"].max(),
+        "nodes": grouped["nodes"].agg(shifted_geomean, NODE_SHIFT),
+        "objective": grouped["objective"].min(),
+        "feasible": grouped["feasible"].all(),
+    }).reindex(keys)
+    summary["runs"] = summary["runs"].fillna(0).astype(int)
+    summary["errors"] = runs.groupby(KEY).size().reindex(keys) - summary["runs"]
+    summary["feasible"] = summary["feasible"].fillna(False).astype(bool)
+    return summary.reset_index()
+
+
+def compare(summary, baseline, threshold=0.2, min_time=0.5, gap_tolerance=1e-4):
+    """
+    Join the summary with a baseline summary and flag the regressed rows. A
+    baseline row without a successful new run, or with more errored runs
+    than before, is a regression; rows new in the summary are only listed.
+    """
+    if "errors" not in baseline:
+        baseline = baseline.assign(errors=0)
+    merged = summary.merge(baseline, on=KEY, how="outer", suffixes=("", "_base"), indicator=True)
+    regressions = []
+    for _, row in merged.iterrows():
+        reasons = []
+        if row["_merge"] == "left_only" or row["runs_base"] == 0:
+            # nothing to compare against
+            regressions.append("")
+            continue
+        if row["_merge"] == "right_only" or row["runs"] == 0:
+            regressions.append("no successful run")
+            continue
+        if row["errors"] > row["errors_base"]:
+            reasons.append(f"errored runs {row['errors_base']:g} -> {row['errors']:g}")
+        for metric in ("solve_time", "build_time"):
+            new, old = row[metric], row[f"{metric}_base"]
+            if new > old * (1 + threshold) and new - old > min_time:
+                reasons.append(f"{metric} {old:.2f}s -> {new:.2f}s")
+        if pd.notna(row["objective_base"]) and (pd.isna(row["objective"]) or
+                                                row["objective"] < row["objective_base"] - 1e-6):
+            reasons.append(f"score {row['objective_base']:g} -> {row['objective']:g}")
+        if pd.notna(row["gap_base"]) and pd.notna(row["gap"]) and row["gap"] > row["gap_base"] + gap_tolerance:
+            reasons.append(f"gap {row['gap_base']:.2%} -> {row['gap']:.2%}")
+        if not row["feasible"]:
+            reasons.append("infeasible")
+        regressions.append("; ".join(reasons))
+    merged["speedup"] = merged["solve_time_base"] / merged["solve_time"]
+    merged["regression"] = regressions
+    return merged.drop(columns="_merge")
+
+
+def save_baseline(path, summary, settings):
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "settings": settings,
+                   "rows": summary.to_dict(orient="records")}, f, indent=1)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        stored = json.load(f)
+    baseline = pd.DataFrame(stored["rows"])
+    if "backend" not in baseline:
+        baseline["backend"] = "gurobi"
+    return stored, baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instance-dir", default="instances")
+    parser.add_argument("--instances", nargs="+", default=INSTANCES)
+    parser.add_argument("--formulations", nargs="+", default=FORMULATIONS, choices=sorted(SOLVERS))
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0, 1, 2])
+    parser.add_argument("--backends", nargs="+", default=["gurobi"], choices=BACKENDS)
+    parser.add_argument("--threads", nargs="+", type=int, default=[1])
+    parser.add_argument("--m", type=int, default=2)
+    parser.add_argument("--tmax-factor", type=float, default=1.0)
+    parser.add_argument("--time-limit", type=float, default=300)
+    parser.add_argument("--builder", choices=["loop", "matrix"], default="matrix")
+    parser.add_argument("--runs", default=None, help="write the per-seed rows to this CSV")
+    parser.add_argument("--save-baseline", default=None, help="store the summary as a baseline JSON")
+    parser.add_argument("--baseline", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    parser.add_argument("--min-time", type=float, default=0.5, help="ignore slowdowns below this many seconds")
+    parser.add_argument("--sizes", action="store_true", help="only print the model sizes, do not solve")
+    args = parser.parse_args()
+
+    if args.sizes:
+        sizes = model_sizes(args.instance_dir, args.instances, args.formulations, args.m, args.tmax_factor)
+        print(sizes.to_string(index=False))
+        return
+
+    settings = {key: getattr(args, key) for key in ("instances", "formulations", "backends", "seeds", "threads",
+                                                    "m", "tmax_factor", "time_limit", "builder")}
+    if args.baseline:
+        stored, baseline = load_baseline(args.baseline)
+        if stored["settings"] != settings:
+            print(f"Warning: baseline settings differ: {stored['settings']}")
+        if stored["environment"] != environment():
+            print(f"Warning: baseline was measured on {stored['environment']}")
+
+    runs = run_benchmark(args.instance_dir, args.instances, args.formulations, args.seeds, args.threads, args.m,
+                         args.tmax_factor, args.time_limit, args.builder, args.backends)
+    if args.runs:
+        runs.to_csv(args.runs, index=False)
+    summary = aggregate(runs)
+
+    with pd.option_context("display.width", 160, "display.max_columns", None):
+        print()
+        print(summary.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        if args.save_baseline:
+            save_baseline(args.save_baseline, summary, settings)
+            print(f"\nBaseline saved: {args.save_baseline}")
+        if args.baseline:
+            merged = compare(summary, baseline, args.threshold, args.min_time)
+            print()
+            print(merged[KEY + ["solve_time_base", "solve_time", "speedup", "gap_base", "gap", "regression"]]
+                  .to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+            regressed = merged[merged["regression"] != ""]
+            if len(regressed):
+                print(f"\n{len(regressed)} regression(s) above {args.threshold:.0%}")
+                sys.exit(1)
+            print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
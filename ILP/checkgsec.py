@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GSEC feasibility checker. Connectivity to the depot, which the separated
+GSEC rows have to guarantee, is checked by validate.py for every formulation.
+
+@author: batuhanatas
+"""
+
+from validate import check_solution
+
+
+def check_gsec_solution(instance, solution):
+    return check_solution(instance, solution, "GSEC")
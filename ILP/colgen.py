@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Route-based column generation (price-and-branch).
+
+The master chooses routes r (each a set of customers starting and ending at
+the depot, with travel time c_r within the route limit) instead of arcs:
+
+    max Σ_k s_k z_k
+        Σ_r λ_r <= m                           Vehicles        (π)
+        Σ_r a_ir λ_r <= 1          for i ∈ N    Visit_i         (μ_i)
+        z_k - Σ_r a_ir λ_r <= 0    for i ∈ C_k  Cover_k_i       (ν_ki)
+        Σ_r c_r λ_r <= m * tmax                TotalTime       (ρ)
+
+Its LP relaxation is solved over a growing set of routes. The pricing
+problem, finding a route with reduced profit
+Σ_{i∈r} (Σ_k ν_ki - μ_i) - ρ c_r - π > 0, is an elementary shortest path
+with a duration limit. It is solved by forward labeling with dominance:
+a label at node j dominates another if it arrives no later, with at least
+the same profit and a subset of the visited customers. A heuristic pass
+(at most PRICING_LABELS labels per node, profitable customers only) runs
+first. The exact pass (at most EXACT_LABELS labels per node, pruning labels
+that cannot complete to a route above π) runs when the heuristic pass
+finds no new customer set, or after STALL_ROUNDS rounds without LP
+improvement. Once labeling is cut short (EXACT_LABELING_TIME), the exact
+pass is a single-route MIP (modeltime.py mtz_time with m = 1) for the rest
+of the solve. Once a complete exact pass proves no route improves the LP,
+the LP value is the bound. Before that, every round gives the
+Lagrangian bound z_RMP - π m + m max(0, p̄), where p̄ bounds the profit
+Σ weights - ρ c_r of any route: the exact maximum if the exact pass
+completed, otherwise a fractional knapsack with every customer i charged
+h_i, a lower bound on its share of the route time (lagrangian_bound()).
+The integer solution comes from the master restricted to the generated
+routes, solved as a MIP; it is reported OPTIMAL only when it reaches the
+bound.
+
+Routes are limited to tmax (per_route=True, as in modeltime.py) or only
+by the total m * tmax (per_route=False, like the arc models). The latter
+allows much longer routes, so pricing gets much harder. The result dict
+is the one of solve_multi_vehicle_mtz, with "model" the master MIP and
+column generation statistics under "colgen".
+
+    python colgen.py instances/pr76s20.data --m 3 --tmax-factor 0.25 --time-limit 60
+"""
+
+import argparse
+import math
+import time
+from collections import deque
+
+import numpy as np
+from gurobipy import Column, GRB, GurobiError, Model, quicksum
+
+from data import load_instance
+from heuristic import greedy_routes, route_time
+from modelcommon import add_callback, optimize
+from modeltime import build_time_model, depot_times
+from solution import Tours, as_tours
+
+# Labels kept per node in the heuristic pricing pass
+PRICING_LABELS = 20
+# Labels kept per node in the exact pass; a pass that hits the cap is not complete
+EXACT_LABELS = 2000
+# Routes added to the master per pricing round
+COLUMNS_PER_ROUND = 50
+# Reduced profit a route needs to enter the master
+RC_TOLERANCE = 1e-6
+# Share of the time limit column generation may use before the MIP
+COLGEN_SHARE = 0.7
+# Heuristic rounds without LP improvement before the exact pass runs anyway
+STALL_ROUNDS = 5
+# Seconds the exact labeling may take before the pricing MIP takes over for the rest of the solve
+EXACT_LABELING_TIME = 2.0
+
+
+class _Label:
+    __slots__ = ("time", "profit", "visited", "route", "alive")
+
+    def __init__(self, time, profit, visited, route):
+        self.time = time
+        self.profit = profit
+        self.visited = visited
+        self.route = route
+        self.alive = True
+
+
+def _insert(bucket, label, max_labels):
+    # Dominance: no later, at least as profitable, a subset of the visited customers
+    for other in bucket:
+        if (other.alive and other.time <= label.time and other.profit >= label.profit
+                and other.visited & ~label.visited == 0):
+            return False
+    for other in bucket:
+        if (other.alive and label.time <= other.time and label.profit >= other.profit
+                and label.visited & ~other.visited == 0):
+            other.alive = False
+    bucket[:] = [other for other in bucket if other.alive]
+    if max_labels is not None and len(bucket) >= max_labels:
+        worst = min(bucket, key=lambda other: other.profit)
+        if worst.profit >= label.profit:
+            return None     # dropped by the cap, not dominated
+        worst.alive = False
+        bucket.remove(worst)
+    bucket.append(label)
+    return True
+
+
+def price_routes(dist, t_back, weights, rho, limit, customers, max_labels=None, max_columns=COLUMNS_PER_ROUND,
+                 deadline=None, heuristic=False, min_profit=None):
+    """
+    Best routes by reduced profit Σ weights - rho * time (the vehicle dual
+    is not subtracted), within limit. Returns (routes with their profits,
+    complete): complete is False if the deadline or the label cap cut the
+    labeling short, or for the heuristic pass (profitable customers only).
+    With min_profit, labels that cannot complete to a route above it are
+    pruned, so only the routes above it are guaranteed to be found.
+    """
+    truncated = heuristic
+    if heuristic:
+        customers = [j for j in customers if weights[j] > RC_TOLERANCE]
+    if min_profit is not None:
+        h = visit_times(dist, limit)
+        items = _knapsack_items(weights, rho, h)
+
+        def hopeless(label):
+            return label.profit + _knapsack(items, limit - label.time, label.visited) <= min_profit + RC_TOLERANCE
+
+    buckets = {j: [] for j in customers}
+    pending = deque()
+    for j in customers:
+        t = dist[0, j - 1]
+        if t + t_back[j] <= limit:
+            label = _Label(t, weights[j] - rho * t, 1 << j, (j,))
+            if min_profit is not None and hopeless(label):
+                continue
+            inserted = _insert(buckets[j], label, max_labels)
+            if inserted:
+                pending.append(label)
+            truncated = truncated or inserted is None
+
+    found = {}
+    while pending:
+        if deadline is not None and time.perf_counter() > deadline:
+            return _best(found, max_columns), False
+        label = pending.popleft()
+        if not label.alive:
+            continue
+        i = label.route[-1]
+        back = dist[i - 1, 0]
+        if label.time + back <= limit:
+            key = frozenset(label.route)
+            profit = label.profit - rho * back
+            if key not in found or found[key][0] < profit:
+                found[key] = (profit, label.route)
+        for j in customers:
+            if label.visited >> j & 1:
+                continue
+            t = label.time + dist[i - 1, j - 1]
+            if t + t_back[j] > limit:
+                continue
+            new = _Label(t, label.profit + weights[j] - rho * dist[i - 1, j - 1], label.visited | 1 << j,
+                         label.route + (j,))
+            if min_profit is not None and hopeless(new):
+                continue
+            inserted = _insert(buckets[j], new, max_labels)
+            if inserted:
+                pending.append(new)
+            truncated = truncated or inserted is None
+    return _best(found, max_columns), not truncated
+
+
+def _best(found, max_columns):
+    return sorted(found.values(), reverse=True)[:max_columns]
+
+
+def visit_times(dist, limit):
+    """
+    h_i <= the share of customer i in the time of any route through it:
+    half its two shortest edges to distinct nodes, or its depot round trip
+    for a single-customer route. Unreachable customers get inf.
+    """
+    others = dist.astype(float) + np.diag(np.full(len(dist), np.inf))
+    two = np.sort(others, axis=1)[:, :2]
+    round_trip = dist[0] + dist[:, 0]
+    h = np.minimum(two.sum(axis=1) / 2.0, round_trip)
+    h[round_trip > limit] = np.inf
+    h[0] = np.inf
+    # indexed by node id like the pricing weights
+    return np.concatenate([[np.inf], h])
+
+
+def pricing_model(instance, limit, threads, seed=0):
+    """One route within limit (modeltime.py mtz_time with m = 1); price_mip() sets its objective."""
+    model = build_time_model(instance, 1, limit, "mtz_time")
+    model.Params.OutputFlag = 0
+    model.Params.Threads = threads
+    model.Params.Seed = seed
+    model.Params.PoolSolutions = COLUMNS_PER_ROUND
+    model.setAttr("Obj", list(model._z.values()), [0.0] * len(model._z))
+    return model
+
+
+def price_mip(model, instance, dist, weights, rho, deadline):
+    """
+    Exact pricing as a MIP, for when labeling is too slow. Returns (routes
+    with their profits, complete, bound): bound is the MIP bound on the
+    best profit, valid even when the deadline cut the solve short.
+    """
+    x, y = model._x, model._y
+    model.setAttr("Obj", list(y.values()), [float(weights[i]) for i in y])
+    model.setAttr("Obj", list(x.values()), [-rho * float(dist[i - 1, j - 1]) for i, j in x])
+    model.Params.TimeLimit = max(deadline - time.perf_counter(), 0.01)
+    model.optimize()
+    found = {}
+    for k in range(model.SolCount):
+        model.Params.SolutionNumber = k
+        for route in Tours.from_x(len(instance.xy), model, model.getAttr("Xn", list(x.values()))).routes():
+            found[frozenset(route)] = (float(weights[route].sum()) - rho * route_time(dist, route), tuple(route))
+    bound = model.ObjBound if model.Status in (GRB.OPTIMAL, GRB.TIME_LIMIT) else GRB.INFINITY
+    bound = bound if bound < GRB.INFINITY else None
+    return _best(found, COLUMNS_PER_ROUND), model.Status == GRB.OPTIMAL, bound
+
+
+def _knapsack_items(weights, rho, h):
+    # (customer, value w_i - ρ h_i, h_i) of the profitable reachable customers, best ratio first
+    reachable = np.isfinite(h)
+    value = np.zeros(len(h))
+    value[reachable] = weights[:len(h)][reachable] - rho * h[reachable]
+    items = np.flatnonzero(reachable & (value > 0))
+    items = items[np.argsort(-value[items] / h[items])]
+    return [(i, float(value[i]), float(h[i])) for i in items.tolist()]
+
+
+def _knapsack(items, room, visited=0):
+    # fractional knapsack over the items not in visited, within room
+    best = 0.0
+    for i, value, weight in items:
+        if room <= 0:
+            break
+        if visited >> i & 1:
+            continue
+        share = min(1.0, room / weight)
+        best += share * value
+        room -= share * weight
+    return best
+
+
+def lagrangian_bound(lp_value, weights, rho, pi, m, h, limit, best_profit=None):
+    """
+    z_RMP - π m + m max(0, p̄): an upper bound on the master LP for any
+    duals. p̄ is best_profit (the exact pricing maximum) if given, else the
+    fractional knapsack max Σ (w_i - ρ h_i) x_i with Σ h_i x_i <= limit,
+    since a route's time is at least Σ_{i∈r} h_i.
+    """
+    if best_profit is None:
+        best_profit = _knapsack(_knapsack_items(weights, rho, h), float(limit))
+    return lp_value - pi * m + m * max(0.0, best_profit)
+
+
+class RouteMaster:
+    """The set-packing master as a Gurobi model; columns are added as routes are priced."""
+
+    def __init__(self, instance, m, tmax):
+        self.instance = instance
+        self.dist = np.asarray(instance.dist, dtype=np.int64)
+        self.customers = list(range(2, len(instance.xy) + 1))
+        self.routes = []
+        self.costs = {}     # customer set -> shortest route time in the master
+
+        model = Model("RouteMaster")
+        model.Params.OutputFlag = 0
+        self.z = model.addVars(len(instance.scores), lb=0.0, ub=1.0, obj=list(map(float, instance.scores)), name="z")
+        model.ModelSense = GRB.MAXIMIZE
+        self.vehicles = model.addConstr(quicksum([]) <= m, "Vehicles")
+        self.visit = {i: model.addConstr(quicksum([]) <= 1, f"Visit_{i}") for i in self.customers}
+        self.cover = {}
+        for k in range(len(instance.scores)):
+            for i in instance.cluster_members(k).tolist():
+                self.cover[k, i] = model.addConstr(self.z[k] <= 0, f"Cover_{k}_{i}")
+        self.total_time = model.addConstr(quicksum([]) <= m * tmax, "TotalTime")
+        self.members = {i: [k for (k, j) in self.cover if j == i] for i in self.customers}
+        self.model = model
+        self.lam = []
+
+    def add_route(self, route):
+        # a known customer set only enters again in a shorter order
+        key = frozenset(route)
+        cost = route_time(self.dist, list(route))
+        if self.costs.get(key, np.inf) <= cost:
+            return False
+        self.costs[key] = cost
+        constrs = [self.vehicles, self.total_time] + [self.visit[i] for i in route]
+        coeffs = [1.0, float(cost)] + [1.0] * len(route)
+        for i in route:
+            constrs += [self.cover[k, i] for k in self.members[i]]
+            coeffs += [-1.0] * len(self.members[i])
+        # no upper bound: Visit_i implies λ <= 1, and a bound's dual would escape the pricing
+        self.lam.append(self.model.addVar(lb=0.0, column=Column(coeffs, constrs),
+                                          name=f"lambda[{len(self.routes)}]"))
+        self.routes.append(list(route))
+        return True
+
+    def duals(self):
+        """Node weights Σ_k ν_ki - μ_i, time price ρ and vehicle price π of the current LP."""
+        weights = np.zeros(len(self.instance.xy) + 1)
+        for i in self.customers:
+            # reduced cost of a route column: -(π + ρ c_r + Σ_i μ_i - Σ_(k,i) ν_ki) in Gurobi's c - A'Pi
+            weights[i] = sum(self.cover[k, i].Pi for k in self.members[i]) - self.visit[i].Pi
+        return weights, self.total_time.Pi, self.vehicles.Pi
+
+
+def solve_colgen(instance, m, tmax_override=None, time_limit=300, warm_start_model=None, builder="loop",
+                 threads=12, model=None, heuristic=True, start=None, callbacks=(), per_route=True, seed=0):
+    """
+    Price-and-branch on the route master. builder and model are accepted for
+    the common signature; the master is always rebuilt, so the Gurobi Seed of
+    the master and the pricing MIP is passed as seed. Greedy routes seed the
+    master unless heuristic=False; a start adds its routes too.
+    """
+    if model is not None:
+        raise ValueError("column generation builds its own master; model= is not supported")
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+    limit = tmax if per_route else m * tmax
+    began = time.perf_counter()
+    deadline = began + COLGEN_SHARE * time_limit
+
+    master = RouteMaster(instance, m, tmax)
+    master.model.Params.Seed = seed
+    dist = master.dist
+    t_back = depot_times(instance)[1]
+    seeds = []
+    if heuristic:
+        seeds += greedy_routes(instance, m, tmax, per_route=per_route)
+    if start is None:
+        start = warm_start_model
+    if start is not None:
+        seeds += as_tours(instance, start).routes()
+    for route in seeds:
+        if route and route_time(dist, route) <= limit:
+            master.add_route(route)
+    for i in master.customers:
+        if dist[0, i - 1] + dist[i - 1, 0] <= limit:
+            master.add_route([i])
+
+    # COLUMN GENERATION on the LP relaxation
+    h = visit_times(dist, limit)
+    iterations = 0
+    lp_optimal = False
+    lagrangian = None
+    pricing_time = 0.0
+    best_lp, stalled = -np.inf, 0
+    mip_pricing = None
+    while time.perf_counter() < deadline:
+        iterations += 1
+        master.model.optimize()
+        weights, rho, pi = master.duals()
+        if master.model.ObjVal > best_lp + RC_TOLERANCE:
+            best_lp, stalled = master.model.ObjVal, 0
+        else:
+            stalled += 1
+        pricing_start = time.perf_counter()
+        columns, _ = price_routes(dist, t_back, weights, rho, limit, master.customers, max_labels=PRICING_LABELS,
+                                  deadline=deadline, heuristic=True)
+        columns = [route for profit, route in columns if profit - pi > RC_TOLERANCE]
+        # re-orderings of customer sets already in the master are not new columns for the heuristic pass
+        added = any([frozenset(route) not in master.costs for route in columns])
+        for route in columns:
+            master.add_route(route)
+        best_profit = None
+        if not added or stalled >= STALL_ROUNDS:
+            # nothing new from the heuristic pass, or a degenerate LP that its columns do not move: price exactly
+            stalled = 0
+            columns, complete = [], False
+            if mip_pricing is None or mip_pricing is False:
+                # labeling until it is once cut short, then the MIP (labeling only, without a license for it)
+                slice_end = deadline if mip_pricing is False else time.perf_counter() + EXACT_LABELING_TIME
+                columns, complete = price_routes(dist, t_back, weights, rho, limit, master.customers,
+                                                 max_labels=EXACT_LABELS, min_profit=pi,
+                                                 deadline=min(deadline, slice_end))
+            if complete:
+                # routes at or below pi were pruned, so pi bounds them
+                best_profit = max(columns[0][0] if columns else 0.0, pi)
+            elif mip_pricing is not False:
+                try:
+                    if mip_pricing is None:
+                        mip_pricing = pricing_model(instance, limit, threads, seed)
+                    mip_columns, complete, best_profit = price_mip(mip_pricing, instance, dist, weights, rho,
+                                                                   deadline)
+                    columns += mip_columns
+                except GurobiError:
+                    # e.g. too large for the license: stay with the labeling
+                    mip_pricing = False
+            lp_optimal = bool(complete and best_profit - pi <= RC_TOLERANCE)
+            added = any([master.add_route(route) for profit, route in columns if profit - pi > RC_TOLERANCE])
+        pricing_time += time.perf_counter() - pricing_start
+        bound = float(lagrangian_bound(master.model.ObjVal, weights, rho, pi, m, h, limit, best_profit))
+        lagrangian = bound if lagrangian is None else min(lagrangian, bound)
+        if not added:
+            break
+    if mip_pricing:
+        mip_pricing.dispose()
+    if not lp_optimal:
+        master.model.optimize()
+    lp_value = master.model.ObjVal
+    colgen_time = time.perf_counter() - began
+
+    # RESTRICTED MASTER MIP
+    mip = master.model
+    mip.setAttr("VType", master.lam, [GRB.BINARY] * len(master.lam))
+    mip.setAttr("VType", list(master.z.values()), [GRB.BINARY] * len(master.z))
+    mip.Params.OutputFlag = 1
+    mip.Params.TimeLimit = max(time_limit - colgen_time, 1.0)
+    mip.Params.Threads = threads
+    mip.Params.MIPFocus = 1
+    for callback in callbacks:
+        add_callback(mip, callback)
+    optimize(mip)
+
+    # RESULT: the dict of solve_multi_vehicle_mtz
+    has_solution = mip.SolCount > 0
+    routes = [route for route, var in zip(master.routes, master.lam) if has_solution and var.X > 0.5]
+    objective = mip.ObjVal if has_solution else None
+    # the restricted MIP only bounds the generated routes; the LP bound holds once pricing is exact
+    bound = lp_value if lp_optimal else lagrangian
+    status = mip.Status
+    if has_solution:
+        if bound is None:
+            status = GRB.TIME_LIMIT
+        else:
+            # scores are integral
+            status = GRB.OPTIMAL if objective >= math.floor(bound + 1e-6) else GRB.SUBOPTIMAL
+    solution = {
+        "model": mip,
+        "status": status,
+        "objective": objective,
+        "selected_nodes": sorted(i for route in routes for i in route),
+        "covered_clusters": [k for k, var in master.z.items() if has_solution and var.X > 0.5],
+        "edges_used": [arc for route in routes for arc in zip([1] + route, route + [1])],
+        "runtime": time.perf_counter() - began,
+        "build_time": colgen_time,
+        "vehicles_used": len(routes),
+        "gap": (bound - objective) / bound if has_solution and bound else None,
+        "bound": bound,
+        "config": {
+            "m": m,
+            "tmax": tmax,
+            "seed": mip.Params.Seed,
+            "per_route": per_route,
+        },
+        "colgen": {
+            "iterations": iterations,
+            "columns": len(master.routes),
+            "lp_value": lp_value,
+            "lp_optimal": lp_optimal,
+            "lagrangian_bound": lagrangian,
+            "pricing_time": pricing_time,
+            "colgen_time": colgen_time,
+        },
+    }
+    return solution
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("instance")
+    parser.add_argument("--m", type=int, default=2)
+    parser.add_argument("--tmax-factor", type=float, default=1.0)
+    parser.add_argument("--time-limit", type=float, default=300)
+    parser.add_argument("--threads", type=int, default=12)
+    parser.add_argument("--total-time", action="store_true", help="limit only the total m * tmax, not every route")
+    args = parser.parse_args()
+
+    instance = load_instance(args.instance)
+    result = solve_colgen(instance, args.m, tmax_override=round(args.tmax_factor * instance["tmax"]),
+                          time_limit=args.time_limit, threads=args.threads, per_route=not args.total_time)
+    print(f"objective {result['objective']}, bound {result['bound']}, status {result['status']}, "
+          f"{result['runtime']:.2f}s {result['colgen']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Optional valid inequalities for the directed formulations, one flag per
+family, and a study of their effect on the root bound:
+  - cluster_links: z_k <= y_i for i ∈ C_k (disaggregates Cluster_k),
+  - two_cycle:     x_ij + x_ji <= y_i and <= y_j for customers i < j,
+  - lifted_mtz:    Desrochers-Laporte lifting of the MTZ rows (mtz only),
+        u_i - u_j + n x_ij + (n-2) x_ji <= n - 1
+        u_j >= Σ_{i∈N} x_ij,   u_i + (n-2) x_1i <= (n-1) y_i
+  - arc_links:     x_ij <= y_i and x_ij <= y_j for customers,
+  - cover:         cover inequalities Σ_{a∈C} x_a <= |C| - 1 of the TotalTime
+                   knapsack, separated at the nodes by a callback.
+add_cuts() adds them to a built model (any builder), so they also work
+with incremental solves:
+
+    model = BUILDERS["mtz"](instance, m, tmax)
+    add_cuts(model, instance, ["cluster_links", "cover"])
+    result = SOLVERS["mtz"](instance, m, tmax_override=tmax, model=model)
+
+arc_links is implied by the degree rows of the arc models and is only kept
+to confirm that in the study. The study solves every configuration without
+cuts, with each family alone and with all of them, and reports the LP bound
+of the static rows, the root bound after Gurobi's own cuts, the root and
+final gap and the runtime:
+
+    python cuts.py --instances eil15s3 pr20s5 --formulations mtz scf --m 2 --time-limit 120
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from gurobipy import GRB, quicksum
+
+from data import load_instance
+from formulations import BUILDERS, SOLVERS
+from instrument import solve_instrumented
+from modelcommon import add_callback
+
+FAMILIES = ("cluster_links", "two_cycle", "lifted_mtz", "arc_links", "cover")
+
+# Cover cuts are added when violated by more than this
+COVER_TOLERANCE = 1e-4
+
+
+def _add_static(model, instance, family):
+    x, y, z = model._x, model._y, model._z
+    customers = set(y.keys())
+    rows = []
+    if family == "cluster_links":
+        for k, cluster in enumerate(instance['clusters']):
+            for i in cluster["nodes"]:
+                rows.append((z[k] <= y[i], f"ClusterLink_{k}_{i}"))
+
+    elif family == "two_cycle":
+        for i, j in x.keys():
+            if i < j and i in customers and j in customers and (j, i) in x:
+                rows.append((x[i, j] + x[j, i] <= y[i], f"TwoCycle_{i}_{j}_{i}"))
+                rows.append((x[i, j] + x[j, i] <= y[j], f"TwoCycle_{i}_{j}_{j}"))
+
+    elif family == "lifted_mtz":
+        if model._formulation != "mtz":
+            raise ValueError("lifted_mtz needs the mtz formulation")
+        u = model._u
+        n = len(customers)
+        for i, j in x.keys():
+            if i in customers and j in customers:
+                back = (n - 2) * x[j, i] if (j, i) in x else 0
+                rows.append((u[i] - u[j] + n * x[i, j] + back <= n - 1, f"LiftedMTZ_{i}_{j}"))
+        for i in customers:
+            rows.append((u[i] >= quicksum(x[j, i] for j in customers if (j, i) in x), f"LiftedLower_{i}"))
+            if (1, i) in x:
+                rows.append((u[i] + (n - 2) * x[1, i] <= (n - 1) * y[i], f"LiftedUpper_{i}"))
+
+    elif family == "arc_links":
+        for i, j in x.keys():
+            if i in customers:
+                rows.append((x[i, j] <= y[i], f"ArcTail_{i}_{j}"))
+            if j in customers:
+                rows.append((x[i, j] <= y[j], f"ArcHead_{i}_{j}"))
+
+    for row, name in rows:
+        model.addConstr(row, name)
+    return len(rows)
+
+
+def separate_cover(model, where):
+    # Callback: most violated cover of the TotalTime knapsack at the node LP (greedy on (1 - x) / t)
+    if where != GRB.Callback.MIPNODE or model.cbGet(GRB.Callback.MIPNODE_STATUS) != GRB.OPTIMAL:
+        return
+    capacity = model._limits[2].RHS
+    x_val = np.array(model.cbGetNodeRel(model._cover_vars))
+    ratio = (1.0 - x_val) / np.maximum(model._cover_times, 1e-9)
+    order = np.lexsort((-model._cover_times, ratio))
+    total = np.cumsum(model._cover_times[order])
+    size = int(np.searchsorted(total, capacity, side="right")) + 1
+    if size > len(order):
+        return
+    cover = order[:size]
+    if x_val[cover].sum() > size - 1 + COVER_TOLERANCE:
+        # extended cover: every arc at least as long as the longest one in the cover
+        extended = np.flatnonzero(model._cover_times >= model._cover_times[cover].max())
+        members = np.union1d(cover, extended)
+        model.cbCut(quicksum(model._cover_vars[a] for a in members) <= size - 1)
+        model._cover_cuts += 1
+
+
+def add_cuts(model, instance, families):
+    """Add the chosen families to a built directed model; returns the number of static rows per family."""
+    if model._formulation.endswith("_sym"):
+        raise ValueError("the cut families are defined for the directed formulations")
+    unknown = set(families) - set(FAMILIES)
+    if unknown:
+        raise ValueError(f"Unknown cut families {sorted(unknown)}, expected some of {FAMILIES}")
+    added = {family: _add_static(model, instance, family) for family in families if family != "cover"}
+    if "cover" in families:
+        travel_time = instance['travel_time']
+        model._cover_vars = list(model._x.values())
+        model._cover_times = np.array([travel_time[i, j] for i, j in model._x.keys()], dtype=float)
+        model._cover_cuts = 0
+        model.Params.PreCrush = 1
+        add_callback(model, separate_cover)
+    model._cut_families = tuple(families)
+    return added
+
+
+def _lp_bound(model):
+    relaxed = model.relax()
+    relaxed.Params.OutputFlag = 0
+    relaxed.optimize()
+    bound = relaxed.ObjVal if relaxed.Status == GRB.OPTIMAL else None
+    relaxed.dispose()
+    return bound
+
+
+def _gap(bound, objective):
+    if bound is None or objective is None:
+        return None
+    return (bound - objective) / bound if bound != 0 else 0.0
+
+
+def run_cut_study(instance_dir, instances, formulations, configurations, m, tmax_factor, time_limit, threads=1):
+    """One row per (instance, formulation, cut configuration)."""
+    rows = []
+    for name in instances:
+        instance = load_instance(os.path.join(instance_dir, f"{name}.data")).copy()
+        tmax = round(tmax_factor * instance["tmax"])
+        instance["tmax"] = tmax
+        for formulation in formulations:
+            for families in configurations:
+                # lifted_mtz only applies to mtz; lifted_mtz alone would repeat "none" elsewhere
+                applicable = tuple(f for f in families if f != "lifted_mtz" or formulation == "mtz")
+                if families and not applicable:
+                    continue
+                label = "+".join(applicable) or "none"
+                print(f"{name} {formulation} cuts={label}")
+                row = {"instance": name, "formulation": formulation, "cuts": label}
+                try:
+                    model = BUILDERS[formulation](instance, m, tmax)
+                    added = add_cuts(model, instance, applicable)
+                    model.update()
+                    lp_bound = _lp_bound(model)
+                    result = solve_instrumented(SOLVERS[formulation], instance, m, tmax_override=tmax, model=model,
+                                                time_limit=time_limit, threads=threads)
+                    stats = result["instrumentation"]
+                    row.update({
+                        "rows_added": sum(added.values()),
+                        "lp_bound": lp_bound,
+                        "root_bound": stats["root_bound"],
+                        "root_gap": _gap(stats["root_bound"], result["objective"]),
+                        "bound": result["bound"],
+                        "objective": result["objective"],
+                        "gap": result["gap"],
+                        "runtime": result["runtime"],
+                        "nodes": model.NodeCount,
+                        "cover_cuts": getattr(model, "_cover_cuts", 0),
+                    })
+                    model.dispose()
+                except Exception as e:
+                    row["error"] = str(e)
+                    print(f"Error: {e}")
+                rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instance-dir", default="instances")
+    parser.add_argument("--instances", nargs="+", default=["eil15s3", "pr20s5"])
+    parser.add_argument("--formulations", nargs="+", default=["mtz", "scf"],
+                        choices=sorted(f for f in BUILDERS if not f.endswith("_sym")))
+    parser.add_argument("--families", nargs="+", default=list(FAMILIES), choices=FAMILIES,
+                        help="families tried alone and together")
+    parser.add_argument("--m", type=int, default=2)
+    parser.add_argument("--tmax-factor", type=float, default=1.0)
+    parser.add_argument("--time-limit", type=float, default=300)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the rows to this CSV")
+    args = parser.parse_args()
+
+    configurations = [()] + [(family,) for family in args.families]
+    if len(args.families) > 1:
+        configurations.append(tuple(args.families))
+    rows = run_cut_study(args.instance_dir, args.instances, args.formulations, configurations, args.m,
+                         args.tmax_factor, args.time_limit, args.threads)
+    if args.output:
+        rows.to_csv(args.output, index=False)
+    with pd.option_context("display.width", 160, "display.max_columns", None):
+        print()
+        print(rows.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
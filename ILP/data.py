@@ -6,13 +6,189 @@ Created on Thu Jun 26 16:09:26 2025
 @author: batuhanatas
 """
 
+import hashlib
+import json
 import os
-import math
+import shutil
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+
+class TravelTimeView(Mapping):
+    """
+    Read-only dict-like view over the distance matrix, keyed by (i, j)
+    node ids exactly like the old ``travel_time`` dict.
+    """
+
+    __slots__ = ("_dist",)
+
+    def __init__(self, dist):
+        self._dist = dist
+
+    def __getitem__(self, key):
+        i, j = key
+        if i < 1 or j < 1:
+            raise KeyError(key)
+        try:
+            return int(self._dist[i - 1, j - 1])
+        except IndexError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        try:
+            i, j = key
+        except (TypeError, ValueError):
+            return False
+        n = self._dist.shape[0]
+        return 1 <= i <= n and 1 <= j <= n
+
+    def __iter__(self):
+        n = self._dist.shape[0]
+        for i in range(1, n + 1):
+            for j in range(1, n + 1):
+                yield (i, j)
+
+    def __len__(self):
+        return self._dist.shape[0] ** 2
+
+
+class Instance(Mapping):
+    """
+    Compact instance: coordinates, clusters and travel times are stored as
+    NumPy arrays. Node ids are 1..|V| and node i lives at row i - 1.
+    Cluster k (0-based, in file order) owns
+    ``cluster_nodes[cluster_ptr[k]:cluster_ptr[k + 1]]`` and node i belongs
+    to ``node_clusters[node_ptr[i - 1]:node_ptr[i]]``.
+
+    The old dict keys ('coords', 'clusters', 'travel_time', ...) are still
+    available through ``instance[key]`` and are built lazily on first use.
+
+    ``arc_mask`` is None for the complete digraph, otherwise a boolean
+    |V| x |V| matrix of the arcs the models may use (see preprocess.py).
+    """
+
+    __slots__ = (
+        "filename", "num_nodes", "num_clusters", "tmax",
+        "xy", "dist", "scores", "cluster_ids",
+        "cluster_ptr", "cluster_nodes", "node_ptr", "node_clusters", "arc_mask",
+        "_coords", "_clusters", "_travel_time",
+    )
+
+    _KEYS = ("filename", "num_nodes", "num_clusters", "tmax", "coords", "clusters", "travel_time")
+    _SCALARS = ("filename", "num_nodes", "num_clusters", "tmax")
+
+    def __init__(self, filename, num_nodes, num_clusters, tmax, xy, scores, cluster_ids,
+                 cluster_ptr, cluster_nodes, dist=None, arc_mask=None):
+        self.filename = filename
+        self.num_nodes = num_nodes
+        self.num_clusters = num_clusters
+        self.tmax = tmax
+        self.xy = xy
+        self.dist = distance_matrix(xy) if dist is None else dist
+        self.scores = scores
+        self.cluster_ids = cluster_ids
+        self.cluster_ptr = cluster_ptr
+        self.cluster_nodes = cluster_nodes
+        self.node_ptr, self.node_clusters = _invert_clusters(len(xy), cluster_ptr, cluster_nodes)
+        self.arc_mask = arc_mask
+        self._coords = None
+        self._clusters = None
+        self._travel_time = None
+
+    # Dict-compatible access
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._SCALARS:
+            raise KeyError(f"{key!r} cannot be assigned on an Instance")
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __repr__(self):
+        return (f"Instance({self.filename!r}, nodes={len(self.xy)}, "
+                f"clusters={len(self.scores)}, tmax={self.tmax})")
+
+    def __getstate__(self):
+        # The lazy views are rebuilt on demand, only ship the arrays
+        return {slot: getattr(self, slot) for slot in Instance.__slots__ if not slot.startswith("_")}
+
+    def __setstate__(self, state):
+        self.arc_mask = None
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self._coords = None
+        self._clusters = None
+        self._travel_time = None
+
+    def copy(self):
+        other = Instance.__new__(Instance)
+        for slot in Instance.__slots__:
+            setattr(other, slot, getattr(self, slot))
+        return other
+
+    # Lazy views
+    @property
+    def coords(self):
+        if self._coords is None:
+            self._coords = {i + 1: (x, y) for i, (x, y) in enumerate(self.xy.tolist())}
+        return self._coords
+
+    @property
+    def clusters(self):
+        if self._clusters is None:
+            ptr = self.cluster_ptr.tolist()
+            members = self.cluster_nodes.tolist()
+            self._clusters = [
+                {"id": cid, "score": score, "nodes": members[ptr[k]:ptr[k + 1]]}
+                for k, (cid, score) in enumerate(zip(self.cluster_ids.tolist(), self.scores.tolist()))
+            ]
+        return self._clusters
+
+    @property
+    def travel_time(self):
+        if self._travel_time is None:
+            self._travel_time = TravelTimeView(self.dist)
+        return self._travel_time
+
+    # Index helpers
+    def cluster_members(self, k):
+        return self.cluster_nodes[self.cluster_ptr[k]:self.cluster_ptr[k + 1]]
+
+    def clusters_of(self, i):
+        return self.node_clusters[self.node_ptr[i - 1]:self.node_ptr[i]]
+
+
+def distance_matrix(xy):
+    # ceil(euclidean), computed on exact integer squares like math.sqrt did
+    dx = xy[:, 0, None] - xy[None, :, 0]
+    dy = xy[:, 1, None] - xy[None, :, 1]
+    return np.ceil(np.sqrt(dx * dx + dy * dy)).astype(np.int32)
+
+
+def _invert_clusters(num_nodes, cluster_ptr, cluster_nodes):
+    # node -> cluster CSR index from the cluster -> node one
+    owner = np.repeat(np.arange(len(cluster_ptr) - 1, dtype=np.int32), np.diff(cluster_ptr))
+    order = np.argsort(cluster_nodes, kind="stable")
+    counts = np.bincount(cluster_nodes - 1, minlength=num_nodes)
+    node_ptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(counts, out=node_ptr[1:])
+    return node_ptr, owner[order]
+
 
 def read_data_file(file_path):
     with open(file_path, 'r') as f:
         lines = [line.strip() for line in f if line.strip()]
-    
+
     # Header
     num_nodes, num_clusters, tmax = map(int, lines[0].split())
 
@@ -21,56 +197,199 @@ def read_data_file(file_path):
     set_start = lines.index("SET_SECTION")
 
     # Nodes
-    coords = {}
-    for line in lines[node_start:set_start]:
-        node_id, x, y = map(int, line.split())
-        coords[node_id] = (x, y)
-    
+    table = np.array(" ".join(lines[node_start:set_start]).split(), dtype=np.int64).reshape(-1, 3)
+    order = np.argsort(table[:, 0], kind="stable")
+    table = table[order]
+    if not np.array_equal(table[:, 0], np.arange(1, len(table) + 1)):
+        raise ValueError("node ids must be 1..|V|")
+    xy = np.ascontiguousarray(table[:, 1:])
+
     # Clusters
-    clusters = []
+    cluster_ids, scores, ptr, members = [], [], [0], []
     for line in lines[set_start + 1:]:
-        parts = list(map(int, line.split()))
-        cluster_id, score, *members = parts
-        clusters.append({
-            "id": cluster_id,
-            "score": score,
-            "nodes": members
-        })
-    
-    # Travel times
-    travel_time = {}
-    for i in coords:
-        for j in coords:
-            if i == j:
-                travel_time[(i, j)] = 0
-            else:
-                xi, yi = coords[i]
-                xj, yj = coords[j]
-                dist = math.ceil(math.sqrt((xi - xj) ** 2 + (yi - yj) ** 2))
-                travel_time[(i, j)] = dist
-    
-    return {
-        "filename": os.path.basename(file_path),
-        "num_nodes": num_nodes,
-        "num_clusters": num_clusters,
-        "tmax": tmax,
-        "coords": coords,
-        "clusters": clusters,
-        "travel_time": travel_time
-    }
+        cluster_id, score, *nodes = map(int, line.split())
+        cluster_ids.append(cluster_id)
+        scores.append(score)
+        members.extend(nodes)
+        ptr.append(len(members))
+    cluster_nodes = np.array(members, dtype=np.int32)
+    if len(cluster_nodes) and (cluster_nodes.min() < 1 or cluster_nodes.max() > len(xy)):
+        raise ValueError("cluster refers to an unknown node")
+
+    return Instance(
+        filename=os.path.basename(file_path),
+        num_nodes=num_nodes,
+        num_clusters=num_clusters,
+        tmax=tmax,
+        xy=xy,
+        scores=np.array(scores, dtype=np.int64),
+        cluster_ids=np.array(cluster_ids, dtype=np.int64),
+        cluster_ptr=np.array(ptr, dtype=np.int64),
+        cluster_nodes=cluster_nodes,
+    )
+
+# Binary instance cache: one directory of .npy arrays per file content hash
+CACHE_VERSION = 1
+_CACHED_ARRAYS = ("xy", "dist", "scores", "cluster_ids", "cluster_ptr", "cluster_nodes",
+                  "node_ptr", "node_clusters")
+_CACHED_SCALARS = ("num_nodes", "num_clusters", "tmax")
+
+
+def file_digest(file_path):
+    h = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _entry_dir(cache_dir, digest):
+    return os.path.join(cache_dir, f"{digest}-v{CACHE_VERSION}")
+
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "index.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(cache_dir, index):
+    # Write-then-rename so concurrent loaders never see a torn file
+    path = os.path.join(cache_dir, "index.json")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+
+
+def _cached_digest(file_path, index):
+    # Only re-hash a file when its mtime or size changed since the last run
+    key = os.path.abspath(file_path)
+    st = os.stat(file_path)
+    record = index.get(key)
+    if record and record[0] == st.st_mtime_ns and record[1] == st.st_size:
+        return record[2]
+    digest = file_digest(file_path)
+    index[key] = [st.st_mtime_ns, st.st_size, digest]
+    return digest
+
+
+def save_instance_cache(instance, entry_dir):
+    tmp = f"{entry_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    for name in _CACHED_ARRAYS:
+        np.save(os.path.join(tmp, f"{name}.npy"), getattr(instance, name))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({name: getattr(instance, name) for name in _CACHED_SCALARS}, f)
+    try:
+        os.rename(tmp, entry_dir)
+    except OSError:
+        # Another process cached the same contents first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_instance_cache(entry_dir, filename):
+    with open(os.path.join(entry_dir, "meta.json")) as f:
+        state = json.load(f)
+    for name in _CACHED_ARRAYS:
+        state[name] = np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode="r")
+    state["filename"] = filename
+    instance = Instance.__new__(Instance)
+    instance.__setstate__(state)
+    return instance
+
+
+def _parse_into_cache(file_path, entry_dir):
+    # Returns the parsed instance only when it could not be cached
+    instance = read_data_file(file_path)
+    if entry_dir is None:
+        return instance
+    try:
+        save_instance_cache(instance, entry_dir)
+    except OSError:
+        return instance
+    return None
+
+
+def load_instance(file_path, cache_dir=None):
+    """
+    read_data_file through the binary cache. Cached arrays are memory-mapped,
+    so a hit costs a stat and a few small reads regardless of |V|.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(file_path) or ".", ".cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    index = _read_index(cache_dir)
+    digest = _cached_digest(file_path, index)
+    _write_index(cache_dir, index)
+    entry = _entry_dir(cache_dir, digest)
+    if not os.path.isdir(entry):
+        instance = _parse_into_cache(file_path, entry)
+        if instance is not None:
+            return instance
+    return load_instance_cache(entry, os.path.basename(file_path))
+
 
 # Load all .data files from a folder
-def load_all_data_files(folder_path="instances"):
+def load_all_data_files(folder_path="instances", cache=True, cache_dir=None, workers=None):
+    """
+    Cache misses (new or modified files) are parsed on a process pool when
+    there are enough of them; pass workers=1 to force serial parsing.
+    """
     data_files = [f for f in os.listdir(folder_path) if f.endswith('.data')]
-    instances = []
-    for fname in data_files:
-        path = os.path.join(folder_path, fname)
+    paths = [os.path.join(folder_path, fname) for fname in data_files]
+    if cache:
+        if cache_dir is None:
+            cache_dir = os.path.join(folder_path, ".cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        index = _read_index(cache_dir)
+
+    # Resolve cache hits up front, collect the files that need parsing
+    loaded = {}
+    misses = {}
+    for fname, path in zip(data_files, paths):
         try:
-            instance = read_data_file(path)
-            instances.append(instance)
+            if not cache:
+                misses[fname] = (path, None)
+                continue
+            entry = _entry_dir(cache_dir, _cached_digest(path, index))
+            if os.path.isdir(entry):
+                loaded[fname] = load_instance_cache(entry, fname)
+            else:
+                misses[fname] = (path, entry)
         except Exception as e:
             print(f"❌ Error in {fname}: {e}")
-    return instances
+    if cache:
+        _write_index(cache_dir, index)
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(misses) >= 8 else 1
+
+    def finish(fname, result):
+        if result is None:
+            result = load_instance_cache(misses[fname][1], fname)
+        loaded[fname] = result
+
+    if workers > 1 and len(misses) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_parse_into_cache, path, entry): fname
+                       for fname, (path, entry) in misses.items()}
+            for future in as_completed(futures):
+                fname = futures[future]
+                try:
+                    finish(fname, future.result())
+                except Exception as e:
+                    print(f"❌ Error in {fname}: {e}")
+    else:
+        for fname, (path, entry) in misses.items():
+            try:
+                finish(fname, _parse_into_cache(path, entry))
+            except Exception as e:
+                print(f"❌ Error in {fname}: {e}")
+
+    return [loaded[fname] for fname in data_files if fname in loaded]
 
 # Print summary
 def print_instance_summary(instances):
@@ -78,7 +397,3 @@ def print_instance_summary(instances):
         print(f"\n File: {inst['filename']}")
         print(f"  → Nodes: {inst['num_nodes']}, Clusters: {inst['num_clusters']}, Tmax: {inst['tmax']}")
         print(f"  → First cluster (if any): {inst['clusters'][0] if inst['clusters'] else 'None'}")
-
-
-
-
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Geographic decomposition for instances too large for one model.
+
+The clusters are split into m regions around the depot, by the angle of
+their centroid (contiguous sectors with the same number of clusters,
+starting at the widest empty sector) or by k-means on the centroids. Each
+region is the sub-instance of its clusters and their members
+(preprocess.restrict_instance), solved for one vehicle with route limit
+tmax; the regions are solved in parallel processes, with any formulation
+of formulations.SOLVERS. Clusters overlap, so a node may belong to several
+regions. When merging, a node visited by several routes stays on the one
+where it costs the least and is dropped from the others, which never
+lengthens a route since travel times satisfy the triangle inequality. The
+merged routes are therefore feasible. An optional repair pass then runs
+2-opt / or-opt and greedy cluster insertion on them across the region
+borders (localsearch.improve_solution).
+
+Since the regions only bound themselves, the quality is measured against
+a full-model bound: pass bound= (a number or a result dict of the full
+model), or full_time_limit= to run the full model warm-started from the
+decomposed solution.
+
+    python decompose.py instances/pr76s20.data --m 3 --method kmeans --formulation colgen --time-limit 60
+"""
+
+import argparse
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from gurobipy import GRB
+from scipy.cluster.vq import kmeans2
+
+from data import load_instance
+from formulations import SOLVERS
+from heuristic import greedy_routes, route_time
+from localsearch import improve_solution
+from preprocess import restore_solution, restrict_instance
+from solution import Tours
+
+METHODS = ("angular", "kmeans")
+
+# Gap below which the full-model bound proves the decomposed solution optimal
+OPTIMAL_GAP = 1e-4
+
+
+def partition_clusters(instance, m, method="angular", seed=0):
+    """Region (0..m-1) of every cluster."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+    xy = np.asarray(instance.xy, dtype=float)
+    num_clusters = len(instance.scores)
+    centroids = np.array([xy[np.asarray(instance.cluster_members(k), dtype=np.int64) - 1].mean(axis=0)
+                          for k in range(num_clusters)]) - xy[0]
+    if method == "kmeans":
+        return kmeans2(centroids, m, seed=seed, minit="++")[1]
+    angles = np.arctan2(centroids[:, 1], centroids[:, 0])
+    order = np.argsort(angles, kind="stable")
+    # start after the widest empty sector, so no region wraps around a dense one
+    gaps = np.diff(np.append(angles[order], angles[order[0]] + 2 * np.pi))
+    order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+    cluster_region = np.empty(num_clusters, dtype=np.int64)
+    for r, part in enumerate(np.array_split(order, m)):
+        cluster_region[part] = r
+    return cluster_region
+
+
+def drop_duplicates(dist, routes):
+    """Visit every node once: a node on several routes stays where removing it would save the least."""
+    routes = [list(route) for route in routes]
+    counts = {}
+    for route in routes:
+        for i in route:
+            counts[i] = counts.get(i, 0) + 1
+    for i in [i for i, count in counts.items() if count > 1]:
+        savings = []
+        for r, route in enumerate(routes):
+            if i in route:
+                pos = route.index(i)
+                prev = route[pos - 1] if pos > 0 else 1
+                after = route[pos + 1] if pos + 1 < len(route) else 1
+                savings.append((dist[prev - 1, i - 1] + dist[i - 1, after - 1] - dist[prev - 1, after - 1], r))
+        keep = min(savings)[1]
+        for _, r in savings:
+            if r != keep:
+                routes[r].remove(i)
+    return [route for route in routes if route]
+
+
+def _solve_region(formulation, region, tmax, time_limit, threads, solve_kwargs):
+    try:
+        result = SOLVERS[formulation](region, 1, tmax_override=tmax, time_limit=time_limit, threads=threads,
+                                      **solve_kwargs)
+        model = result.pop("model")
+        model.dispose()
+        return result, None
+    except Exception as e:
+        return None, str(e)
+
+
+def solve_decomposed(instance, m, formulation="mtz", method="angular", tmax_override=None, time_limit=300,
+                     threads=12, workers=None, repair=True, seed=0, bound=None, full_time_limit=None,
+                     **solve_kwargs):
+    """
+    Solve one region per vehicle and merge the routes. Returns the usual
+    result dict without "model"; "bound" is the full-model bound if one is
+    given or computed, and result["decomposition"] holds the per-region,
+    merged, repaired and full-model statistics.
+    """
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+    began = time.perf_counter()
+    dist = np.asarray(instance.dist, dtype=np.int64)
+
+    # REGIONS as sub-instances
+    cluster_region = partition_clusters(instance, m, method, seed)
+    regions = []
+    for r in range(m):
+        clusters = np.flatnonzero(cluster_region == r)
+        keep = np.unique(np.concatenate([[0]] + [np.asarray(instance.cluster_members(k), dtype=np.int64) - 1
+                                                 for k in clusters]))
+        regions.append(restrict_instance(instance, keep, clusters))
+    build_time = time.perf_counter() - began
+
+    # SOLVE the regions in parallel, one vehicle each
+    workers = workers or m
+    share = max(threads // workers, 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        futures = [pool.submit(_solve_region, formulation, region, tmax, time_limit, share, solve_kwargs)
+                   if len(region.scores) else None for region, _ in regions]
+        outcomes = [future.result() if future is not None else (None, None) for future in futures]
+
+    routes = []
+    entries = []
+    for (region, mapping), (result, error) in zip(regions, outcomes):
+        entry = {"nodes": len(region.xy) - 1, "clusters": len(region.scores)}
+        if result is not None:
+            restore_solution(result, mapping)
+            region_routes = Tours.from_result(instance, result).routes()
+            entry.update({"status": result["status"], "objective": result["objective"],
+                          "bound": result["bound"], "runtime": result["runtime"]})
+        elif error is not None:
+            # a failed region falls back to the construction heuristic
+            region_routes = [mapping["nodes"][np.asarray(route, dtype=np.int64) - 1].tolist()
+                             for route in greedy_routes(region, 1, tmax)]
+            entry["error"] = error
+        else:
+            region_routes = []
+        routes += region_routes
+        entries.append(entry)
+    routes = drop_duplicates(dist, routes)
+    # repair keeps the route limit of the regions' formulation (per route if none was solved)
+    solved = [result for result, _ in outcomes if result is not None]
+    per_route = all(result["config"].get("per_route", False) for result in solved)
+    merged_objective = Tours.from_routes(len(instance.xy), routes).score(instance)
+
+    # REPAIR across the region borders
+    if repair:
+        _, routes = improve_solution(instance, routes, m, tmax, per_route=per_route)
+    tours = Tours.from_routes(len(instance.xy), routes)
+    objective = tours.score(instance)
+
+    # FULL-MODEL bound, given or from a warm-started full solve
+    full = None
+    if isinstance(bound, dict):
+        bound = bound["bound"]
+    if full_time_limit is not None:
+        try:
+            result = SOLVERS[formulation](instance, m, tmax_override=tmax, time_limit=full_time_limit,
+                                          threads=threads, start=tours, **solve_kwargs)
+            result.pop("model").dispose()
+            full = {"status": result["status"], "objective": result["objective"], "bound": result["bound"],
+                    "runtime": result["runtime"]}
+            if result["bound"] is not None:
+                bound = result["bound"] if bound is None else min(bound, result["bound"])
+        except Exception as e:
+            full = {"error": str(e)}
+
+    gap = (bound - objective) / bound if bound else None
+    solution = {
+        "status": GRB.OPTIMAL if gap is not None and gap <= OPTIMAL_GAP else GRB.SUBOPTIMAL,
+        "objective": objective,
+        "selected_nodes": sorted(tours.visited().tolist()),
+        "covered_clusters": tours.covered_clusters(instance).tolist(),
+        "edges_used": [arc for route in routes for arc in zip([1] + route, route + [1])],
+        "runtime": time.perf_counter() - began,
+        "build_time": build_time,
+        "vehicles_used": len(routes),
+        "gap": gap,
+        "bound": bound,
+        "config": {
+            "m": m,
+            "tmax": tmax,
+            "seed": seed,
+            "per_route": per_route,
+        },
+        "decomposition": {
+            "method": method,
+            "formulation": formulation,
+            "regions": entries,
+            "merged_objective": merged_objective,
+            "repaired_objective": objective if repair else None,
+            "route_times": [route_time(dist, route) for route in routes],
+            "full": full,
+        },
+    }
+    return solution
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("instance")
+    parser.add_argument("--m", type=int, default=2)
+    parser.add_argument("--tmax-factor", type=float, default=1.0)
+    parser.add_argument("--formulation", default="mtz", choices=sorted(SOLVERS))
+    parser.add_argument("--method", default="angular", choices=METHODS)
+    parser.add_argument("--time-limit", type=float, default=300, help="per region")
+    parser.add_argument("--threads", type=int, default=12, help="total, split between the regions")
+    parser.add_argument("--no-repair", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--full-time-limit", type=float, default=None,
+                        help="also run the full model, warm-started, for its bound")
+    args = parser.parse_args()
+
+    instance = load_instance(args.instance).copy()
+    instance["tmax"] = round(args.tmax_factor * instance["tmax"])
+    result = solve_decomposed(instance, args.m, args.formulation, args.method, time_limit=args.time_limit,
+                              threads=args.threads, repair=not args.no_repair, seed=args.seed,
+                              full_time_limit=args.full_time_limit)
+    stats = result["decomposition"]
+    for r, entry in enumerate(stats["regions"]):
+        print(f"region {r}: {entry}")
+    print(f"merged {stats['merged_objective']}, repaired {stats['repaired_objective']}, "
+          f"route times {stats['route_times']}, full model {stats['full']}")
+    print(f"objective {result['objective']}, bound {result['bound']}, gap {result['gap']}, "
+          f"{result['runtime']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registry of the available formulations, so drivers can pick them by name.
+The *_sym entries are the undirected variants of modelsym.py, the *_time
+entries the per-route duration models of modeltime.py and mcf_cluster the
+compact MCF with one commodity per cluster (modelmcf.py). colgen
+(colgen.py) builds a new route master on every solve, so it has no entry
+in BUILDERS.
+"""
+
+from functools import partial
+
+from checkgsec import check_gsec_solution
+from checkmcf import check_mcf_solution
+from checkmtz import check_mtz_solution
+from checkscf import check_scf_solution
+from colgen import solve_colgen
+from modelgsec import build_gsec_model, solve_multi_vehicle_gsec
+from modelmcf import build_mcf_cluster_model, build_mcf_model, solve_multi_vehicle_mcf, solve_multi_vehicle_mcf_cluster
+from modelmtz import build_mtz_model, solve_multi_vehicle_mtz
+from modelscf import build_scf_model, solve_multi_vehicle_scf
+from modeltime import build_time_model, solve_multi_vehicle_mtz_time, solve_multi_vehicle_scf_time
+from modelsym import (build_sym_model, solve_multi_vehicle_gsec_sym, solve_multi_vehicle_mcf_sym,
+                      solve_multi_vehicle_scf_sym)
+from validate import check_solution
+
+SOLVERS = {
+    "mtz": solve_multi_vehicle_mtz,
+    "scf": solve_multi_vehicle_scf,
+    "mcf": solve_multi_vehicle_mcf,
+    "mcf_cluster": solve_multi_vehicle_mcf_cluster,
+    "gsec": solve_multi_vehicle_gsec,
+    "scf_sym": solve_multi_vehicle_scf_sym,
+    "mcf_sym": solve_multi_vehicle_mcf_sym,
+    "gsec_sym": solve_multi_vehicle_gsec_sym,
+    "mtz_time": solve_multi_vehicle_mtz_time,
+    "scf_time": solve_multi_vehicle_scf_time,
+    "colgen": solve_colgen,
+}
+
+BUILDERS = {
+    "mtz": build_mtz_model,
+    "scf": build_scf_model,
+    "mcf": build_mcf_model,
+    "mcf_cluster": build_mcf_cluster_model,
+    "gsec": build_gsec_model,
+    "scf_sym": partial(build_sym_model, formulation="scf_sym"),
+    "mcf_sym": partial(build_sym_model, formulation="mcf_sym"),
+    "gsec_sym": partial(build_sym_model, formulation="gsec_sym"),
+    "mtz_time": partial(build_time_model, formulation="mtz_time"),
+    "scf_time": partial(build_time_model, formulation="scf_time"),
+}
+
+CHECKERS = {
+    "mtz": check_mtz_solution,
+    "scf": check_scf_solution,
+    "mcf": check_mcf_solution,
+    "mcf_cluster": partial(check_solution, label="MCF_CLUSTER"),
+    "gsec": check_gsec_solution,
+    "scf_sym": partial(check_solution, label="SCF_SYM"),
+    "mcf_sym": partial(check_solution, label="MCF_SYM"),
+    "gsec_sym": partial(check_solution, label="GSEC_SYM"),
+    "mtz_time": partial(check_solution, label="MTZ_TIME"),
+    "scf_time": partial(check_solution, label="SCF_TIME"),
+    "colgen": partial(check_solution, label="COLGEN"),
+}
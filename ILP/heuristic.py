@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Construction heuristic for the multi-vehicle CPTP, used as a MIP start.
+
+Greedy cluster insertion: repeatedly add the cluster with the best score per
+unit of added travel time, inserting its unvisited nodes at their cheapest
+positions (or on a new route while fewer than m are used), as long as the
+total travel time stays within m * tmax. After every insertion the routes
+are improved with 2-opt and or-opt, which frees time for further clusters.
+
+Routes are lists of customer ids (1-based, depot excluded).
+"""
+
+import time
+
+import numpy as np
+
+from solution import Tours
+
+# Longest segment or-opt tries to move
+OR_OPT_SEGMENT = 3
+
+
+def route_time(dist, route):
+    path = np.array([0] + [i - 1 for i in route] + [0])
+    return int(dist[path[:-1], path[1:]].sum())
+
+
+def _cheapest_insertion(dist, route, node):
+    # (added time, position) of node (1-based) in the route
+    path = np.array([0] + [i - 1 for i in route] + [0])
+    added = dist[path[:-1], node - 1] + dist[node - 1, path[1:]] - dist[path[:-1], path[1:]]
+    pos = int(np.argmin(added))
+    return int(added[pos]), pos
+
+
+def _insert_nodes(dist, routes, nodes, m):
+    """Insert nodes one by one at the globally cheapest position; returns (routes, added time)."""
+    routes = [list(route) for route in routes]
+    remaining = list(nodes)
+    total_added = 0
+    while remaining:
+        best = None
+        for node in remaining:
+            for r, route in enumerate(routes):
+                added, pos = _cheapest_insertion(dist, route, node)
+                if best is None or added < best[0]:
+                    best = (added, node, r, pos)
+            if len(routes) < m:
+                added = int(dist[0, node - 1] + dist[node - 1, 0])
+                if best is None or added < best[0]:
+                    best = (added, node, len(routes), 0)
+        added, node, r, pos = best
+        if r == len(routes):
+            routes.append([])
+        routes[r].insert(pos, node)
+        remaining.remove(node)
+        total_added += added
+    return routes, total_added
+
+
+def two_opt(dist, route):
+    """Reverse segments while that shortens the route (travel times are symmetric)."""
+    path = [0] + [i - 1 for i in route] + [0]
+    improved = True
+    while improved:
+        improved = False
+        for a in range(len(path) - 3):
+            for b in range(a + 2, len(path) - 1):
+                delta = (dist[path[a], path[b]] + dist[path[a + 1], path[b + 1]]
+                         - dist[path[a], path[a + 1]] - dist[path[b], path[b + 1]])
+                if delta < 0:
+                    path[a + 1:b + 1] = reversed(path[a + 1:b + 1])
+                    improved = True
+    return [i + 1 for i in path[1:-1]]
+
+
+def or_opt(dist, route):
+    """Move segments of up to OR_OPT_SEGMENT nodes (either direction) to their best position while that helps."""
+    path = [0] + [i - 1 for i in route] + [0]
+    improved = True
+    while improved:
+        improved = False
+        for length in range(1, min(OR_OPT_SEGMENT, len(path) - 3) + 1):
+            for start in range(1, len(path) - length):
+                end = start + length - 1
+                first, last = path[start], path[end]
+                prev, after = path[start - 1], path[end + 1]
+                gain = dist[prev, first] + dist[last, after] - dist[prev, after]
+                rest = path[:start] + path[end + 1:]
+                best = None
+                for pos in range(1, len(rest)):
+                    a, b = rest[pos - 1], rest[pos]
+                    forward = dist[a, first] + dist[last, b] - dist[a, b]
+                    backward = dist[a, last] + dist[first, b] - dist[a, b]
+                    cost, reverse = min((forward, False), (backward, True))
+                    if cost < gain and (best is None or cost < best[0]):
+                        best = (cost, pos, reverse)
+                if best is not None:
+                    _, pos, reverse = best
+                    segment = path[start:end + 1]
+                    path = rest[:pos] + (segment[::-1] if reverse else segment) + rest[pos:]
+                    improved = True
+                    break
+            if improved:
+                break
+    return [i + 1 for i in path[1:-1]]
+
+
+def improve_routes(dist, routes):
+    return [or_opt(dist, two_opt(dist, route)) for route in routes]
+
+
+def covered_clusters(instance, routes):
+    visited = {i for route in routes for i in route}
+    return [k for k in range(len(instance.scores))
+            if all(i in visited for i in instance.cluster_members(k).tolist())]
+
+
+def greedy_routes(instance, m, tmax, improve=True, per_route=False, routes=None, deadline=None):
+    """
+    Routes of a feasible solution for m vehicles and total time m * tmax (and
+    tmax per route if per_route). Insertion starts from the given feasible
+    routes if any, and stops early at the deadline (a time.perf_counter() value).
+    """
+    dist = np.asarray(instance.dist, dtype=np.int64)
+    scores = np.asarray(instance.scores)
+    budget = m * tmax
+    routes = [list(route) for route in routes] if routes is not None else []
+    total = sum(route_time(dist, route) for route in routes)
+    covered = set(covered_clusters(instance, routes))
+
+    while deadline is None or time.perf_counter() < deadline:
+        visited = {i for route in routes for i in route}
+        best = None
+        for k in range(len(scores)):
+            if k in covered or scores[k] <= 0:
+                continue
+            new_nodes = [i for i in instance.cluster_members(k).tolist() if i not in visited]
+            trial, added = _insert_nodes(dist, routes, new_nodes, m)
+            if total + added > budget:
+                continue
+            if per_route and any(route_time(dist, route) > tmax for route in trial):
+                continue
+            ratio = scores[k] / max(added, 1e-9)
+            if best is None or ratio > best[0]:
+                best = (ratio, trial)
+        if best is None:
+            break
+
+        routes = best[1]
+        if improve:
+            routes = improve_routes(dist, routes)
+        total = sum(route_time(dist, route) for route in routes)
+        covered = set(covered_clusters(instance, routes))
+
+    # Nodes of clusters left partially visited only cost time
+    keep = {i for k in covered for i in instance.cluster_members(k).tolist()}
+    routes = [[i for i in route if i in keep] for route in routes]
+    return [route for route in routes if route]
+
+
+def heuristic_start(model, instance, m, tmax):
+    """Build greedy routes, write them as the MIP start and return their score and runtime."""
+    start = time.perf_counter()
+    per_route = getattr(model, "_per_route", False)
+    tours = Tours.from_routes(len(instance.xy), greedy_routes(instance, m, tmax, per_route=per_route))
+    tours.write_start(model, instance)
+    return {
+        "objective": tours.score(instance),
+        "routes": tours.routes(),
+        "runtime": time.perf_counter() - start,
+    }
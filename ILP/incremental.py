@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Re-solving one instance for a sequence of (m, tmax) configurations.
+
+Only the right-hand sides of the two depot limits and of TotalTime depend on
+m and tmax, so the model is built once and moved between configurations
+with set_limits(). Each solve is MIP-started from the best earlier incumbent
+that still fits (it always does when m and tmax grow).
+
+The optimal score is nondecreasing in m and tmax, so solved configurations
+also bound the others:
+  - an incumbent that fits (m, tmax) is a lower bound for it (for the
+    per-route formulations its longest route must also fit in tmax),
+  - a proven bound of a configuration with m' >= m and tmax' >= tmax is an
+    upper bound for it, as is the total score of the clusters that survive
+    reduce_instance(m, tmax).
+When the two meet the solve is skipped; otherwise they become BestBdStop and
+BestObjStop so Gurobi stops as soon as it has reproved a known value.
+"""
+
+import math
+import time
+from functools import partial
+
+import numpy as np
+from gurobipy import GRB
+
+from formulations import BUILDERS, SOLVERS
+from heuristic import route_time
+from instrument import solve_instrumented
+from preprocess import reduce_instance
+from solution import Tours
+
+# Statuses after which ObjBound is a valid upper bound
+BOUND_STATUSES = (GRB.OPTIMAL, GRB.TIME_LIMIT, GRB.USER_OBJ_LIMIT, GRB.INTERRUPTED, GRB.NODE_LIMIT,
+                  GRB.SOLUTION_LIMIT)
+
+
+def static_upper_bound(instance, m, tmax, route_budget=None):
+    reduced, _, _ = reduce_instance(instance, m, tmax, route_budget=route_budget)
+    return int(reduced.scores.sum())
+
+
+def solve_order(configs):
+    """Largest configuration first (its bound caps all others), then ascending (m, tmax)."""
+    configs = sorted(set(configs))
+    largest = max(configs, key=lambda c: (c[0] * c[1], c))
+    if all(m <= largest[0] and tmax <= largest[1] for m, tmax in configs):
+        configs.remove(largest)
+        return [largest] + configs
+    return configs
+
+
+class PersistentModel:
+    """One Gurobi model per (instance, formulation), re-used across configurations."""
+
+    def __init__(self, instance, formulation, propagate_bounds=True, instrument=False, **solve_kwargs):
+        if formulation not in BUILDERS:
+            raise ValueError(f"{formulation} has no persistent model to reuse across configurations")
+        self.instance = instance
+        self.formulation = formulation
+        self.propagate_bounds = propagate_bounds
+        self.instrument = instrument
+        self.solve_kwargs = solve_kwargs
+        self.model = None
+        self.history = []       # one entry per solved configuration, see _record()
+
+    def _per_route(self):
+        # Before the first build the static bound is only looser, so False is safe
+        return getattr(self.model, "_per_route", False)
+
+    def _fitting(self, m, tmax):
+        # Best earlier incumbent that is feasible for (m, tmax)
+        best = None
+        for entry in self.history:
+            if entry["start"] is None:
+                continue
+            vehicles, travel, longest = entry["usage"]
+            if vehicles <= m and travel <= m * tmax and (longest <= tmax or not self._per_route()):
+                if best is None or entry["objective"] > best["objective"]:
+                    best = entry
+        return best
+
+    def bounds(self, m, tmax):
+        """(lower, upper) on the optimal score of (m, tmax) from the configurations solved so far."""
+        incumbent = self._fitting(m, tmax)
+        lower = incumbent["objective"] if incumbent is not None else None
+        upper = static_upper_bound(self.instance, m, tmax, route_budget=tmax if self._per_route() else None)
+        for entry in self.history:
+            if entry["m"] >= m and entry["tmax"] >= tmax and entry["bound"] is not None:
+                upper = min(upper, entry["bound"])
+        return lower, upper
+
+    def _record(self, m, tmax, result, start, bound):
+        dist = np.asarray(self.instance.dist, dtype=np.int64)
+        routes = Tours.from_result(self.instance, result).routes()
+        travel = sum(route_time(dist, route) for route in routes)
+        longest = max((route_time(dist, route) for route in routes), default=0)
+        solution = {key: value for key, value in result.items() if key != "model"}
+        self.history.append({
+            "m": m,
+            "tmax": tmax,
+            "objective": result["objective"],
+            # scores are integral, so the bound can be rounded down
+            "bound": math.floor(bound + 1e-6) if bound is not None else None,
+            "usage": (result["vehicles_used"], travel, longest),
+            "start": start,
+            "solution": solution,
+        })
+
+    def solve(self, m, tmax):
+        incumbent = self._fitting(m, tmax)
+        lower, upper = self.bounds(m, tmax) if self.propagate_bounds else (None, None)
+
+        if lower is not None and lower >= upper:
+            # Known optimum: reuse the incumbent that attains it
+            result = dict(incumbent["solution"])
+            result.update(status=GRB.OPTIMAL, runtime=0.0, build_time=0.0, gap=0.0, warm_started=False,
+                          config=dict(incumbent["solution"]["config"], m=m, tmax=tmax), bounds={"lower": lower, "upper": upper, "skipped": True})
+            self.history.append(dict(incumbent, m=m, tmax=tmax, bound=upper, solution=result))
+            return result
+
+        build_time = 0.0
+        if self.model is None:
+            build_start = time.perf_counter()
+            build_kwargs = {key: self.solve_kwargs[key] for key in ("builder", "lazy") if key in self.solve_kwargs}
+            self.model = BUILDERS[self.formulation](self.instance, m, tmax, **build_kwargs)
+            build_time = time.perf_counter() - build_start
+
+        model = self.model
+        variables = model.getVars()
+        if incumbent is not None:
+            model.setAttr("Start", variables, incumbent["start"])
+        else:
+            model.setAttr("Start", variables, [GRB.UNDEFINED] * len(variables))
+        model.Params.BestBdStop = lower if lower is not None else -GRB.INFINITY
+        model.Params.BestObjStop = upper if upper is not None else GRB.INFINITY
+
+        solve_kwargs = dict(self.solve_kwargs)
+        if incumbent is not None:
+            solve_kwargs["heuristic"] = False      # the earlier incumbent is the start
+        solve = SOLVERS[self.formulation]
+        if self.instrument:
+            solve = partial(solve_instrumented, solve)
+        result = solve(self.instance, m, tmax_override=tmax, model=model, **solve_kwargs)
+        result["build_time"] = build_time
+        if self.instrument:
+            result["instrumentation"]["build_time"] = build_time
+        result["warm_started"] = incumbent is not None
+
+        start = model.getAttr("X", variables) if model.SolCount > 0 else None
+        bound = model.ObjBound if model.Status in BOUND_STATUSES else None
+        if self.propagate_bounds:
+            result["bounds"] = {"lower": lower, "upper": upper, "skipped": False}
+            if model.Status == GRB.USER_OBJ_LIMIT and start is not None:
+                # Stopped on a propagated bound, so the incumbent is optimal
+                result["gap"] = 0.0
+        if start is not None:
+            self._record(m, tmax, result, start, bound)
+        elif bound is not None:
+            self.history.append({"m": m, "tmax": tmax, "objective": None, "bound": math.floor(bound + 1e-6),
+                                 "usage": None, "start": None, "solution": None})
+        return result
+
+    def dispose(self):
+        if self.model is not None:
+            self.model.dispose()
+            self.model = None
+
+
+def solve_configurations(instance, formulation, configs, **solve_kwargs):
+    """Yield the result of every (m, tmax) in configs, in solve_order(), on one model."""
+    persistent = PersistentModel(instance, formulation, **solve_kwargs)
+    try:
+        for m, tmax in solve_order(configs):
+            yield persistent.solve(m, tmax)
+    finally:
+        persistent.dispose()
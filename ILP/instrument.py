@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Solve instrumentation shared by all formulations.
+
+Trajectory is a MIP callback that records presolve time, root LP time and
+root bound, and every change of the incumbent or the bound as
+(time, primal, dual, nodes). solve_instrumented() runs any
+solve_multi_vehicle_* function with it and stores the summary under
+result["instrumentation"], together with the time to the first incumbent
+and the primal integral, which separates a formulation that is slow because
+of weak bounds from one that is slow because it finds poor incumbents.
+"""
+
+from gurobipy import GRB
+
+
+def _finite(value):
+    return value is not None and abs(value) < GRB.INFINITY
+
+
+class Trajectory:
+    """MIP callback recording (time, primal, dual, nodes) whenever the incumbent or bound changes."""
+
+    def __init__(self):
+        self.points = []
+        self.presolve_time = None
+        self.root_lp_time = None
+        self.root_bound = None
+        self.lazy_seen = 0
+
+    def _add(self, runtime, primal, dual, nodes):
+        primal = primal if _finite(primal) else None
+        dual = dual if _finite(dual) else None
+        if self.points and self.points[-1][1:3] == (primal, dual):
+            return
+        self.points.append((runtime, primal, dual, nodes))
+
+    def __call__(self, model, where):
+        if where in (GRB.Callback.POLLING, GRB.Callback.MESSAGE):
+            return
+        runtime = model.cbGet(GRB.Callback.RUNTIME)
+        if where == GRB.Callback.PRESOLVE:
+            # the last presolve callback marks its end
+            self.presolve_time = runtime
+            return
+        if where == GRB.Callback.MIP and self.presolve_time is None:
+            # no presolve callback (e.g. Presolve=0): the first MIP callback is the closest mark
+            self.presolve_time = runtime
+
+        if where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_NODCNT) == 0:
+            # every root pass until branching starts; the first one is the LP relaxation
+            if self.root_lp_time is None:
+                self.root_lp_time = runtime
+            self.root_bound = model.cbGet(GRB.Callback.MIPNODE_OBJBND)
+        elif where == GRB.Callback.MIPSOL:
+            lazy_added = getattr(model, "_lazy_added", 0)
+            if lazy_added != self.lazy_seen:
+                # cut off by a separation callback, not an incumbent
+                self.lazy_seen = lazy_added
+                return
+            best = model.cbGet(GRB.Callback.MIPSOL_OBJBST)
+            objective = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+            primal = max(best, objective) if _finite(best) else objective
+            self._add(runtime, primal, model.cbGet(GRB.Callback.MIPSOL_OBJBND),
+                      model.cbGet(GRB.Callback.MIPSOL_NODCNT))
+        elif where == GRB.Callback.MIP:
+            self._add(runtime, model.cbGet(GRB.Callback.MIP_OBJBST), model.cbGet(GRB.Callback.MIP_OBJBND),
+                      model.cbGet(GRB.Callback.MIP_NODCNT))
+
+    def summary(self, model, build_time, reference=None):
+        """Trajectory plus derived metrics; reference is the optimum if known (else the final incumbent)."""
+        points = list(self.points)
+        if model.SolCount > 0:
+            points.append((model.Runtime, model.ObjVal, model.ObjBound, model.NodeCount))
+        first = next((t for t, primal, _, _ in points if primal is not None), None)
+        root_lp_time, root_bound = self.root_lp_time, self.root_bound
+        if root_lp_time is None and model.NodeCount <= 1 and model.SolCount > 0:
+            # Solved at the root before any node callback
+            root_lp_time, root_bound = model.Runtime, model.ObjBound
+        if reference is None and model.SolCount > 0:
+            reference = model.ObjVal
+        return {
+            "build_time": build_time,
+            "presolve_time": self.presolve_time,
+            "root_lp_time": root_lp_time,
+            "root_bound": root_bound,
+            "trajectory": points,
+            "time_to_first_incumbent": first,
+            "primal_integral": primal_integral(points, model.Runtime, reference),
+        }
+
+
+def primal_gap(primal, reference):
+    if primal is None or reference is None:
+        return 1.0
+    if primal == reference:
+        return 0.0
+    if primal * reference < 0:
+        return 1.0
+    return abs(reference - primal) / max(abs(reference), abs(primal))
+
+
+def primal_integral(points, runtime, reference):
+    """Integral of the primal gap over [0, runtime], with gap 1 until the first incumbent."""
+    total = 0.0
+    last_time, last_gap = 0.0, 1.0
+    for t, primal, _, _ in points:
+        total += last_gap * (t - last_time)
+        last_time, last_gap = t, primal_gap(primal, reference)
+    return total + last_gap * max(runtime - last_time, 0.0)
+
+
+def solve_instrumented(solve, instance, m, reference=None, **kwargs):
+    """solve(instance, m, **kwargs) with a Trajectory; the summary goes to result['instrumentation']."""
+    trajectory = Trajectory()
+    kwargs["callbacks"] = tuple(kwargs.get("callbacks", ())) + (trajectory,)
+    result = solve(instance, m, **kwargs)
+    model = result["model"]
+    model._callbacks.remove(trajectory)
+    result["instrumentation"] = trajectory.summary(model, result["build_time"], reference)
+    return result
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local search on the incumbents of a running solve.
+
+LocalSearch is a MIP callback for any arc formulation. Every new incumbent
+(MIPSOL) is handed as routes to a background thread, which shortens the
+routes with 2-opt and or-opt and then greedily inserts further clusters
+into the freed time (heuristic.greedy_routes, within m * tmax and, for the
+per-route formulations, tmax per route). An improvement is injected at the
+next MIPNODE callback with cbSetSolution, translated into the model's
+variables by Tours.assignment(). The search runs while Gurobi solves, since
+gurobipy releases the GIL during optimize(); only the newest incumbent is
+queued, and each search stops after search_time seconds.
+
+solve_local_search() runs any solve_multi_vehicle_* function with it and
+stores the statistics under result["local_search"]:
+
+    result = solve_local_search(SOLVERS["mtz"], instance, 3, time_limit=900)
+
+Column generation (colgen.py) has no arc variables and is not supported.
+
+    python localsearch.py instances/eil51s10.data --formulation mtz --m 3 --time-limit 60 --compare
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+from gurobipy import GRB
+
+from data import load_instance
+from formulations import BUILDERS, SOLVERS
+from heuristic import greedy_routes, improve_routes
+from solution import Tours
+
+# Seconds one search may take
+SEARCH_TIME = 2.0
+
+
+def improve_solution(instance, routes, m, tmax, per_route=False, deadline=None):
+    """2-opt / or-opt on feasible routes, then greedy cluster insertion; returns (score, routes)."""
+    dist = np.asarray(instance.dist, dtype=np.int64)
+    routes = greedy_routes(instance, m, tmax, per_route=per_route, routes=improve_routes(dist, routes),
+                           deadline=deadline)
+    return Tours.from_routes(len(instance.xy), routes).score(instance), routes
+
+
+class LocalSearch:
+    """MIP callback improving new incumbents in a background thread and injecting the improvements."""
+
+    def __init__(self, instance, search_time=SEARCH_TIME):
+        self.instance = instance
+        self.search_time = search_time
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.closed = False
+        self.job = None         # newest incumbent not yet searched: (routes, m, tmax, per_route)
+        self.found = None       # best improvement not yet injected: (score, routes)
+        self.best = -1          # best score seen or found
+        self.searches = 0
+        self.improved = 0
+        self.injected = 0
+        self.search_seconds = 0.0
+
+    def _worker(self):
+        while True:
+            self.wake.wait()
+            with self.lock:
+                if self.closed:
+                    return
+                job, self.job = self.job, None
+                self.wake.clear()
+            if job is None:
+                continue
+            began = time.perf_counter()
+            score, routes = improve_solution(self.instance, *job, deadline=began + self.search_time)
+            with self.lock:
+                self.searches += 1
+                self.search_seconds += time.perf_counter() - began
+                if score > self.best:
+                    self.best = score
+                    self.found = (score, routes)
+                    self.improved += 1
+
+    def close(self):
+        """Stop the background thread (after its current search)."""
+        with self.lock:
+            self.closed = True
+            self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def summary(self):
+        return {
+            "searches": self.searches,
+            "improved": self.improved,
+            "injected": self.injected,
+            "search_time": self.search_seconds,
+            "best": self.best if self.best >= 0 else None,
+        }
+
+    def __call__(self, model, where):
+        if where == GRB.Callback.MIPSOL:
+            # score of the depot routes: a separation callback may still cut off subtours of this solution
+            x_val = model.cbGetSolution(list(model._x.values()))
+            tours = Tours.from_x(len(self.instance.xy), model, x_val)
+            score = tours.score(self.instance)
+            depot_out, _, total_time = model._limits
+            m = int(round(depot_out.RHS))
+            with self.lock:
+                # equal scores include the improvements injected by this callback
+                if score <= self.best or self.closed:
+                    return
+                self.best = score
+                self.job = (tours.routes(), m, total_time.RHS / m, getattr(model, "_per_route", False))
+                self.wake.set()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._worker, daemon=True)
+                self.thread.start()
+
+        elif where == GRB.Callback.MIPNODE:
+            with self.lock:
+                found, self.found = self.found, None
+            if found is not None and found[0] > model.cbGet(GRB.Callback.MIPNODE_OBJBST) + 1e-9:
+                tours = Tours.from_routes(len(self.instance.xy), found[1])
+                model.cbSetSolution(*tours.assignment(model, self.instance))
+                # GRB.INFINITY if the routes are infeasible for this formulation
+                if model.cbUseSolution() < GRB.INFINITY:
+                    self.injected += 1
+
+
+def solve_local_search(solve, instance, m, search_time=SEARCH_TIME, **kwargs):
+    """solve(instance, m, **kwargs) with a LocalSearch; its statistics go to result['local_search']."""
+    search = LocalSearch(instance, search_time)
+    kwargs["callbacks"] = tuple(kwargs.get("callbacks", ())) + (search,)
+    try:
+        result = solve(instance, m, **kwargs)
+    finally:
+        search.close()
+    result["model"]._callbacks.remove(search)
+    result["local_search"] = search.summary()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("instance")
+    parser.add_argument("--formulation", default="mtz", choices=sorted(BUILDERS))
+    parser.add_argument("--m", type=int, default=2)
+    parser.add_argument("--tmax-factor", type=float, default=1.0)
+    parser.add_argument("--time-limit", type=float, default=300)
+    parser.add_argument("--threads", type=int, default=12)
+    parser.add_argument("--search-time", type=float, default=SEARCH_TIME)
+    parser.add_argument("--compare", action="store_true", help="also solve without the local search")
+    args = parser.parse_args()
+
+    instance = load_instance(args.instance).copy()
+    instance["tmax"] = round(args.tmax_factor * instance["tmax"])
+    solve = SOLVERS[args.formulation]
+    kwargs = {"time_limit": args.time_limit, "threads": args.threads}
+    results = {"local search": solve_local_search(solve, instance, args.m, args.search_time, **kwargs)}
+    if args.compare:
+        results["plain"] = solve(instance, args.m, **kwargs)
+    for label, result in results.items():
+        print(f"{label:>12}: objective {result['objective']}, bound {result['bound']}, "
+              f"{result['runtime']:.2f}s {result.get('local_search', '')}")
+
+
+if __name__ == "__main__":
+    main()
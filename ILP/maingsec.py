@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+from functools import partial
+from gurobipy import GRB
+from data import load_all_data_files
+from results import ResultStore
+from solvecache import cached_solve
+from instrument import solve_instrumented
+from modelgsec import solve_multi_vehicle_gsec  
+
+# Import feasibility checker
+from checkgsec import check_gsec_solution  
+
+# Configurable parameters
+m_values = [1, 2, 3, 4]
+tmax_factors = [0.5, 0.8, 1.0, 1.2, 1.5]
+time_limit = 900
+builder = "matrix"  # "loop" builds the same model row by row
+
+# Load instances
+instances = load_all_data_files("instances")
+
+# Create output folder
+os.makedirs("results_gsec", exist_ok=True)
+store = ResultStore("results.sqlite")
+solve = partial(solve_instrumented, solve_multi_vehicle_gsec)   # records the solve trajectory
+
+# Run all combinations
+for inst in instances:
+    name = inst["filename"].replace(".data", "")
+    tmax_original = inst["tmax"]
+
+    for m in m_values:
+        for factor in tmax_factors:
+            tmax_scaled = round(factor * tmax_original)
+            print(f"\nSolving {name} with m={m}, tmax={tmax_scaled} ({factor}×)")
+
+            try:
+                # Override tmax manually inside instance copy
+                inst_copy = inst.copy()
+                inst_copy["tmax"] = tmax_scaled
+
+                result = cached_solve(solve, inst_copy, "gsec", m,
+                                      time_limit=time_limit, builder=builder)
+                print(f"Model build time: {result['build_time']:.2f}s")
+
+                # Run feasibility check
+                feasible, reason = check_gsec_solution(inst_copy, result)
+
+                if feasible:
+                    print(f"Feasible solution found. Score: {result['objective']}")
+                else:
+                    print(f"Infeasible solution detected: {reason}")
+
+                # Strip Gurobi model before saving
+                result_to_save = result.copy()
+                if "model" in result_to_save:
+                    del result_to_save["model"]
+                result_to_save["feasibility_check"] = {
+                    "passed": feasible,
+                    "reason": reason
+                }
+
+                # Save
+                suffix = f"m{m}_tmax{tmax_scaled}"
+                filename = f"{name}_gsec_{suffix}.pkl"
+                with open(os.path.join("results_gsec", filename), "wb") as f:
+                    pickle.dump(result_to_save, f)
+
+                store.append(name, "gsec", result_to_save, num_nodes=len(inst_copy.xy))
+                print(f"Saved: {filename}")
+
+            except Exception as e:
+                print(f"Error solving {name} (m={m}, tmax={tmax_scaled}): {e}")
@@ -8,8 +8,12 @@ Updated on Fri Jun 27 2025 — includes feasibility checks
 
 import os
 import pickle
+from functools import partial
 from gurobipy import GRB
 from data import load_all_data_files
+from results import ResultStore
+from solvecache import cached_solve
+from instrument import solve_instrumented
 from modelmcf import solve_multi_vehicle_mcf
 from checkmcf import check_mcf_solution 
 
@@ -17,12 +21,16 @@ from checkmcf import check_mcf_solution
 m = 3
 tmax_factor = 1.0
 time_limit = 900
+builder = "matrix"  # "loop" builds the same model row by row
+lazy = False        # True separates the FlowUse rows in a callback instead
 
 # Load all instances
 instances = load_all_data_files("instances")
 
 # Create output folder
 os.makedirs("results_mcf", exist_ok=True)
+store = ResultStore("results.sqlite")
+solve = partial(solve_instrumented, solve_multi_vehicle_mcf)   # records the solve trajectory
 
 # Run with fixed config
 for inst in instances:
@@ -36,7 +44,11 @@ for inst in instances:
         inst_copy = inst.copy()
         inst_copy["tmax"] = tmax_scaled
 
-        result = solve_multi_vehicle_mcf(inst_copy, m=m, tmax_override=tmax_scaled, time_limit=time_limit)
+        result = cached_solve(solve, inst_copy, "mcf", m,
+                              tmax_override=tmax_scaled, time_limit=time_limit, builder=builder, lazy=lazy)
+        print(f"Model build time: {result['build_time']:.2f}s")
+        if lazy:
+            print(f"Lazy FlowUse rows: {result['lazy_stats']}")
 
         # Feasibility check
         feasible, reason = check_mcf_solution(inst_copy, result)
@@ -62,6 +74,7 @@ for inst in instances:
         with open(path, "wb") as f:
             pickle.dump(result_to_save, f)
 
+        store.append(name, "mcf", result_to_save, num_nodes=len(inst_copy.xy))
         print(f"Saved: {filename}")
 
     except Exception as e:
@@ -3,8 +3,12 @@
 
 import os
 import pickle
+from functools import partial
 from gurobipy import GRB
 from data import load_all_data_files
+from results import ResultStore
+from solvecache import cached_solve
+from instrument import solve_instrumented
 from modelmtz import solve_multi_vehicle_mtz  
 
 # Import feasibility checker
@@ -14,12 +18,15 @@ from checkmtz import check_mtz_solution
 m_values = [1, 2, 3, 4]
 tmax_factors = [0.5, 0.8, 1.0, 1.2, 1.5]
 time_limit = 900
+builder = "matrix"  # "loop" builds the same model row by row
 
 # Load instances
 instances = load_all_data_files("instances")
 
 # Create output folder
 os.makedirs("results_mtz", exist_ok=True)
+store = ResultStore("results.sqlite")
+solve = partial(solve_instrumented, solve_multi_vehicle_mtz)   # records the solve trajectory
 
 # Run all combinations
 for inst in instances:
@@ -36,7 +43,9 @@ for inst in instances:
                 inst_copy = inst.copy()
                 inst_copy["tmax"] = tmax_scaled
 
-                result = solve_multi_vehicle_mtz(inst_copy, m=m, time_limit=time_limit)
+                result = cached_solve(solve, inst_copy, "mtz", m,
+                                      time_limit=time_limit, builder=builder)
+                print(f"Model build time: {result['build_time']:.2f}s")
 
                 # Run feasibility check
                 feasible, reason = check_mtz_solution(inst_copy, result)
@@ -61,6 +70,7 @@ for inst in instances:
                 with open(os.path.join("results_mtz", filename), "wb") as f:
                     pickle.dump(result_to_save, f)
 
+                store.append(name, "mtz", result_to_save, num_nodes=len(inst_copy.xy))
                 print(f"Saved: {filename}")
 
             except Exception as e:
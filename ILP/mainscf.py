@@ -8,8 +8,12 @@ Updated on Fri Jun 27 2025 — includes feasibility checks
 
 import os
 import pickle
+from functools import partial
 from gurobipy import GRB
 from data import load_all_data_files
+from results import ResultStore
+from solvecache import cached_solve
+from instrument import solve_instrumented
 from modelscf import solve_multi_vehicle_scf
 from checkscf import check_scf_solution 
 
@@ -17,12 +21,15 @@ from checkscf import check_scf_solution
 m_values = [1, 2, 3, 4]
 tmax_factors = [0.5, 0.8, 1.0, 1.2, 1.5]
 time_limit = 900
+builder = "matrix"  # "loop" builds the same model row by row
 
 # Load all instances
 instances = load_all_data_files("instances")
 
 # Create output folder
 os.makedirs("results_scf", exist_ok=True)
+store = ResultStore("results.sqlite")
+solve = partial(solve_instrumented, solve_multi_vehicle_scf)   # records the solve trajectory
 
 # Run all combinations
 for inst in instances:
@@ -38,7 +45,9 @@ for inst in instances:
                 inst_copy = inst.copy()
                 inst_copy["tmax"] = tmax_scaled
 
-                result = solve_multi_vehicle_scf(inst_copy, m=m, tmax_override=tmax_scaled, time_limit=time_limit)
+                result = cached_solve(solve, inst_copy, "scf", m,
+                                      tmax_override=tmax_scaled, time_limit=time_limit, builder=builder)
+                print(f"Model build time: {result['build_time']:.2f}s")
 
                 # Feasibility check
                 feasible, reason = check_scf_solution(inst_copy, result)
@@ -64,6 +73,7 @@ for inst in instances:
                 with open(path, "wb") as f:
                     pickle.dump(result_to_save, f)
 
+                store.append(name, "scf", result_to_save, num_nodes=len(inst_copy.xy))
                 print(f"Saved: {filename}")
 
             except Exception as e:
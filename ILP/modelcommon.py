@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the MTZ, SCF and MCF model builders: graph derivation,
+loading a matrix-form model into Gurobi, callback dispatch and bulk
+solution extraction.
+"""
+
+import numpy as np
+from gurobipy import GRB, tupledict
+
+
+def arc_arrays(instance):
+    # Digraph without loops (restricted to instance.arc_mask if set), in (i, j) order
+    n = len(instance['coords'])
+    ids = np.arange(1, n + 1)
+    tail = np.repeat(ids, n)
+    head = np.tile(ids, n)
+    keep = tail != head
+    mask = getattr(instance, "arc_mask", None)
+    if mask is not None:
+        keep &= np.asarray(mask).ravel()
+    return tail[keep], head[keep]
+
+
+def graph(instance):
+    V = list(instance['coords'].keys())
+    N = [i for i in V if i != 1]
+    tail, head = arc_arrays(instance)
+    A = list(zip(tail.tolist(), head.tolist()))
+    return V, N, A
+
+
+def _var_name(name, key):
+    return f"{name}[{','.join(map(str, key)) if isinstance(key, tuple) else key}]"
+
+
+def load_linear_model(model, lm):
+    """
+    Add a modelmatrix.LinearModel to a Gurobi model with one addMVar call and
+    one addMConstr per row block. Keyed blocks are returned as tupledicts of
+    named Vars (like addVars), the others as MVar slices.
+    """
+    xall = model.addMVar(lm.num_vars, lb=lm.lb, ub=lm.ub, obj=lm.obj, vtype=lm.vtype)
+    model.ModelSense = GRB.MAXIMIZE
+
+    handles = {}
+    for name, (offset, size, keys) in lm.blocks.items():
+        block = xall[offset:offset + size]
+        if keys is None:
+            handles[name] = block
+            continue
+        variables = block.tolist()
+        model.setAttr("VarName", variables, [_var_name(name, key) for key in keys])
+        handles[name] = tupledict(zip(keys, variables))
+
+    rows = {}
+    for name, terms, sense, rhs in lm.rows:
+        rows[name] = model.addMConstr(lm.row_matrix(terms), xall, sense, rhs, name=name)
+    return handles, rows
+
+
+def set_limits(model, m, tmax):
+    """Move the m / tmax dependent rows of a built model to a new configuration."""
+    depot_out, depot_in, total_time = model._limits
+    depot_out.RHS = m
+    depot_in.RHS = m
+    total_time.RHS = m * tmax
+    # per-route models (modeltime.py) also have tmax in coefficients and bounds
+    update_tmax = getattr(model, "_update_tmax", None)
+    if update_tmax is not None:
+        update_tmax(model, tmax)
+
+
+def add_callback(model, callback):
+    """Register callback(model, where); optimize() runs all registered callbacks in order."""
+    if not hasattr(model, "_callbacks"):
+        model._callbacks = []
+    if callback not in model._callbacks:
+        model._callbacks.append(callback)
+
+
+def _dispatch(model, where):
+    for callback in model._callbacks:
+        callback(model, where)
+
+
+def optimize(model):
+    if getattr(model, "_callbacks", None):
+        model.optimize(_dispatch)
+    else:
+        model.optimize()
+
+
+def extract_solution(model, instance, m, tmax, build_time):
+    """Result dict of the solve_multi_vehicle_* functions, read with bulk getAttr calls."""
+    clusters = instance['clusters']
+    has_solution = model.SolCount > 0
+    x_val = model.getAttr("X", model._x) if has_solution else {}
+    y_val = model.getAttr("X", model._y) if has_solution else {}
+    z_val = model.getAttr("X", model._z) if has_solution else {}
+
+    solution = {
+        "model": model,
+        "status": model.Status,
+        "objective": model.ObjVal if has_solution else None,
+        "selected_nodes": [i for i, v in y_val.items() if v > 0.5],
+        "covered_clusters": [k for k in range(len(clusters)) if z_val.get(k, 0) > 0.5],
+        "edges_used": [a for a, v in x_val.items() if v > 0.5],
+        "runtime": model.Runtime,
+        "build_time": build_time,
+        "vehicles_used": sum(1 for (i, j), v in x_val.items() if i == 1 and v > 0.5),
+        "gap": None,
+        "bound": model.ObjBound if has_solution else None,
+        "config": {
+            "m": m,
+            "tmax": tmax,
+            "seed": model.Params.Seed
+        }
+    }
+
+    if has_solution and model.ObjBound != 0:
+        solution["gap"] = (model.ObjBound - model.ObjVal) / model.ObjBound
+
+    return solution
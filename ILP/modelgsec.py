@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generalized subtour elimination (GSEC) formulation: only x, y, z variables.
+Connectivity to the depot is enforced by
+
+    x(δ⁺(S)) >= y_i    for all S ⊆ N, i ∈ S,
+
+separated in a callback: on integer solutions via the cycles of the
+solution, on fractional nodes via max-flow/min-cut on the support graph.
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+from gurobipy import Model, GRB, quicksum
+
+from heuristic import heuristic_start
+from modelcommon import add_callback, arc_arrays, extract_solution, graph, load_linear_model, optimize, set_limits
+from modelmatrix import gsec_matrices
+from solution import as_tours
+
+# Minimum violation for a fractional GSEC to be added as a cut
+CUT_TOLERANCE = 1e-3
+
+
+def build_gsec_model(instance, m, tmax, builder="loop"):
+    V, N, A = graph(instance)
+    travel_time = instance['travel_time']
+    clusters = instance['clusters']
+
+    model = Model("MultiVehicleGSEC")
+
+    if builder == "matrix":
+        tail, head = arc_arrays(instance)
+        handles, rows = load_linear_model(model, gsec_matrices(instance, tail, head, np.array(N, dtype=np.int64),
+                                                               m, tmax))
+        x, y, z = handles["x"], handles["y"], handles["z"]
+        depot_out, depot_in, total_time = (rows[name].tolist()[0]
+                                           for name in ("DepotOutLimit", "DepotInLimit", "TotalTime"))
+
+    elif builder == "loop":
+        # VARIABLES
+        x = model.addVars(A, vtype=GRB.BINARY, name="x")                     # tour arcs
+        y = model.addVars(N, vtype=GRB.BINARY, name="y")                     # node visited
+        z = model.addVars(len(clusters), vtype=GRB.BINARY, name="z")        # cluster covered
+
+        # OBJECTIVE: maximize total score of covered clusters
+        model.setObjective(quicksum(clusters[k]["score"] * z[k] for k in range(len(clusters))), GRB.MAXIMIZE)
+
+        # 1. DEPOT constraints
+        depot_out = model.addConstr(x.sum(1, '*') <= m, "DepotOutLimit")
+        depot_in = model.addConstr(x.sum('*', 1) <= m, "DepotInLimit")
+        model.addConstr(x.sum(1, '*') == x.sum('*', 1), "DepotBalance")
+
+        # 2. DEGREE constraints
+        for i in N:
+            model.addConstr(x.sum(i, '*') == y[i], f"Out_{i}")
+            model.addConstr(x.sum('*', i) == y[i], f"In_{i}")
+
+        # 3. TOTAL TIME constraint
+        total_time = model.addConstr(quicksum(travel_time[i, j] * x[i, j] for i, j in A) <= m * tmax, "TotalTime")
+
+        # 4. CLUSTER COVERAGE constraints
+        for k, cluster in enumerate(clusters):
+            model.addConstr(quicksum(y[i] for i in cluster["nodes"]) >= len(cluster["nodes"]) * z[k], f"Cluster_{k}")
+
+    else:
+        raise ValueError(f"Unknown builder {builder!r}, expected 'loop' or 'matrix'")
+
+    # 5. GSEC rows are added by separate_gsec()
+    model._x, model._y, model._z = x, y, z
+    model._formulation = "gsec"
+    model._limits = (depot_out, depot_in, total_time)
+    model._arcs = A
+    model._x_vars = list(x.values())
+    model._lazy_added = 0
+    model._cuts_added = 0
+    return model
+
+
+def _cycle_sets(arcs, x_val):
+    # Node sets of the cycles in an integer solution that never reach the depot
+    succ = {i: j for (i, j), v in zip(arcs, x_val) if v > 0.5}
+    seen = {1}
+    sets = []
+    for start in succ:
+        if start in seen:
+            continue
+        cycle = []
+        i = start
+        while i not in seen and i in succ:
+            seen.add(i)
+            cycle.append(i)
+            i = succ[i]
+        if i == start:
+            sets.append(cycle)
+    return sets
+
+
+def _min_cut(capacity, source, sink):
+    """
+    Edmonds-Karp on a dict-of-dicts capacity graph. Returns the max-flow value
+    and the sink side of a minimum cut, i.e. the nodes not reachable from the
+    source in the final residual graph.
+    """
+    residual = {i: dict(out) for i, out in capacity.items()}
+    residual.setdefault(sink, {})
+    for i, out in capacity.items():
+        for j in out:
+            residual.setdefault(j, {}).setdefault(i, 0.0)
+    flow = 0.0
+    while True:
+        parent = {source: None}
+        queue = deque([source])
+        while queue and sink not in parent:
+            i = queue.popleft()
+            for j, c in residual[i].items():
+                if c > 1e-9 and j not in parent:
+                    parent[j] = i
+                    queue.append(j)
+        if sink not in parent:
+            break
+        # bottleneck along the augmenting path
+        path_flow = float("inf")
+        j = sink
+        while parent[j] is not None:
+            path_flow = min(path_flow, residual[parent[j]][j])
+            j = parent[j]
+        j = sink
+        while parent[j] is not None:
+            residual[parent[j]][j] -= path_flow
+            residual[j][parent[j]] += path_flow
+            j = parent[j]
+        flow += path_flow
+    return flow, set(residual) - set(parent)
+
+
+def _gsec(model, S, i):
+    S = set(S)
+    out = quicksum(model._x[a] for a in model._arcs if a[0] in S and a[1] not in S)
+    return out >= model._y[i]
+
+
+def separate_gsec(model, where):
+    # Callback: GSECs violated by an incumbent (lazy) or by the node LP (cut)
+    if where == GRB.Callback.MIPSOL:
+        x_val = model.cbGetSolution(model._x_vars)
+        for S in _cycle_sets(model._arcs, x_val):
+            for i in S:
+                model.cbLazy(_gsec(model, S, i))
+                model._lazy_added += 1
+
+    elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL:
+        x_val = model.cbGetNodeRel(model._x_vars)
+        y_val = model.cbGetNodeRel(model._y)
+        capacity = {1: {}}
+        for (i, j), v in zip(model._arcs, x_val):
+            if v > 1e-6:
+                capacity.setdefault(i, {})[j] = v
+        covered = set()
+        for t in sorted(y_val, key=y_val.get, reverse=True):
+            if y_val[t] < CUT_TOLERANCE or t in covered:
+                continue
+            flow, S = _min_cut(capacity, 1, t)
+            if flow < y_val[t] - CUT_TOLERANCE:
+                model.cbCut(_gsec(model, S, t))
+                model._cuts_added += 1
+                covered |= S
+
+
+def solve_multi_vehicle_gsec(instance, m, tmax_override=None, time_limit=300, warm_start_model=None, builder="loop",
+                             threads=12, model=None, heuristic=False,
+                             start=None, callbacks=()):
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+
+    build_start = time.perf_counter()
+    if model is None:
+        model = build_gsec_model(instance, m, tmax, builder=builder)
+    else:
+        set_limits(model, m, tmax)
+        model._lazy_added = model._cuts_added = 0
+    build_time = time.perf_counter() - build_start
+
+    model.Params.OutputFlag = 1
+    model.Params.TimeLimit = time_limit
+    model.Params.Threads = threads
+    model.Params.MIPFocus = 1
+    model.Params.Heuristics = 0.05
+    model.Params.Presolve = 2
+    model.Params.Cuts = 3
+    model.Params.LazyConstraints = 1
+    model.Params.PreCrush = 1
+    add_callback(model, separate_gsec)
+
+    # HEURISTIC START (optional)
+    heuristic_stats = heuristic_start(model, instance, m, tmax) if heuristic else None
+
+    # 6. WARM START (optional): Tours, a result dict of any formulation or a solved model
+    if start is None:
+        start = warm_start_model
+    if start is not None:
+        as_tours(instance, start).write_start(model, instance)
+
+    # SOLVE
+    for callback in callbacks:
+        add_callback(model, callback)
+    optimize(model)
+
+    # RESULT
+    solution = extract_solution(model, instance, m, tmax, build_time)
+    if heuristic_stats is not None:
+        solution["heuristic"] = heuristic_stats
+    solution["lazy_stats"] = {
+        "lazy_added": model._lazy_added,
+        "cuts_added": model._cuts_added,
+    }
+    return solution
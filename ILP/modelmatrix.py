@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Matrix form of the MTZ, SCF, MCF (per customer or per cluster commodity)
+and GSEC formulations.
+
+Each builder returns a LinearModel: variable blocks with bounds/types and
+row blocks given as SciPy sparse matrices, built with NumPy index
+arithmetic instead of one quicksum per row. The models are the same as the
+loop builders in model*.py (same variables, rows and coefficients), only
+the row order differs.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class LinearModel:
+    """Solver-neutral max-objective MIP: variable blocks plus sparse row blocks."""
+
+    def __init__(self, name):
+        self.name = name
+        self.blocks = {}    # block name -> (offset, size, keys)
+        self.rows = []      # (row name, {block name: csr matrix}, sense, rhs)
+        self.num_vars = 0
+        self._lb, self._ub, self._obj, self._vtype = [], [], [], []
+
+    def add_vars(self, name, size, lb=0.0, ub=1.0, vtype="B", obj=0.0, keys=None):
+        self.blocks[name] = (self.num_vars, size, keys)
+        self._lb.append(np.broadcast_to(np.asarray(lb, dtype=float), (size,)))
+        self._ub.append(np.broadcast_to(np.asarray(ub, dtype=float), (size,)))
+        self._obj.append(np.broadcast_to(np.asarray(obj, dtype=float), (size,)))
+        self._vtype.append(np.full(size, vtype))
+        self.num_vars += size
+
+    def add_rows(self, name, terms, sense, rhs):
+        num_rows = next(iter(terms.values())).shape[0]
+        self.rows.append((name, terms, sense, np.broadcast_to(np.asarray(rhs, dtype=float), (num_rows,))))
+
+    def block_slice(self, name):
+        offset, size, _ = self.blocks[name]
+        return slice(offset, offset + size)
+
+    @property
+    def lb(self):
+        return np.concatenate(self._lb)
+
+    @property
+    def ub(self):
+        return np.concatenate(self._ub)
+
+    @property
+    def obj(self):
+        return np.concatenate(self._obj)
+
+    @property
+    def vtype(self):
+        return np.concatenate(self._vtype)
+
+    def row_matrix(self, terms):
+        # Lay the per-block matrices out over the full column range
+        num_rows = next(iter(terms.values())).shape[0]
+        parts = []
+        for name, (offset, size, _) in self.blocks.items():
+            parts.append(terms[name] if name in terms else sp.csr_matrix((num_rows, size)))
+        return sp.hstack(parts, format="csr")
+
+    def matrix(self):
+        mats, senses, rhs = [], [], []
+        for _, terms, sense, b in self.rows:
+            mats.append(self.row_matrix(terms))
+            senses.append(np.full(len(b), sense))
+            rhs.append(b)
+        return sp.vstack(mats, format="csr"), np.concatenate(senses), np.concatenate(rhs)
+
+    def size(self):
+        """(variables, rows, nonzeros) without assembling the full matrix."""
+        num_rows = sum(len(b) for _, _, _, b in self.rows)
+        nonzeros = sum(m.nnz for _, terms, _, _ in self.rows for m in terms.values())
+        return self.num_vars, num_rows, nonzeros
+
+
+def _select(rows, cols, num_rows, num_cols, vals=1.0):
+    vals = np.broadcast_to(np.asarray(vals, dtype=float), (len(rows),))
+    return sp.csr_matrix((vals, (rows, cols)), shape=(num_rows, num_cols))
+
+
+def _identity(size, scale=1.0):
+    return sp.identity(size, format="csr") * scale
+
+
+def _core(name, instance, tail, head, customers, m, tmax, depot_names=("DepotOutLimit", "DepotInLimit")):
+    """x, y, z blocks with the rows shared by every formulation (except TotalTime/Cluster)."""
+    num_arcs = len(tail)
+    num_cust = len(customers)
+    clusters = instance['clusters']
+    lm = LinearModel(name)
+    lm.add_vars("x", num_arcs, keys=list(zip(tail.tolist(), head.tolist())))
+    lm.add_vars("y", num_cust, keys=customers.tolist())
+    lm.add_vars("z", len(clusters), obj=[c["score"] for c in clusters], keys=list(range(len(clusters))))
+
+    # position of each node id in the y block (-1 for the depot)
+    ypos = np.full(len(instance.xy) + 1, -1, dtype=np.int64)
+    ypos[customers] = np.arange(num_cust)
+    arcs = np.arange(num_arcs)
+    from_depot = arcs[tail == 1]
+    to_depot = arcs[head == 1]
+
+    # 1. DEPOT constraints
+    lm.add_rows(depot_names[0], {"x": _select(np.zeros(len(from_depot), int), from_depot, 1, num_arcs)}, "<", m)
+    lm.add_rows(depot_names[1], {"x": _select(np.zeros(len(to_depot), int), to_depot, 1, num_arcs)}, "<", m)
+    balance = _select(np.zeros(len(from_depot) + len(to_depot), int), np.concatenate([from_depot, to_depot]),
+                      1, num_arcs, np.concatenate([np.ones(len(from_depot)), -np.ones(len(to_depot))]))
+    lm.add_rows("DepotBalance", {"x": balance}, "=", 0)
+
+    # 2. DEGREE constraints
+    out_arcs = arcs[tail != 1]
+    in_arcs = arcs[head != 1]
+    lm.add_rows("Out", {"x": _select(ypos[tail[out_arcs]], out_arcs, num_cust, num_arcs),
+                        "y": _identity(num_cust, -1.0)}, "=", 0)
+    lm.add_rows("In", {"x": _select(ypos[head[in_arcs]], in_arcs, num_cust, num_arcs),
+                       "y": _identity(num_cust, -1.0)}, "=", 0)
+    return lm, ypos
+
+
+def _finish(lm, instance, tail, head, ypos, m, tmax):
+    num_arcs = len(tail)
+    clusters = instance['clusters']
+
+    # TOTAL TIME constraint
+    times = instance.dist[tail - 1, head - 1]
+    lm.add_rows("TotalTime", {"x": _select(np.zeros(num_arcs, int), np.arange(num_arcs), 1, num_arcs, times)},
+                "<", m * tmax)
+
+    # CLUSTER COVERAGE constraints
+    members = np.asarray(instance.cluster_nodes, dtype=np.int64)
+    owner = np.repeat(np.arange(len(clusters)), np.diff(instance.cluster_ptr))
+    if np.any(ypos[members] < 0):
+        raise ValueError("clusters may only contain customer nodes")
+    sizes = np.diff(instance.cluster_ptr).astype(float)
+    lm.add_rows("Cluster", {"y": _select(owner, ypos[members], len(clusters), lm.blocks["y"][1]),
+                            "z": sp.diags(-sizes, format="csr")}, ">", 0)
+    return lm
+
+
+def mtz_matrices(instance, tail, head, customers, m, tmax):
+    num_arcs = len(tail)
+    num_cust = len(customers)
+    n = num_cust
+    lm, ypos = _core("MultiVehicleMTZ_Stable", instance, tail, head, customers, m, tmax)
+    lm.add_vars("u", num_cust, lb=0.0, ub=n - 1, vtype="C", keys=customers.tolist())
+
+    # u[i] = 0 if not visited
+    lm.add_rows("Deactivate_u", {"u": _identity(num_cust), "y": _identity(num_cust, -(n - 1))}, "<", 0)
+
+    # STABLE MTZ order constraints: u_i - u_j + n x_ij <= n - 1
+    inner = np.flatnonzero((tail != 1) & (head != 1))
+    rows = np.arange(len(inner))
+    lm.add_rows("MTZ_Order", {
+        "x": _select(rows, inner, len(inner), num_arcs, n),
+        "u": _select(np.concatenate([rows, rows]), np.concatenate([ypos[tail[inner]], ypos[head[inner]]]),
+                     len(inner), num_cust, np.concatenate([np.ones(len(inner)), -np.ones(len(inner))])),
+    }, "<", n - 1)
+    return _finish(lm, instance, tail, head, ypos, m, tmax)
+
+
+def scf_matrices(instance, tail, head, customers, m, tmax):
+    num_arcs = len(tail)
+    num_cust = len(customers)
+    lm, ypos = _core("MultiVehicleSCF", instance, tail, head, customers, m, tmax)
+    lm.add_vars("f", num_arcs, lb=0.0, ub=num_cust, vtype="C", keys=lm.blocks["x"][2])
+    arcs = np.arange(num_arcs)
+
+    # FLOW constraints
+    from_depot = arcs[tail == 1]
+    lm.add_rows("FlowFromDepot", {"f": _select(np.zeros(len(from_depot), int), from_depot, 1, num_arcs),
+                                  "y": sp.csr_matrix(-np.ones((1, num_cust)))}, "=", 0)
+    # inflow - outflow - y_i = 0
+    into = arcs[head != 1]
+    out = arcs[tail != 1]
+    balance = _select(np.concatenate([ypos[head[into]], ypos[tail[out]]]), np.concatenate([into, out]),
+                      num_cust, num_arcs, np.concatenate([np.ones(len(into)), -np.ones(len(out))]))
+    lm.add_rows("FlowBalance", {"f": balance, "y": _identity(num_cust, -1.0)}, "=", 0)
+    lm.add_rows("FlowCap", {"f": _identity(num_arcs), "x": _identity(num_arcs, -num_cust)}, "<", 0)
+    return _finish(lm, instance, tail, head, ypos, m, tmax)
+
+
+def mcf_matrices(instance, tail, head, customers, m, tmax, linking=True):
+    num_arcs = len(tail)
+    num_cust = len(customers)
+    num_nodes = len(instance.xy)
+    lm, ypos = _core("MultiVehicleMCF", instance, tail, head, customers, m, tmax,
+                     depot_names=("DepotOut", "DepotIn"))
+    # f[k, a] lives at column k * |A| + a (commodity-major, like addVars(N, A))
+    lm.add_vars("f", num_cust * num_arcs, lb=0.0, ub=1.0, vtype="C")
+    arcs = np.arange(num_arcs)
+    eye_k = _identity(num_cust)
+
+    # node-arc incidence: +1 on the head row, -1 on the tail row
+    incidence = _select(np.concatenate([head - 1, tail - 1]), np.concatenate([arcs, arcs]), num_nodes, num_arcs,
+                        np.concatenate([np.ones(num_arcs), -np.ones(num_arcs)]))
+    from_depot = _select(np.zeros(np.count_nonzero(tail == 1), int), arcs[tail == 1], 1, num_arcs)
+    inflow = _select(head - 1, arcs, num_nodes, num_arcs)
+
+    # FLOW (per customer k ∈ N)
+    lm.add_rows("FlowStart", {"f": sp.kron(eye_k, from_depot, format="csr"), "y": _identity(num_cust, -1.0)}, "=", 0)
+    # row k of FlowEnd is the inflow of commodity k into node k
+    lm.add_rows("FlowEnd", {"f": sp.kron(eye_k, inflow, format="csr")[np.arange(num_cust) * num_nodes + customers - 1],
+                            "y": _identity(num_cust, -1.0)}, "=", 0)
+    # row k of FlowSink is the outflow of commodity k from node k, so no circulation through k feeds FlowEnd
+    outflow = _select(tail - 1, arcs, num_nodes, num_arcs)
+    own = np.arange(num_cust) * num_nodes + customers - 1
+    lm.add_rows("FlowSink", {"f": sp.kron(eye_k, outflow, format="csr")[own]}, "=", 0)
+    # conservation at every node except the depot and the commodity's own node
+    kk, ii = np.meshgrid(np.arange(num_cust), np.arange(1, num_nodes + 1), indexing="ij")
+    keep = ((ii != 1) & (ii != customers[kk])).ravel()
+    conserve = sp.kron(eye_k, incidence, format="csr")[np.flatnonzero(keep)]
+    lm.add_rows("FlowConserve", {"f": conserve}, "=", 0)
+    if linking:
+        lm.add_rows("FlowUse", {"f": _identity(num_cust * num_arcs),
+                                "x": sp.kron(np.ones((num_cust, 1)), _identity(num_arcs, -1.0), format="csr")},
+                    "<", 0)
+    return _finish(lm, instance, tail, head, ypos, m, tmax)
+
+
+def commodity_groups(instance, customers):
+    """
+    Node ids each cluster commodity is delivered to: the clusters, plus one
+    group for the customers no cluster contains so they stay connected too.
+    """
+    groups = [np.asarray(instance.cluster_nodes[a:b], dtype=np.int64)
+              for a, b in zip(instance.cluster_ptr[:-1], instance.cluster_ptr[1:])]
+    rest = np.setdiff1d(customers, instance.cluster_nodes)
+    if len(rest):
+        groups.append(rest)
+    return groups
+
+
+def commodity_capacities(groups, tail, head):
+    """
+    Upper bound of commodity g on every arc: |group| units leave the depot
+    and each group member absorbs its own unit before passing the flow on;
+    nothing flows back into the depot.
+    """
+    caps = np.empty((len(groups), len(tail)))
+    for g, nodes in enumerate(groups):
+        caps[g] = len(nodes) - np.isin(tail, nodes)
+    caps[:, head == 1] = 0.0
+    return caps
+
+
+def mcf_cluster_matrices(instance, tail, head, customers, m, tmax):
+    num_arcs = len(tail)
+    num_cust = len(customers)
+    num_nodes = len(instance.xy)
+    lm, ypos = _core("MultiVehicleMCFCluster", instance, tail, head, customers, m, tmax,
+                     depot_names=("DepotOut", "DepotIn"))
+    groups = commodity_groups(instance, customers)
+    caps = commodity_capacities(groups, tail, head)
+    # f[g, a] lives at column g * |A| + a, like addVars(groups, A)
+    lm.add_vars("f", len(groups) * num_arcs, lb=0.0, ub=caps.ravel(), vtype="C")
+    arcs = np.arange(num_arcs)
+    eye_g = _identity(len(groups))
+
+    # demand[g, k] = 1 if customer k (y position) receives commodity g
+    owner = np.concatenate([np.full(len(nodes), g) for g, nodes in enumerate(groups)])
+    demand = _select(owner, ypos[np.concatenate(groups)], len(groups), num_cust)
+
+    # FLOW (per cluster g): the depot ships one unit per visited member, each member absorbs one
+    from_depot = _select(np.zeros(np.count_nonzero(tail == 1), int), arcs[tail == 1], 1, num_arcs)
+    lm.add_rows("FlowStart", {"f": sp.kron(eye_g, from_depot, format="csr"), "y": -demand}, "=", 0)
+    # inflow - outflow at every customer, minus y_i where i receives the commodity
+    incidence = _select(np.concatenate([head - 1, tail - 1]), np.concatenate([arcs, arcs]), num_nodes, num_arcs,
+                        np.concatenate([np.ones(num_arcs), -np.ones(num_arcs)]))[customers - 1]
+    absorb = sp.vstack([sp.diags(-demand[g].toarray().ravel()) for g in range(len(groups))], format="csr")
+    lm.add_rows("FlowBalance", {"f": sp.kron(eye_g, incidence, format="csr"), "y": absorb}, "=", 0)
+    lm.add_rows("FlowUse", {"f": _identity(len(groups) * num_arcs),
+                            "x": sp.vstack([sp.diags(-c) for c in caps], format="csr")}, "<", 0)
+    return _finish(lm, instance, tail, head, ypos, m, tmax)
+
+
+def gsec_matrices(instance, tail, head, customers, m, tmax):
+    # Static part only; the GSEC rows are separated in modelgsec
+    lm, ypos = _core("MultiVehicleGSEC", instance, tail, head, customers, m, tmax)
+    return _finish(lm, instance, tail, head, ypos, m, tmax)
@@ -5,99 +5,205 @@ Created on Fri Jun 27 08:53:20 2025
 @author: batuhanatas
 """
 
+import time
+
+import numpy as np
 from gurobipy import Model, GRB, quicksum
 
-def solve_multi_vehicle_mcf(instance, m, tmax_override=None, time_limit=300, warm_start_model=None):
-    V = list(instance['coords'].keys())
-    N = [i for i in V if i != 1]  # customer nodes
-    A = [(i, j) for i in V for j in V if i != j]
+from heuristic import heuristic_start
+from modelcommon import add_callback, arc_arrays, extract_solution, graph, load_linear_model, optimize, set_limits
+from modelmatrix import commodity_capacities, commodity_groups, mcf_cluster_matrices, mcf_matrices
+from solution import as_tours
+
+# Most violated FlowUse rows added as cuts per fractional node in lazy mode
+LAZY_CUTS_PER_NODE = 200
+
+
+def build_mcf_model(instance, m, tmax, builder="loop", lazy=False, commodities="node"):
+    """
+    With lazy=True the FlowUse linking rows f[k,i,j] <= x[i,j] are left out;
+    separate_flow_use() adds the violated ones during branch-and-cut.
+
+    commodities="cluster" builds the compact variant "mcf_cluster": one
+    commodity per cluster instead of per customer, shipping one unit from
+    the depot to every visited member, so f has |K|·|A| instead of |N|·|A|
+    variables. Since every customer receives some commodity, all visited
+    nodes stay connected to the depot. Its linking rows are
+    f[g,i,j] <= cap[g,i,j] * x[i,j] (modelmatrix.commodity_capacities).
+    """
+    if commodities not in ("node", "cluster"):
+        raise ValueError(f"Unknown commodities {commodities!r}, expected 'node' or 'cluster'")
+    if lazy and commodities == "cluster":
+        raise ValueError("lazy linking rows are only available with one commodity per customer")
+    V, N, A = graph(instance)
     travel_time = instance['travel_time']
-    tmax = tmax_override if tmax_override is not None else instance['tmax']
     clusters = instance['clusters']
+    tail, head = arc_arrays(instance)
+    if commodities == "cluster":
+        groups = commodity_groups(instance, np.array(N, dtype=np.int64))
+        caps = commodity_capacities(groups, tail, head)
+
+    model = Model("MultiVehicleMCF" if commodities == "node" else "MultiVehicleMCFCluster")
+
+    if builder == "matrix":
+        customers = np.array(N, dtype=np.int64)
+        if commodities == "node":
+            lm = mcf_matrices(instance, tail, head, customers, m, tmax, linking=not lazy)
+        else:
+            lm = mcf_cluster_matrices(instance, tail, head, customers, m, tmax)
+        handles, rows = load_linear_model(model, lm)
+        x, y, z, f = handles["x"], handles["y"], handles["z"], handles["f"]
+        depot_out, depot_in, total_time = (rows[name].tolist()[0]
+                                           for name in ("DepotOut", "DepotIn", "TotalTime"))
+
+    elif builder == "loop":
+        # VARIABLES
+        x = model.addVars(A, vtype=GRB.BINARY, name="x")
+        y = model.addVars(N, vtype=GRB.BINARY, name="y")
+        z = model.addVars(len(clusters), vtype=GRB.BINARY, name="z")
+        if commodities == "node":
+            f = model.addVars(N, A, vtype=GRB.CONTINUOUS, lb=0.0, ub=1.0, name="f")  # multi-commodity flow
+        else:
+            f = model.addVars(len(groups), A, vtype=GRB.CONTINUOUS, lb=0.0, name="f")  # one commodity per cluster
+            model.setAttr("UB", list(f.values()), caps.ravel().tolist())
+
+        # OBJECTIVE
+        model.setObjective(quicksum(clusters[k]["score"] * z[k] for k in range(len(clusters))), GRB.MAXIMIZE)
+
+        # DEPOT constraints
+        depot_out = model.addConstr(x.sum(1, '*') <= m, "DepotOut")
+        depot_in = model.addConstr(x.sum('*', 1) <= m, "DepotIn")
+        model.addConstr(x.sum(1, '*') == x.sum('*', 1), "DepotBalance")
+
+        # DEGREE = y[i]
+        for i in N:
+            model.addConstr(x.sum(i, '*') == y[i], f"Out_{i}")
+            model.addConstr(x.sum('*', i) == y[i], f"In_{i}")
+
+        if commodities == "node":
+            # FLOW (per customer k ∈ N)
+            for k in N:
+                # Flow from depot to customer k
+                model.addConstr(f.sum(k, 1, '*') == y[k], f"FlowStart_{k}")
+                model.addConstr(f.sum(k, '*', k) == y[k], f"FlowEnd_{k}")
+                # k only absorbs its commodity, otherwise a circulation through k could feed FlowEnd
+                model.addConstr(f.sum(k, k, '*') == 0, f"FlowSink_{k}")
+
+                for i in V:
+                    if i not in [1, k]:
+                        model.addConstr(
+                            f.sum(k, '*', i) == f.sum(k, i, '*'),
+                            f"FlowConserve_{k}_{i}"
+                        )
+
+                if not lazy:
+                    for i, j in A:
+                        model.addConstr(f[k, i, j] <= x[i, j], f"FlowUse_{k}_{i}_{j}")
+        else:
+            # FLOW (per cluster g): the depot ships one unit per visited member, each member absorbs one
+            for g, nodes in enumerate(groups):
+                members = set(nodes.tolist())
+                model.addConstr(f.sum(g, 1, '*') == quicksum(y[i] for i in members), f"FlowStart_{g}")
+                for i in N:
+                    model.addConstr(f.sum(g, '*', i) - f.sum(g, i, '*') == (y[i] if i in members else 0),
+                                    f"FlowBalance_{g}_{i}")
+                for a, (i, j) in enumerate(A):
+                    model.addConstr(f[g, i, j] <= caps[g, a] * x[i, j], f"FlowUse_{g}_{i}_{j}")
+
+        # TOTAL TIME
+        total_time = model.addConstr(quicksum(travel_time[i, j] * x[i, j] for i, j in A) <= m * tmax, "TotalTime")
+
+        # CLUSTER COVERAGE
+        for k, cluster in enumerate(clusters):
+            model.addConstr(quicksum(y[i] for i in cluster["nodes"]) >= len(cluster["nodes"]) * z[k], f"Cluster_{k}")
+
+    else:
+        raise ValueError(f"Unknown builder {builder!r}, expected 'loop' or 'matrix'")
+
+    model._x, model._y, model._z, model._f = x, y, z, f
+    model._formulation = "mcf" if commodities == "node" else "mcf_cluster"
+    model._limits = (depot_out, depot_in, total_time)
+    if lazy:
+        model._x_vars = list(x.values())
+        model._f_vars = list(f.values()) if builder == "loop" else f.tolist()
+        model._lazy_added = 0
+        model._cuts_added = 0
+    return model
+
+
+def separate_flow_use(model, where):
+    # Callback: add the FlowUse rows violated by an incumbent (lazy) or node LP (cut)
+    if where == GRB.Callback.MIPSOL:
+        x_val = np.array(model.cbGetSolution(model._x_vars))
+        f_val = np.array(model.cbGetSolution(model._f_vars)).reshape(-1, len(x_val))
+        for k, a in zip(*np.nonzero(f_val > x_val + 1e-6)):
+            model.cbLazy(model._f_vars[k * len(x_val) + a] <= model._x_vars[a])
+            model._lazy_added += 1
+
+    elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL:
+        x_val = np.array(model.cbGetNodeRel(model._x_vars))
+        f_val = np.array(model.cbGetNodeRel(model._f_vars)).reshape(-1, len(x_val))
+        violation = (f_val - x_val).ravel()
+        candidates = np.flatnonzero(violation > 1e-4)
+        if len(candidates) > LAZY_CUTS_PER_NODE:
+            candidates = candidates[np.argsort(-violation[candidates])[:LAZY_CUTS_PER_NODE]]
+        for idx in candidates:
+            model.cbCut(model._f_vars[idx] <= model._x_vars[idx % len(x_val)])
+            model._cuts_added += 1
+
+
+def solve_multi_vehicle_mcf(instance, m, tmax_override=None, time_limit=300, warm_start_model=None, builder="loop",
+                            threads=12, model=None, heuristic=False,
+                            start=None, callbacks=(), lazy=False, commodities="node"):
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+
+    build_start = time.perf_counter()
+    if model is None:
+        model = build_mcf_model(instance, m, tmax, builder=builder, lazy=lazy, commodities=commodities)
+    else:
+        set_limits(model, m, tmax)
+        model._lazy_added = model._cuts_added = 0
+    build_time = time.perf_counter() - build_start
 
-    model = Model("MultiVehicleMCF")
     model.Params.OutputFlag = 1
     model.Params.TimeLimit = time_limit
-    model.Params.Threads = 12
+    model.Params.Threads = threads
     model.Params.MIPFocus = 1
     model.Params.Heuristics = 0.1
+    if lazy:
+        model.Params.LazyConstraints = 1
+        model.Params.PreCrush = 1
+        add_callback(model, separate_flow_use)
+
+    # HEURISTIC START (optional)
+    heuristic_stats = heuristic_start(model, instance, m, tmax) if heuristic else None
 
-    # VARIABLES
-    x = model.addVars(A, vtype=GRB.BINARY, name="x")
-    y = model.addVars(N, vtype=GRB.BINARY, name="y")
-    z = model.addVars(len(clusters), vtype=GRB.BINARY, name="z")
-    f = model.addVars(N, A, vtype=GRB.CONTINUOUS, lb=0.0, ub=1.0, name="f")  # multi-commodity flow
-
-    # OBJECTIVE
-    model.setObjective(quicksum(clusters[k]["score"] * z[k] for k in range(len(clusters))), GRB.MAXIMIZE)
-
-    # DEPOT constraints
-    model.addConstr(quicksum(x[1, j] for j in N) <= m, "DepotOut")
-    model.addConstr(quicksum(x[j, 1] for j in N) <= m, "DepotIn")
-    model.addConstr(quicksum(x[1, j] for j in N) == quicksum(x[j, 1] for j in N), "DepotBalance")
-
-    # DEGREE = y[i]
-    for i in N:
-        model.addConstr(quicksum(x[i, j] for j in V if j != i) == y[i], f"Out_{i}")
-        model.addConstr(quicksum(x[j, i] for j in V if j != i) == y[i], f"In_{i}")
-
-    # FLOW (per customer k ∈ N)
-    for k in N:
-        # Flow from depot to customer k
-        model.addConstr(quicksum(f[k, 1, j] for j in V if j != 1) == y[k], f"FlowStart_{k}")
-        model.addConstr(quicksum(f[k, j, k] for j in V if j != k) == y[k], f"FlowEnd_{k}")
-
-        for i in V:
-            if i not in [1, k]:
-                model.addConstr(
-                    quicksum(f[k, j, i] for j in V if j != i) ==
-                    quicksum(f[k, i, j] for j in V if j != i),
-                    f"FlowConserve_{k}_{i}"
-                )
-
-        for i, j in A:
-            model.addConstr(f[k, i, j] <= x[i, j], f"FlowUse_{k}_{i}_{j}")
-
-    # TOTAL TIME
-    model.addConstr(quicksum(travel_time[i, j] * x[i, j] for i, j in A) <= m * tmax, "TotalTime")
-
-    # CLUSTER COVERAGE
-    for k, cluster in enumerate(clusters):
-        model.addConstr(quicksum(y[i] for i in cluster["nodes"]) >= len(cluster["nodes"]) * z[k], f"Cluster_{k}")
-
-    # WARM START
-    if warm_start_model is not None:
-        for v in model.getVars():
-            try:
-                old_v = warm_start_model.getVarByName(v.VarName)
-                if v.VType in [GRB.BINARY, GRB.INTEGER]:
-                    v.Start = round(old_v.X)
-                else:
-                    v.Start = old_v.X
-            except Exception:
-                continue
-
-    # SOLVE
-    model.optimize()
+    # WARM START (optional): Tours, a result dict of any formulation or a solved model
+    if start is None:
+        start = warm_start_model
+    if start is not None:
+        as_tours(instance, start).write_start(model, instance)
+
+    for callback in callbacks:
+        add_callback(model, callback)
+    optimize(model)
 
     # RETURN RESULTS
-    solution = {
-        "model": model,
-        "status": model.Status,
-        "objective": model.ObjVal if model.SolCount > 0 else None,
-        "selected_nodes": [i for i in N if y[i].X > 0.5],
-        "covered_clusters": [k for k in range(len(clusters)) if z[k].X > 0.5],
-        "edges_used": [(i, j) for (i, j) in A if x[i, j].X > 0.5],
-        "runtime": model.Runtime,
-        "vehicles_used": sum(1 for j in N if x[1, j].X > 0.5),
-        "gap": None,
-        "config": {
-            "m": m,
-            "tmax": tmax
+    solution = extract_solution(model, instance, m, tmax, build_time)
+    if heuristic_stats is not None:
+        solution["heuristic"] = heuristic_stats
+    if lazy:
+        solution["lazy_stats"] = {
+            "linking_rows_skipped": len(model._f_vars),
+            "lazy_added": model._lazy_added,
+            "cuts_added": model._cuts_added,
         }
-    }
+    return solution
 
-    if model.SolCount > 0 and model.ObjBound != 0:
-        solution["gap"] = (model.ObjBound - model.ObjVal) / model.ObjBound
 
-    return solution
+def build_mcf_cluster_model(instance, m, tmax, builder="loop"):
+    return build_mcf_model(instance, m, tmax, builder=builder, commodities="cluster")
+
+
+def solve_multi_vehicle_mcf_cluster(instance, m, **kwargs):
+    return solve_multi_vehicle_mcf(instance, m, commodities="cluster", **kwargs)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Symmetric (undirected edge) variants of the SCF, MCF and GSEC formulations.
+
+Travel times are symmetric, so a route can be described by the edges
+{i, j} (i < j) it uses instead of its arcs, which halves the binary
+variables. Every visited customer has degree 2; a depot edge may be used
+twice, which is a route to a single customer and back:
+
+    x_e ∈ {0, 1} for customer edges,  x_1j ∈ {0, 1, 2}
+    Σ_{e ∋ i} x_e = 2 y_i             for i ∈ N
+    ½ Σ_j x_1j <= m                   (each route uses two depot edge ends)
+
+Connectivity to the depot is what the variants differ in:
+  - scf_sym: one commodity on directed arcs, f_ij + f_ji <= |N| x_ij, with
+    one unit delivered to every visited customer,
+  - mcf_sym: one commodity per customer, f^k_ij + f^k_ji <= x_ij, that
+    leaves the depot and is absorbed at k,
+  - gsec_sym: x(δ(S)) >= 2 y_i for S ⊆ N, i ∈ S, separated in a callback.
+MTZ orders the customers along directed arcs and has no undirected variant.
+The result dict is the usual one; edges_used holds the routes oriented
+away from the depot, so checkers and plots work unchanged.
+"""
+
+import time
+
+import numpy as np
+from gurobipy import Model, GRB, quicksum
+
+from heuristic import heuristic_start
+from modelcommon import add_callback, extract_solution, graph, optimize, set_limits
+from modelgsec import CUT_TOLERANCE, _min_cut
+from solution import Tours, as_tours
+
+FORMULATIONS = ("scf_sym", "mcf_sym", "gsec_sym")
+
+
+def edge_list(instance):
+    # Undirected edges i < j usable in both directions (instance.arc_mask, if set)
+    dist = np.asarray(instance.dist)
+    if not np.array_equal(dist, dist.T):
+        raise ValueError("the symmetric formulations need symmetric travel times")
+    n = len(dist)
+    usable = ~np.eye(n, dtype=bool)
+    if instance.arc_mask is not None:
+        mask = np.asarray(instance.arc_mask)
+        usable &= mask & mask.T
+    tail, head = np.nonzero(np.triu(usable, 1))
+    return list(zip((tail + 1).tolist(), (head + 1).tolist()))
+
+
+def build_sym_model(instance, m, tmax, formulation="scf_sym", builder="loop"):
+    """builder is accepted for the common signature; the symmetric models have a single builder."""
+    if formulation not in FORMULATIONS:
+        raise ValueError(f"Unknown symmetric formulation {formulation!r}, expected one of {FORMULATIONS}")
+    V, N, A = graph(instance)
+    E = edge_list(instance)
+    travel_time = instance['travel_time']
+    clusters = instance['clusters']
+
+    model = Model(f"MultiVehicle{formulation.upper()}")
+
+    # VARIABLES
+    x = model.addVars(E, vtype=GRB.BINARY, name="x")                     # edge used (depot edges: 0, 1, 2)
+    y = model.addVars(N, vtype=GRB.BINARY, name="y")                     # node visited
+    z = model.addVars(len(clusters), vtype=GRB.BINARY, name="z")        # cluster covered
+    depot_edges = [x[e] for e in E if e[0] == 1]
+    model.setAttr("VType", depot_edges, [GRB.INTEGER] * len(depot_edges))
+    model.setAttr("UB", depot_edges, [2.0] * len(depot_edges))
+
+    # OBJECTIVE
+    model.setObjective(quicksum(clusters[k]["score"] * z[k] for k in range(len(clusters))), GRB.MAXIMIZE)
+
+    # 1. DEPOT constraint
+    depot = model.addConstr(0.5 * quicksum(depot_edges) <= m, "DepotLimit")
+
+    # 2. DEGREE constraints
+    incident = {i: [] for i in V}
+    for i, j in E:
+        incident[i].append(x[i, j])
+        incident[j].append(x[i, j])
+    for i in N:
+        model.addConstr(quicksum(incident[i]) == 2 * y[i], f"Degree_{i}")
+
+    # 3. CONNECTIVITY
+    out_arcs = {i: [] for i in V}
+    in_arcs = {i: [] for i in V}
+    for i, j in A:
+        out_arcs[i].append((i, j))
+        in_arcs[j].append((i, j))
+
+    if formulation == "scf_sym":
+        f = model.addVars(A, vtype=GRB.CONTINUOUS, lb=0.0, ub=len(N), name="f")
+        model.addConstr(quicksum(f[a] for a in out_arcs[1]) == quicksum(y[i] for i in N), "FlowFromDepot")
+        for i in N:
+            model.addConstr(quicksum(f[a] for a in in_arcs[i]) - quicksum(f[a] for a in out_arcs[i]) == y[i],
+                            f"FlowBalance_{i}")
+        for i, j in E:
+            model.addConstr(f[i, j] + f[j, i] <= len(N) * x[i, j], f"FlowCap_{i}_{j}")
+        model._f = f
+
+    elif formulation == "mcf_sym":
+        f = model.addVars(N, A, vtype=GRB.CONTINUOUS, lb=0.0, ub=1.0, name="f")
+        for k in N:
+            model.addConstr(quicksum(f[k, i, j] for i, j in out_arcs[1]) == y[k], f"FlowStart_{k}")
+            model.addConstr(quicksum(f[k, i, j] for i, j in in_arcs[k]) == y[k], f"FlowEnd_{k}")
+            # k only absorbs its commodity, otherwise a circulation through k could feed FlowEnd
+            model.addConstr(quicksum(f[k, i, j] for i, j in out_arcs[k]) == 0, f"FlowSink_{k}")
+            for i in N:
+                if i != k:
+                    model.addConstr(quicksum(f[k, a, b] for a, b in in_arcs[i]) ==
+                                    quicksum(f[k, a, b] for a, b in out_arcs[i]), f"FlowConserve_{k}_{i}")
+            for i, j in E:
+                model.addConstr(f[k, i, j] + f[k, j, i] <= x[i, j], f"FlowUse_{k}_{i}_{j}")
+        model._f = f
+
+    else:
+        # GSEC rows are added by separate_gsec_sym()
+        model._lazy_added = 0
+        model._cuts_added = 0
+
+    # 4. TOTAL TIME constraint
+    total_time = model.addConstr(quicksum(travel_time[i, j] * x[i, j] for i, j in E) <= m * tmax, "TotalTime")
+
+    # 5. CLUSTER COVERAGE constraints
+    for k, cluster in enumerate(clusters):
+        model.addConstr(quicksum(y[i] for i in cluster["nodes"]) >= len(cluster["nodes"]) * z[k], f"Cluster_{k}")
+
+    model._x, model._y, model._z = x, y, z
+    model._formulation = formulation
+    model._limits = (depot, depot, total_time)
+    model._edges = E
+    model._x_vars = list(x.values())
+    model._flow_arcs = A
+    return model
+
+
+def _components(num_nodes, edges):
+    # Node sets of the connected components of a support graph that miss the depot
+    parent = list(range(num_nodes + 1))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    nodes = set()
+    for i, j in edges:
+        parent[find(i)] = find(j)
+        nodes.update((i, j))
+    groups = {}
+    for i in nodes:
+        groups.setdefault(find(i), []).append(i)
+    depot = find(1)
+    return [S for root, S in groups.items() if root != depot]
+
+
+def _gsec_sym(model, S, i):
+    S = set(S)
+    crossing = quicksum(model._x[e] for e in model._edges if (e[0] in S) != (e[1] in S))
+    return crossing >= 2 * model._y[i]
+
+
+def separate_gsec_sym(model, where):
+    # Callback: undirected GSECs violated by an incumbent (lazy) or by the node LP (cut)
+    if where == GRB.Callback.MIPSOL:
+        x_val = model.cbGetSolution(model._x_vars)
+        support = [e for e, v in zip(model._edges, x_val) if v > 0.5]
+        for S in _components(len(model._y) + 1, support):
+            for i in S:
+                model.cbLazy(_gsec_sym(model, S, i))
+                model._lazy_added += 1
+
+    elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL:
+        x_val = model.cbGetNodeRel(model._x_vars)
+        y_val = model.cbGetNodeRel(model._y)
+        capacity = {1: {}}
+        for (i, j), v in zip(model._edges, x_val):
+            if v > 1e-6:
+                capacity.setdefault(i, {})[j] = v
+                capacity.setdefault(j, {})[i] = v
+        covered = set()
+        for t in sorted(y_val, key=y_val.get, reverse=True):
+            if y_val[t] < CUT_TOLERANCE or t in covered:
+                continue
+            flow, S = _min_cut(capacity, 1, t)
+            if flow < 2 * y_val[t] - CUT_TOLERANCE:
+                model.cbCut(_gsec_sym(model, S, t))
+                model._cuts_added += 1
+                covered |= S
+
+
+def solve_multi_vehicle_sym(instance, m, formulation="scf_sym", tmax_override=None, time_limit=300,
+                            warm_start_model=None, builder="loop", threads=12, model=None, heuristic=False,
+                            start=None, callbacks=()):
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+
+    build_start = time.perf_counter()
+    if model is None:
+        model = build_sym_model(instance, m, tmax, formulation, builder=builder)
+    else:
+        set_limits(model, m, tmax)
+        if formulation == "gsec_sym":
+            model._lazy_added = model._cuts_added = 0
+    build_time = time.perf_counter() - build_start
+
+    model.Params.OutputFlag = 1
+    model.Params.TimeLimit = time_limit
+    model.Params.Threads = threads
+    model.Params.MIPFocus = 1
+    model.Params.Heuristics = 0.05
+    model.Params.Presolve = 2
+    model.Params.Cuts = 3
+    if formulation == "gsec_sym":
+        model.Params.LazyConstraints = 1
+        model.Params.PreCrush = 1
+        add_callback(model, separate_gsec_sym)
+
+    # HEURISTIC START (optional)
+    heuristic_stats = heuristic_start(model, instance, m, tmax) if heuristic else None
+
+    # 6. WARM START (optional): Tours, a result dict of any formulation or a solved model
+    if start is None:
+        start = warm_start_model
+    if start is not None:
+        as_tours(instance, start).write_start(model, instance)
+
+    # SOLVE
+    for callback in callbacks:
+        add_callback(model, callback)
+    optimize(model)
+
+    # RESULT: routes oriented away from the depot
+    solution = extract_solution(model, instance, m, tmax, build_time)
+    if model.SolCount > 0:
+        tours = Tours.from_model(instance, model)
+        routes = tours.routes()
+        solution["edges_used"] = [arc for route in routes for arc in zip([1] + route, route + [1])]
+        solution["vehicles_used"] = len(routes)
+    if heuristic_stats is not None:
+        solution["heuristic"] = heuristic_stats
+    if formulation == "gsec_sym":
+        solution["lazy_stats"] = {
+            "lazy_added": model._lazy_added,
+            "cuts_added": model._cuts_added,
+        }
+    return solution
+
+
+def solve_multi_vehicle_scf_sym(instance, m, **kwargs):
+    return solve_multi_vehicle_sym(instance, m, "scf_sym", **kwargs)
+
+
+def solve_multi_vehicle_mcf_sym(instance, m, **kwargs):
+    return solve_multi_vehicle_sym(instance, m, "mcf_sym", **kwargs)
+
+
+def solve_multi_vehicle_gsec_sym(instance, m, **kwargs):
+    return solve_multi_vehicle_sym(instance, m, "gsec_sym", **kwargs)
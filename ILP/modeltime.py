@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-route duration formulations: every route takes at most tmax, instead
+of the routes sharing a total of m * tmax.
+
+Elapsed route time replaces the position (MTZ) or the customer count
+(SCF), so the same rows that eliminate subtours also limit each route:
+  - mtz_time: a_i is the arrival time at customer i (0 if not visited),
+        sp(1,i) y_i <= a_i <= (tmax - sp(i,1)) y_i,   a_j >= t_1j x_1j
+        a_i - a_j + M_ij x_ij <= M_ij - t_ij          for i, j ∈ N
+  - scf_time: g_ij is the time at which a vehicle on arc (i, j) reaches j,
+        g_1j = t_1j x_1j,   Σ_k g_jk = Σ_i g_ij + Σ_k t_jk x_jk    for j ∈ N
+        (sp(1,i) + t_ij) x_ij <= g_ij <= (tmax - sp(j,1)) x_ij
+with sp the shortest travel times from and to the depot (equal to the
+direct times for ceil-Euclidean distances, which satisfy the triangle
+inequality, but not for arbitrary travel times) and the arc
+big-M M_ij = (tmax - sp(i,1)) + t_ij, the largest a_i - a_j + t_ij when j
+does not follow i. Arcs that cannot lie on
+any route within tmax are fixed to 0. The TotalTime row is kept, so a
+result is also feasible for the original models.
+
+tmax appears in coefficients here, so set_limits() also calls
+model._update_tmax to move them between configurations.
+"""
+
+import time
+
+import numpy as np
+from gurobipy import Model, GRB, quicksum
+from scipy.sparse.csgraph import shortest_path
+
+from heuristic import heuristic_start
+from modelcommon import add_callback, extract_solution, graph, optimize, set_limits
+from solution import as_tours
+
+FORMULATIONS = ("mtz_time", "scf_time")
+
+
+def depot_times(instance):
+    """Shortest travel times from the depot to every node and back, indexed by node id."""
+    dist = np.asarray(instance.dist, dtype=float)
+    if np.any(dist[~np.eye(len(dist), dtype=bool)] <= 0):
+        raise ValueError("the per-route formulations need positive travel times between distinct nodes")
+    sp = shortest_path(dist, method="D", directed=True, indices=0)
+    back = shortest_path(dist.T, method="D", directed=True, indices=0)
+    return np.concatenate([[0.0], sp]), np.concatenate([[0.0], back])
+
+
+def _update_tmax(model, tmax):
+    # Big-M coefficients, arc fixings and the ReturnTime/TimeCap rows depend on tmax
+    t_out, t_back = model._depot_times
+    travel_time = model._travel_time
+    x = model._x
+    for (i, j), var in x.items():
+        var.UB = 1.0 if t_out[i] + travel_time[i, j] + t_back[j] <= tmax + 1e-9 else 0.0
+    for i, row in model._return_rows.items():
+        model.chgCoeff(row, model._y[i], t_back[i] - tmax)
+    for (i, j), row in model._order_rows.items():
+        # customers that cannot be visited within tmax keep a_i = 0
+        big_m = max(tmax - t_back[i], 0.0) + travel_time[i, j]
+        model.chgCoeff(row, x[i, j], big_m)
+        row.RHS = big_m - travel_time[i, j]
+    for (i, j), row in model._cap_rows.items():
+        model.chgCoeff(row, x[i, j], -(tmax - t_back[j]))
+
+
+def build_time_model(instance, m, tmax, formulation="mtz_time", builder="loop"):
+    """builder is accepted for the common signature; the per-route models have a single builder."""
+    if formulation not in FORMULATIONS:
+        raise ValueError(f"Unknown per-route formulation {formulation!r}, expected one of {FORMULATIONS}")
+    V, N, A = graph(instance)
+    travel_time = instance['travel_time']
+    clusters = instance['clusters']
+    t_out, t_back = depot_times(instance)
+
+    model = Model(f"MultiVehicle{formulation.upper()}")
+
+    # VARIABLES
+    x = model.addVars(A, vtype=GRB.BINARY, name="x")                     # tour arcs
+    y = model.addVars(N, vtype=GRB.BINARY, name="y")                     # node visited
+    z = model.addVars(len(clusters), vtype=GRB.BINARY, name="z")        # cluster covered
+
+    # OBJECTIVE
+    model.setObjective(quicksum(clusters[k]["score"] * z[k] for k in range(len(clusters))), GRB.MAXIMIZE)
+
+    # 1. DEPOT constraints
+    depot_out = model.addConstr(x.sum(1, '*') <= m, "DepotOutLimit")
+    depot_in = model.addConstr(x.sum('*', 1) <= m, "DepotInLimit")
+    model.addConstr(x.sum(1, '*') == x.sum('*', 1), "DepotBalance")
+
+    # 2. DEGREE constraints
+    for i in N:
+        model.addConstr(x.sum(i, '*') == y[i], f"Out_{i}")
+        model.addConstr(x.sum('*', i) == y[i], f"In_{i}")
+
+    # 3. ROUTE TIME constraints
+    model._return_rows, model._order_rows, model._cap_rows = {}, {}, {}
+    if formulation == "mtz_time":
+        a = model.addVars(N, vtype=GRB.CONTINUOUS, lb=0.0, name="a")    # arrival time
+        for i in N:
+            model.addConstr(a[i] >= t_out[i] * y[i], f"Earliest_{i}")
+            model.addConstr(a[i] >= travel_time[1, i] * x[1, i], f"FromDepot_{i}")
+            model._return_rows[i] = model.addConstr(a[i] + (t_back[i] - tmax) * y[i] <= 0, f"ReturnTime_{i}")
+        for i, j in A:
+            if i != 1 and j != 1:
+                model._order_rows[i, j] = model.addConstr(a[i] - a[j] + x[i, j] <= 0, f"TimeOrder_{i}_{j}")
+        model._u = a
+
+    else:
+        g = model.addVars(A, vtype=GRB.CONTINUOUS, lb=0.0, name="g")    # time on reaching the head
+        for j in N:
+            model.addConstr(g[1, j] == travel_time[1, j] * x[1, j], f"TimeFromDepot_{j}")
+            model.addConstr(g.sum(j, '*') == g.sum('*', j) + quicksum(travel_time[j, k] * x[j, k]
+                                                                      for k in V if (j, k) in x),
+                            f"TimeBalance_{j}")
+        for i, j in A:
+            if i != 1:
+                model.addConstr(g[i, j] >= (t_out[i] + travel_time[i, j]) * x[i, j], f"TimeFloor_{i}_{j}")
+            model._cap_rows[i, j] = model.addConstr(g[i, j] - x[i, j] <= 0, f"TimeCap_{i}_{j}")
+        model._f = g
+
+    # 4. TOTAL TIME constraint
+    total_time = model.addConstr(quicksum(travel_time[i, j] * x[i, j] for i, j in A) <= m * tmax, "TotalTime")
+
+    # 5. CLUSTER COVERAGE constraints
+    for k, cluster in enumerate(clusters):
+        model.addConstr(quicksum(y[i] for i in cluster["nodes"]) >= len(cluster["nodes"]) * z[k], f"Cluster_{k}")
+
+    model._x, model._y, model._z = x, y, z
+    model._formulation = formulation
+    model._limits = (depot_out, depot_in, total_time)
+    model._per_route = True
+    model._depot_times = (t_out, t_back)
+    model._travel_time = travel_time
+    model._update_tmax = _update_tmax
+    model.update()
+    _update_tmax(model, tmax)
+    return model
+
+
+def solve_multi_vehicle_time(instance, m, formulation="mtz_time", tmax_override=None, time_limit=300,
+                             warm_start_model=None, builder="loop", threads=12, model=None, heuristic=False,
+                             start=None, callbacks=()):
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+
+    build_start = time.perf_counter()
+    if model is None:
+        model = build_time_model(instance, m, tmax, formulation, builder=builder)
+    else:
+        set_limits(model, m, tmax)
+    build_time = time.perf_counter() - build_start
+
+    model.Params.OutputFlag = 1
+    model.Params.TimeLimit = time_limit
+    model.Params.Threads = threads
+    model.Params.MIPFocus = 1
+    model.Params.Heuristics = 0.05
+    model.Params.Presolve = 2
+    model.Params.Cuts = 3
+
+    # HEURISTIC START (optional)
+    heuristic_stats = heuristic_start(model, instance, m, tmax) if heuristic else None
+
+    # 6. WARM START (optional): Tours, a result dict of any formulation or a solved model
+    if start is None:
+        start = warm_start_model
+    if start is not None:
+        as_tours(instance, start).write_start(model, instance)
+
+    # SOLVE
+    for callback in callbacks:
+        add_callback(model, callback)
+    optimize(model)
+
+    # RESULT
+    solution = extract_solution(model, instance, m, tmax, build_time)
+    solution["config"]["per_route"] = True
+    if heuristic_stats is not None:
+        solution["heuristic"] = heuristic_stats
+    return solution
+
+
+def solve_multi_vehicle_mtz_time(instance, m, **kwargs):
+    return solve_multi_vehicle_time(instance, m, "mtz_time", **kwargs)
+
+
+def solve_multi_vehicle_scf_time(instance, m, **kwargs):
+    return solve_multi_vehicle_time(instance, m, "scf_time", **kwargs)
@@ -58,7 +58,6 @@ def plot_solution_with_clusters(instance, solution, title=None):
     coords = instance["coords"]
     edges = solution["edges_used"]
     visited = set(solution["selected_nodes"])
-    clusters = instance["clusters"]
     depot = 1
 
     plt.figure(figsize=(9, 7))
@@ -66,16 +65,12 @@ def plot_solution_with_clusters(instance, solution, title=None):
 
     # Cluster colors
     cluster_colors = cm.tab20.colors
-    node_cluster_map = {}
-    for idx, cluster in enumerate(clusters):
-        for node in cluster["nodes"]:
-            node_cluster_map.setdefault(node, []).append(idx)
 
     # Assign each visited node a color based on one of its clusters
     node_colors = {}
     for node in visited:
-        cluster_ids = node_cluster_map.get(node, [])
-        color = cluster_colors[cluster_ids[0] % len(cluster_colors)] if cluster_ids else 'blue'
+        cluster_ids = instance.clusters_of(node)
+        color = cluster_colors[cluster_ids[0] % len(cluster_colors)] if len(cluster_ids) else 'blue'
         node_colors[node] = color
 
     # Plot nodes
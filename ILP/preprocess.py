@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instance reduction shared by all formulations.
+
+Ceil-Euclidean travel times satisfy the triangle inequality, so for a given
+(m, tmax) we can drop, without changing the optimal score:
+  - clusters with a non-positive score,
+  - nodes whose depot round trip alone exceeds the route budget, and every
+    cluster containing such a node,
+  - clusters whose cheapest covering (a spanning tree over the depot and the
+    cluster, and at least the longest depot round trip) exceeds m * tmax,
+  - nodes that belong to no remaining cluster (y fixed to 0),
+  - arcs (i, j) with t[1,i] + t[i,j] + t[j,1] above the route budget.
+
+The reduced instance is renumbered 1..|V'| (depot stays 1); the mapping
+returned next to it translates solutions back to the original ids. The
+reduction leaves few customers, so it relies on every formulation admitting
+a route through all of them (MTZ positions 0..n-1 with big-M n, SCF flows
+of at most n).
+"""
+
+import numpy as np
+
+from data import Instance
+from modelcommon import arc_arrays
+
+
+def _spanning_tree_weight(dist, nodes):
+    # Prim on the (small) complete graph over nodes
+    nodes = np.asarray(nodes)
+    sub = dist[np.ix_(nodes, nodes)]
+    best = sub[0].astype(np.int64)
+    in_tree = np.zeros(len(nodes), dtype=bool)
+    in_tree[0] = True
+    weight = 0
+    for _ in range(len(nodes) - 1):
+        candidates = np.where(in_tree, np.iinfo(np.int64).max, best)
+        j = int(np.argmin(candidates))
+        weight += int(candidates[j])
+        in_tree[j] = True
+        best = np.minimum(best, sub[j])
+    return weight
+
+
+def covering_lower_bound(instance, k):
+    """Lower bound on the total travel time of any set of routes visiting all of cluster k."""
+    members = np.asarray(instance.cluster_members(k), dtype=np.int64) - 1
+    if len(members) == 0:
+        return 0
+    dist = instance.dist
+    round_trip = int((dist[0, members] + dist[members, 0]).max())
+    return max(round_trip, _spanning_tree_weight(dist, np.concatenate([[0], members])))
+
+
+def restrict_instance(instance, keep_nodes, keep_clusters, arc_mask=None):
+    """
+    Sub-instance on the given 0-based node rows (must include the depot row 0)
+    and cluster indices, renumbered to 1..len(keep_nodes).
+    Returns (instance, mapping) where mapping["nodes"][i - 1] is the original
+    id of new node i and mapping["clusters"][k] the original cluster index.
+    """
+    keep_nodes = np.asarray(keep_nodes, dtype=np.int64)
+    keep_clusters = np.asarray(keep_clusters, dtype=np.int64)
+    new_id = np.zeros(len(instance.xy) + 1, dtype=np.int64)
+    new_id[keep_nodes + 1] = np.arange(1, len(keep_nodes) + 1)
+
+    ptr = [0]
+    members = []
+    for k in keep_clusters:
+        nodes = new_id[np.asarray(instance.cluster_members(k), dtype=np.int64)]
+        if np.any(nodes == 0):
+            raise ValueError(f"cluster {k} has nodes outside the kept node set")
+        members.extend(nodes.tolist())
+        ptr.append(len(members))
+
+    sub_mask = None
+    if arc_mask is not None:
+        sub_mask = np.asarray(arc_mask)[np.ix_(keep_nodes, keep_nodes)]
+    elif instance.arc_mask is not None:
+        sub_mask = np.asarray(instance.arc_mask)[np.ix_(keep_nodes, keep_nodes)]
+
+    reduced = Instance(
+        filename=instance.filename,
+        num_nodes=len(keep_nodes),
+        num_clusters=len(keep_clusters),
+        tmax=instance.tmax,
+        xy=np.asarray(instance.xy)[keep_nodes],
+        scores=np.asarray(instance.scores)[keep_clusters],
+        cluster_ids=np.asarray(instance.cluster_ids)[keep_clusters],
+        cluster_ptr=np.array(ptr, dtype=np.int64),
+        cluster_nodes=np.array(members, dtype=np.int32),
+        dist=np.asarray(instance.dist)[np.ix_(keep_nodes, keep_nodes)],
+        arc_mask=sub_mask,
+    )
+    mapping = {"nodes": keep_nodes + 1, "clusters": keep_clusters}
+    return reduced, mapping
+
+
+def model_size(instance, formulation):
+    """(variables, rows) of the static model each builder creates for this instance."""
+    tail, head = arc_arrays(instance)
+    num_nodes = len(instance.xy)
+    A = len(tail)
+    N = num_nodes - 1
+    K = len(instance.scores)
+    inner = int(np.count_nonzero((tail != 1) & (head != 1)))
+    variables = A + N + K
+    rows = 3 + 2 * N + 1 + K                       # depot, degree, time, cluster
+    if formulation == "mtz":
+        variables += N
+        rows += N + inner
+    elif formulation == "scf":
+        variables += A
+        rows += 1 + N + A
+    elif formulation == "mcf":
+        variables += N * A
+        rows += 2 * N + N * max(num_nodes - 2, 0) + N * A
+    elif formulation != "gsec":
+        raise ValueError(f"Unknown formulation {formulation!r}")
+    return variables, rows
+
+
+def reduce_instance(instance, m, tmax, route_budget=None):
+    """
+    Reduce the instance for m vehicles with limit tmax. route_budget is the
+    longest a single route may be: m * tmax for the formulations with one
+    TotalTime row (the default), tmax for per-route formulations.
+    Returns (reduced_instance, mapping, stats).
+    """
+    total_budget = m * tmax
+    if route_budget is None:
+        route_budget = total_budget
+    dist = np.asarray(instance.dist, dtype=np.int64)
+    num_nodes = len(dist)
+    num_clusters = len(instance.scores)
+    round_trip = dist[0] + dist[:, 0]
+
+    # Clusters: positive score, every member reachable, cheap enough to cover
+    near = round_trip <= route_budget
+    alive_clusters = np.asarray(instance.scores) > 0
+    for k in range(num_clusters):
+        if not alive_clusters[k]:
+            continue
+        members = np.asarray(instance.cluster_members(k), dtype=np.int64) - 1
+        if not near[members].all() or covering_lower_bound(instance, k) > total_budget:
+            alive_clusters[k] = False
+
+    # Nodes: the depot plus members of a surviving cluster
+    alive_nodes = np.zeros(num_nodes, dtype=bool)
+    alive_nodes[0] = True
+    for k in np.flatnonzero(alive_clusters):
+        alive_nodes[np.asarray(instance.cluster_members(k), dtype=np.int64) - 1] = True
+
+    # Arcs that fit on a route through the depot
+    arc_mask = (dist[0][:, None] + dist + dist[:, 0][None, :]) <= route_budget
+    if instance.arc_mask is not None:
+        arc_mask &= np.asarray(instance.arc_mask)
+    np.fill_diagonal(arc_mask, False)
+
+    keep_nodes = np.flatnonzero(alive_nodes)
+    keep_clusters = np.flatnonzero(alive_clusters)
+    reduced, mapping = restrict_instance(instance, keep_nodes, keep_clusters, arc_mask=arc_mask)
+
+    arcs_before = len(arc_arrays(instance)[0])
+    arcs_after = len(arc_arrays(reduced)[0])
+    stats = {
+        "nodes_removed": num_nodes - len(keep_nodes),
+        "clusters_removed": num_clusters - len(keep_clusters),
+        "arcs_removed": arcs_before - arcs_after,
+        "model_size": {
+            form: {"variables_removed": model_size(instance, form)[0] - model_size(reduced, form)[0],
+                   "rows_removed": model_size(instance, form)[1] - model_size(reduced, form)[1]}
+            for form in ("mtz", "scf", "mcf", "gsec")
+        },
+    }
+    return reduced, mapping, stats
+
+
+def restore_solution(solution, mapping):
+    """Translate a result dict of a reduced instance back to the original ids (in place)."""
+    nodes = mapping["nodes"].tolist()
+    clusters = mapping["clusters"].tolist()
+    solution["selected_nodes"] = [nodes[i - 1] for i in solution["selected_nodes"]]
+    solution["edges_used"] = [(nodes[i - 1], nodes[j - 1]) for i, j in solution["edges_used"]]
+    solution["covered_clusters"] = [clusters[k] for k in solution["covered_clusters"]]
+    return solution
+
+
+def solve_reduced(solve, instance, m, tmax_override=None, route_budget=None, **kwargs):
+    """
+    Run any solve_multi_vehicle_* function on the reduced instance and return
+    its result in original ids, with the reduction stats under 'preprocessing'.
+    The solved model is in reduced ids, so it is disposed and left out of the
+    result (a start for another solve is Tours.from_result(instance, result)).
+    """
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+    reduced, mapping, stats = reduce_instance(instance, m, tmax, route_budget=route_budget)
+    result = solve(reduced, m, tmax_override=tmax, **kwargs)
+    model = result.pop("model", None)
+    if model is not None:
+        model.dispose()
+    result = restore_solution(result, mapping)
+    result["preprocessing"] = stats
+    return result
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Race several formulations on one instance and keep the first to finish.
+
+Every formulation runs in its own process with an equal share of the
+threads. RaceExchange, a MIP callback in each of them, does three things:
+  - publishes every new incumbent as routes to the other processes,
+  - injects routes received from the others with cbSetSolution, translated
+    into the receiving formulation's variables by Tours.assignment(),
+  - shares its bound, and stops its solve once the best incumbent of the
+    race is within MIPGap of the best bound of the race.
+So the race takes about as long as the fastest formulation on the
+instance. The bounds are only comparable between formulations with the
+same feasible set (e.g. MTZ, SCF, MCF and GSEC), so per-route
+formulations only race each other. A bound below the best incumbent of
+the race proves a disagreement and is ignored, for stopping and for the
+final bound. Incumbents of one formulation that another cannot
+represent are rejected by Gurobi and skipped.
+
+    python race.py instances/eil51s10.data --m 3 --formulations mtz mcf_cluster gsec --threads 12
+"""
+
+import argparse
+import multiprocessing as mp
+import queue
+import time
+
+from gurobipy import GRB
+
+from data import load_instance
+from formulations import BUILDERS, SOLVERS
+from modelcommon import add_callback
+from modeltime import FORMULATIONS as PER_ROUTE
+from solution import Tours
+
+FORMULATIONS = ("mtz", "mcf_cluster", "gsec")
+
+# Relative gap at which the race stops (Gurobi's default MIPGap)
+RACE_GAP = 1e-4
+
+
+class RaceExchange:
+    """MIP callback sharing incumbents and bounds between the processes of a race."""
+
+    def __init__(self, index, instance, inboxes, bounds, best):
+        self.index = index
+        self.instance = instance
+        self.inboxes = inboxes      # one queue per process
+        self.bounds = bounds        # shared array, best bound of each process
+        self.best = best            # shared value, best incumbent of the race
+        self.pending = None         # best received routes not yet injected
+        self.sent = 0
+        self.injected = 0
+
+    def _publish(self, objective, tours):
+        with self.best.get_lock():
+            if objective <= self.best.value + 1e-9:
+                return
+            self.best.value = objective
+        for k, inbox in enumerate(self.inboxes):
+            if k != self.index:
+                inbox.put((objective, tours.routes()))
+        self.sent += 1
+
+    def _receive(self):
+        while True:
+            try:
+                objective, routes = self.inboxes[self.index].get_nowait()
+            except queue.Empty:
+                return
+            if self.pending is None or objective > self.pending[0]:
+                self.pending = (objective, routes)
+
+    def _stop_if_closed(self, model, bound):
+        self.bounds[self.index] = bound
+        incumbent = self.best.value
+        if incumbent == -GRB.INFINITY:
+            return False
+        best_bound = min(_trusted(self.bounds[:], incumbent), default=GRB.INFINITY)
+        if best_bound - incumbent <= RACE_GAP * max(abs(best_bound), 1e-9):
+            model.terminate()
+            return True
+        return False
+
+    def __call__(self, model, where):
+        if where == GRB.Callback.MIPSOL:
+            # score of the depot routes: a separation callback running after this one may still cut the
+            # solution off, so the MIPSOL objective can count clusters visited by subtours
+            x_val = model.cbGetSolution(list(model._x.values()))
+            tours = Tours.from_x(len(self.instance.xy), model, x_val)
+            self._publish(tours.score(self.instance), tours)
+
+        elif where == GRB.Callback.MIPNODE:
+            if self._stop_if_closed(model, model.cbGet(GRB.Callback.MIPNODE_OBJBND)):
+                return
+            self._receive()
+            if self.pending is not None and self.pending[0] > model.cbGet(GRB.Callback.MIPNODE_OBJBST) + 1e-9:
+                tours = Tours.from_routes(len(self.instance.xy), self.pending[1])
+                model.cbSetSolution(*tours.assignment(model, self.instance))
+                # GRB.INFINITY if the routes are infeasible for this formulation
+                if model.cbUseSolution() < GRB.INFINITY:
+                    self.injected += 1
+            self.pending = None
+
+        elif where == GRB.Callback.MIP:
+            self._stop_if_closed(model, model.cbGet(GRB.Callback.MIP_OBJBND))
+
+
+def _trusted(bounds, incumbent):
+    # a bound below an incumbent comes from a formulation that disagrees with the others
+    return [bound for bound in bounds if bound >= incumbent - 1e-6]
+
+
+def _race_worker(index, formulation, instance, m, tmax, threads, time_limit, solve_kwargs, inboxes, bounds, best,
+                 results):
+    try:
+        model = BUILDERS[formulation](instance, m, tmax)
+        exchange = RaceExchange(index, instance, inboxes, bounds, best)
+        add_callback(model, exchange)
+        result = SOLVERS[formulation](instance, m, tmax_override=tmax, model=model, time_limit=time_limit,
+                                      threads=threads, **solve_kwargs)
+        # the final bound also stops the others
+        if result["bound"] is not None:
+            bounds[index] = result["bound"]
+        result.pop("model")
+        result["race"] = {"sent": exchange.sent, "injected": exchange.injected}
+        model.dispose()
+        results.put((index, result, None))
+    except Exception as e:
+        results.put((index, None, str(e)))
+
+
+def solve_race(instance, m, formulations=FORMULATIONS, tmax_override=None, time_limit=300, threads=12,
+               **solve_kwargs):
+    """
+    Race the formulations on (m, tmax) and return the result dict of the best
+    one, with the best bound of all and per-formulation statistics under
+    "race".
+    """
+    if len({formulation in PER_ROUTE for formulation in formulations}) > 1:
+        raise ValueError("per-route formulations have a smaller feasible set; race them only with each other")
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+    began = time.perf_counter()
+    ctx = mp.get_context("spawn")
+    inboxes = [ctx.Queue() for _ in formulations]
+    bounds = ctx.Array("d", [GRB.INFINITY] * len(formulations))
+    best = ctx.Value("d", -GRB.INFINITY)
+    results = ctx.Queue()
+    share = max(threads // len(formulations), 1)
+    workers = [ctx.Process(target=_race_worker,
+                           args=(k, formulation, instance, m, tmax, share, time_limit, solve_kwargs, inboxes, bounds,
+                                 best, results))
+               for k, formulation in enumerate(formulations)]
+    for worker in workers:
+        worker.start()
+    finished = {}
+    for _ in workers:
+        index, result, error = results.get()
+        finished[index] = (result, error)
+    for worker in workers:
+        worker.join()
+
+    entries = {}
+    for k, formulation in enumerate(formulations):
+        result, error = finished[k]
+        entries[formulation] = {"error": error} if result is None else {
+            "status": result["status"], "objective": result["objective"], "bound": result["bound"],
+            "runtime": result["runtime"], **result["race"]}
+    solved = {k: result for k, (result, _) in finished.items() if result is not None}
+    if not solved:
+        raise RuntimeError(f"every formulation of the race failed: {entries}")
+    winner = max(solved, key=lambda k: (solved[k]["objective"] is not None, solved[k]["objective"] or 0,
+                                        -solved[k]["runtime"]))
+    solution = dict(solved[winner])
+    bounds_found = [result["bound"] for result in solved.values() if result["bound"] is not None]
+    if solution["objective"] is not None:
+        bounds_found = _trusted(bounds_found, solution["objective"])
+    solution["bound"] = min(bounds_found, default=None)
+    solution["gap"] = None
+    if solution["bound"] is not None and solution["objective"] is not None:
+        solution["gap"] = (solution["bound"] - solution["objective"]) / solution["bound"] if solution["bound"] else 0.0
+        if solution["gap"] <= RACE_GAP:
+            # the winner may have been stopped by another formulation's bound
+            solution["status"] = GRB.OPTIMAL
+    solution["runtime"] = time.perf_counter() - began
+    solution["race"] = {"formulations": entries, "winner": formulations[winner]}
+    return solution
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("instance")
+    parser.add_argument("--m", type=int, default=2)
+    parser.add_argument("--tmax-factor", type=float, default=1.0)
+    parser.add_argument("--formulations", nargs="+", default=list(FORMULATIONS), choices=sorted(BUILDERS))
+    parser.add_argument("--threads", type=int, default=12, help="total, split evenly between the formulations")
+    parser.add_argument("--time-limit", type=float, default=300)
+    args = parser.parse_args()
+
+    instance = load_instance(args.instance).copy()
+    instance["tmax"] = round(args.tmax_factor * instance["tmax"])
+    result = solve_race(instance, args.m, args.formulations, time_limit=args.time_limit, threads=args.threads)
+    for formulation, entry in result["race"]["formulations"].items():
+        print(f"{formulation:>10}: {entry}")
+    print(f"winner {result['race']['winner']}: objective {result['objective']}, bound {result['bound']}, "
+          f"{result['runtime']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
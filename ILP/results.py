@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Append-only results store in SQLite.
+
+One row per solve of (instance, formulation, m, tmax, seed) with the scalar
+columns needed for comparison tables and the routes packed as int16
+successor arrays (solution.Tours). Rows are never updated; the `latest` view
+keeps the newest row per key. The database runs in WAL mode and every
+append is its own short transaction, so the workers of a parallel sweep can
+write to the same file.
+
+    store = ResultStore("results.sqlite")
+    store.append("eil51s10", "mtz", result, feasible=True)
+    df = store.load(formulation="mtz")
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from solution import Tours
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    instance TEXT NOT NULL,
+    formulation TEXT NOT NULL,
+    m INTEGER NOT NULL,
+    tmax INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    objective REAL,
+    bound REAL,
+    gap REAL,
+    runtime REAL,
+    build_time REAL,
+    status INTEGER,
+    vehicles_used INTEGER,
+    feasible INTEGER,
+    reason TEXT,
+    succ BLOB,
+    first BLOB,
+    extra TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_key ON results (instance, formulation, m, tmax, seed);
+CREATE VIEW IF NOT EXISTS latest AS
+    SELECT * FROM results WHERE id IN (
+        SELECT MAX(id) FROM results GROUP BY instance, formulation, m, tmax, seed);
+"""
+
+SCALARS = ("objective", "bound", "gap", "runtime", "build_time", "status", "vehicles_used")
+COLUMNS = ("id", "instance", "formulation", "m", "tmax", "seed") + SCALARS + ("feasible", "reason", "created")
+
+# Result keys stored as columns or routes; everything else JSON-encodable goes to `extra`
+# (including config, whose per_route flag the validator needs)
+_STORED = set(SCALARS) | {"model", "selected_nodes", "covered_clusters", "edges_used", "feasibility_check"}
+
+
+def _to_json(value):
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(type(value).__name__)
+
+
+def _extra(result):
+    extra = {}
+    for key, value in result.items():
+        if key in _STORED:
+            continue
+        try:
+            json.dumps(value, default=_to_json)
+        except TypeError:
+            continue
+        extra[key] = value
+    return json.dumps(extra, default=_to_json)
+
+
+class ResultStore:
+    def __init__(self, path="results.sqlite", timeout=60.0):
+        self.path = path
+        self.timeout = timeout
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    def append(self, instance, formulation, result, feasible=None, reason=None, num_nodes=None):
+        """Append one result dict (as returned by the solve_multi_vehicle_* functions)."""
+        check = result.get("feasibility_check")
+        if feasible is None and check is not None:
+            feasible, reason = check["passed"], check["reason"]
+        config = result["config"]
+        edges = result.get("edges_used") or []
+        if num_nodes is None:
+            num_nodes = max([max(arc) for arc in edges], default=1)
+        tours = Tours.from_edges(num_nodes, edges)
+        row = (
+            instance, formulation, int(config["m"]), int(config["tmax"]), int(config.get("seed", 0)),
+            *[result.get(key) for key in SCALARS],
+            None if feasible is None else int(bool(feasible)), reason,
+            tours.succ.astype("<i2").tobytes(), tours.first.astype("<i2").tobytes(),
+            _extra(result), time.time(),
+        )
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO results (instance, formulation, m, tmax, seed, objective, bound, gap, runtime, "
+                    "build_time, status, vehicles_used, feasible, reason, succ, first, extra, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def query(self, sql, params=()):
+        """Run any SELECT against the `results` table or the `latest` view."""
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    def load(self, instance=None, formulation=None, m=None, tmax=None, latest=True, extra=False):
+        """Scalar columns as a DataFrame, optionally filtered; latest=False returns every appended row."""
+        columns = list(COLUMNS) + (["extra"] if extra else [])
+        where, params = [], []
+        for name, value in (("instance", instance), ("formulation", formulation), ("m", m), ("tmax", tmax)):
+            if value is not None:
+                where.append(f"{name} = ?")
+                params.append(value)
+        sql = f"SELECT {', '.join(columns)} FROM {'latest' if latest else 'results'}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        df = self.query(sql + " ORDER BY instance, formulation, m, tmax, seed, id", params)
+        if extra:
+            df["extra"] = df["extra"].map(json.loads)
+        return df
+
+    def tours(self, row_id):
+        """The routes stored with a row, as solution.Tours."""
+        conn = self._connect()
+        try:
+            succ, first = conn.execute("SELECT succ, first FROM results WHERE id = ?", (row_id,)).fetchone()
+        finally:
+            conn.close()
+        return Tours(np.frombuffer(succ, dtype="<i2"), np.frombuffer(first, dtype="<i2"))
+
+    def import_pickles(self, folders=("results_mtz", "results_scf", "results_mcf", "results_gsec")):
+        """Append the result pickles written by the main*.py scripts; returns the number of rows added."""
+        added = 0
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+            formulation = folder.split("_", 1)[1]
+            for filename in sorted(os.listdir(folder)):
+                if not filename.endswith(".pkl"):
+                    continue
+                with open(os.path.join(folder, filename), "rb") as f:
+                    result = pickle.load(f)
+                instance = filename.split(f"_{formulation}_")[0]
+                self.append(instance, formulation, result)
+                added += 1
+        return added
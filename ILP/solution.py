@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Formulation-neutral solutions.
+
+Tours stores a set of depot routes as successor arrays: succ[i] is the node
+visited after customer i (1 for the depot, 0 if i is not visited) and
+first[r] the first customer of route r. Any formulation's result, a solved
+model or the heuristic's routes can be turned into Tours, and write_start()
+turns Tours into a complete MIP start for any of the models, so a tour
+found by a cheap formulation can seed an expensive one.
+"""
+
+import numpy as np
+
+from modelmatrix import commodity_groups
+
+
+class Tours:
+    """Depot routes as successor arrays, indexed by node id."""
+
+    __slots__ = ("succ", "first")
+
+    def __init__(self, succ, first):
+        self.succ = np.asarray(succ, dtype=np.int64)
+        self.first = np.asarray(first, dtype=np.int64)
+
+    @classmethod
+    def from_routes(cls, num_nodes, routes):
+        succ = np.zeros(num_nodes + 1, dtype=np.int64)
+        for route in routes:
+            for i, j in zip(route, route[1:] + [1]):
+                succ[i] = j
+        return cls(succ, [route[0] for route in routes if route])
+
+    @classmethod
+    def from_edges(cls, num_nodes, edges):
+        """Routes through the depot in an arc list; arcs on cycles that miss the depot are dropped."""
+        succ = np.zeros(num_nodes + 1, dtype=np.int64)
+        first = []
+        for i, j in edges:
+            if i == 1:
+                first.append(j)
+            else:
+                succ[i] = j
+        reached = np.zeros(num_nodes + 1, dtype=bool)
+        for i in first:
+            while i != 1 and not reached[i]:
+                reached[i] = True
+                i = succ[i]
+        succ[~reached] = 0
+        return cls(succ, [i for i in first if i != 1])
+
+    @classmethod
+    def from_undirected(cls, num_nodes, edges):
+        """
+        Routes through the depot in an undirected edge list (modelsym.py), each
+        oriented away from the depot; a depot edge listed twice is a
+        single-customer route.
+        """
+        neighbors = [[] for _ in range(num_nodes + 1)]
+        for i, j in edges:
+            neighbors[i].append(j)
+            neighbors[j].append(i)
+        on_route = np.zeros(num_nodes + 1, dtype=bool)
+        routes = []
+        for first in neighbors[1]:
+            if on_route[first]:
+                continue
+            route, prev, i = [], 1, first
+            while i != 1 and not on_route[i]:
+                on_route[i] = True
+                route.append(i)
+                prev, i = i, next((j for j in neighbors[i] if j != prev), prev)
+            routes.append(route)
+        return cls.from_routes(num_nodes, routes)
+
+    @classmethod
+    def from_x(cls, num_nodes, model, x_val):
+        """Tours of x values (in the order of model._x) of a model of any formulation."""
+        if model._formulation.endswith("_sym"):
+            edges = [e for e, v in zip(model._x.keys(), x_val) for _ in range(int(round(v)))]
+            return cls.from_undirected(num_nodes, edges)
+        return cls.from_edges(num_nodes, [a for a, v in zip(model._x.keys(), x_val) if v > 0.5])
+
+    @classmethod
+    def from_result(cls, instance, result):
+        return cls.from_edges(len(instance.xy), result["edges_used"])
+
+    @classmethod
+    def from_model(cls, instance, model):
+        """Tours of the incumbent of a solved model of any formulation."""
+        return cls.from_x(len(instance.xy), model, model.getAttr("X", list(model._x.values())))
+
+    def routes(self):
+        routes = []
+        for i in self.first.tolist():
+            route = []
+            while i > 1:
+                route.append(i)
+                i = int(self.succ[i])
+            routes.append(route)
+        return routes
+
+    def visited(self):
+        return np.flatnonzero(self.succ)
+
+    def covered_clusters(self, instance):
+        on_route = self.succ != 0
+        members = np.asarray(instance.cluster_nodes, dtype=np.int64)
+        owner = np.repeat(np.arange(len(instance.scores)), np.diff(instance.cluster_ptr))
+        missing = np.bincount(owner[~on_route[members]], minlength=len(instance.scores))
+        return np.flatnonzero(missing == 0)
+
+    def score(self, instance):
+        return int(np.asarray(instance.scores)[self.covered_clusters(instance)].sum())
+
+    def __repr__(self):
+        return f"Tours({self.routes()})"
+
+    def start_values(self, instance, formulation, arcs, customers, num_clusters, flow_arcs=None):
+        """
+        Start value of every variable of a formulation: lists for x (in the
+        order of arcs), y (customers), z (cluster ids) and u or f. For the
+        symmetric variants (modelsym.py) arcs are the edges (i < j) and
+        flow_arcs the directed arcs that f is indexed by.
+        """
+        routes = self.routes()
+        symmetric = formulation.endswith("_sym")
+        flow_arcs = arcs if flow_arcs is None else flow_arcs
+        x_index = {arc: a for a, arc in enumerate(arcs)}
+        arc_index = {arc: a for a, arc in enumerate(flow_arcs)}
+        customer_index = {i: k for k, i in enumerate(customers)}
+        x_start = np.zeros(len(arcs))
+        y_start = np.zeros(len(customers))
+        for route in routes:
+            path = [1] + route + [1]
+            for arc in zip(path[:-1], path[1:]):
+                key = (min(arc), max(arc)) if symmetric else arc
+                if key in x_index:
+                    # a single-customer route uses its depot edge twice
+                    x_start[x_index[key]] += 1.0
+            for i in route:
+                y_start[customer_index[i]] = 1.0
+        z_start = np.zeros(num_clusters)
+        z_start[self.covered_clusters(instance)] = 1.0
+        values = {"x": x_start.tolist(), "y": y_start.tolist(), "z": z_start.tolist()}
+
+        if formulation == "mtz":
+            # position along the route
+            u_start = np.zeros(len(customers))
+            for route in routes:
+                for pos, i in enumerate(route):
+                    u_start[customer_index[i]] = float(pos)
+            values["u"] = u_start.tolist()
+
+        elif formulation in ("scf", "scf_sym"):
+            # FlowFromDepot ships len(route) per route and every visit keeps one unit
+            f_start = np.zeros(len(flow_arcs))
+            for route in routes:
+                path = [1] + route + [1]
+                for pos, arc in enumerate(zip(path[:-1], path[1:])):
+                    if arc in arc_index:
+                        f_start[arc_index[arc]] = float(len(route) - pos)
+            values["f"] = f_start.tolist()
+
+        elif formulation in ("mcf", "mcf_sym"):
+            # commodity k follows its route from the depot up to k
+            f_start = np.zeros(len(customers) * len(flow_arcs))
+            for route in routes:
+                path = [1] + route
+                for pos, k in enumerate(route, start=1):
+                    for arc in zip(path[:pos], path[1:pos + 1]):
+                        if arc in arc_index:
+                            f_start[customer_index[k] * len(flow_arcs) + arc_index[arc]] = 1.0
+            values["f"] = f_start.tolist()
+
+        elif formulation == "mcf_cluster":
+            # commodity g carries one unit for every member of group g still ahead on the route
+            groups = commodity_groups(instance, np.asarray(customers, dtype=np.int64))
+            f_start = np.zeros(len(groups) * len(flow_arcs))
+            for g, nodes in enumerate(groups):
+                members = set(nodes.tolist())
+                for route in routes:
+                    path = [1] + route
+                    ahead = sum(1 for i in route if i in members)
+                    for arc in zip(path[:-1], path[1:]):
+                        if arc in arc_index:
+                            f_start[g * len(flow_arcs) + arc_index[arc]] = float(ahead)
+                        ahead -= arc[1] in members
+            values["f"] = f_start.tolist()
+
+        elif formulation in ("mtz_time", "scf_time"):
+            # modeltime.py: u is the arrival time at a customer, f the time on reaching the head of an arc
+            dist = np.asarray(instance.dist)
+            u_start = np.zeros(len(customers))
+            f_start = np.zeros(len(flow_arcs))
+            for route in routes:
+                path = [1] + route + [1]
+                elapsed = 0
+                for arc in zip(path[:-1], path[1:]):
+                    elapsed += int(dist[arc[0] - 1, arc[1] - 1])
+                    if arc[1] != 1:
+                        u_start[customer_index[arc[1]]] = float(elapsed)
+                    if arc in arc_index:
+                        f_start[arc_index[arc]] = float(elapsed)
+            if formulation == "mtz_time":
+                values["u"] = u_start.tolist()
+            else:
+                values["f"] = f_start.tolist()
+        return values
+
+    def assignment(self, model, instance):
+        """(variables, values) of a complete solution (x, y, z and u or f) of a built model of any formulation."""
+        x, y, z = model._x, model._y, model._z
+        values = self.start_values(instance, model._formulation, list(x.keys()), list(y.keys()), len(z),
+                                   getattr(model, "_flow_arcs", None))
+        variables = list(x.values()) + list(y.values()) + list(z.values())
+        assigned = values["x"] + values["y"] + values["z"]
+        if "u" in values:
+            variables += list(model._u.values())
+            assigned += values["u"]
+        if "f" in values:
+            f = model._f
+            variables += list(f.values()) if hasattr(f, "values") else f.tolist()
+            assigned += values["f"]
+        return variables, assigned
+
+    def write_start(self, model, instance):
+        """Set a complete MIP start (x, y, z and u or f) on a built model of any formulation."""
+        model.update()
+        model.setAttr("Start", *self.assignment(model, instance))
+
+
+def as_tours(instance, start):
+    """Tours from Tours, a result dict of any formulation, or a solved Gurobi model."""
+    if isinstance(start, Tours):
+        return start
+    if isinstance(start, dict):
+        return Tours.from_result(instance, start)
+    return Tours.from_model(instance, start)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Content-addressed solve cache for resumable sweeps.
+
+A solve is keyed by a hash of the instance contents, the formulation, m,
+tmax, the solve options, the time limit and the source of the model code,
+so a stored result is only reused when it really came from the same inputs.
+Each key has a directory under .cache/solves/ holding
+  - result.pkl      the finished result (the key is then skipped), or
+  - checkpoint.pkl  the incumbent (as solution.Tours) and bound of a solve
+                    that was interrupted, written from a MIP callback.
+Resuming a checkpoint warm-starts from its incumbent with the time that is
+left of the original limit, and stops as soon as the incumbent reaches the
+bound that was already proven.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+from gurobipy import GRB
+
+from solution import Tours
+
+# Seconds between checkpoints of the bound (new incumbents are always written)
+CHECKPOINT_INTERVAL = 30.0
+
+# Source files whose contents define the model and solve behaviour
+# (the solvers of formulations.SOLVERS and backends.py, the callbacks that change a solve, the instrumented
+# solve loop and the incremental sweep that starts one solve from another)
+_CODE_PATTERNS = ("model*.py", "heuristic.py", "preprocess.py", "solution.py", "formulations.py", "colgen.py",
+                  "backends.py", "cuts.py", "localsearch.py", "instrument.py", "incremental.py")
+
+# Solve options that are inputs rather than settings
+_UNHASHED = ("model", "start", "warm_start_model", "callbacks")
+
+_code_version = None
+
+
+def code_version():
+    global _code_version
+    if _code_version is None:
+        h = hashlib.sha1()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for pattern in _CODE_PATTERNS:
+            for path in sorted(glob.glob(os.path.join(here, pattern))):
+                with open(path, "rb") as f:
+                    h.update(os.path.basename(path).encode())
+                    h.update(f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+
+def instance_digest(instance):
+    h = hashlib.sha1()
+    for name in ("xy", "dist", "scores", "cluster_ptr", "cluster_nodes"):
+        h.update(np.ascontiguousarray(getattr(instance, name)).tobytes())
+    if instance.arc_mask is not None:
+        h.update(np.ascontiguousarray(instance.arc_mask).tobytes())
+    return h.hexdigest()
+
+
+def solve_key(instance, formulation, m, tmax, time_limit, options):
+    payload = {
+        "instance": instance_digest(instance),
+        "formulation": formulation,
+        "m": int(m),
+        "tmax": int(tmax),
+        "time_limit": time_limit,
+        "options": {key: value for key, value in sorted(options.items()) if key not in _UNHASHED},
+        "code": code_version(),
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _write_pickle(path, obj):
+    # Atomic replace, so a kill never leaves a truncated file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _read_pickle(path):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+class Checkpointer:
+    """MIP callback that saves the incumbent and bound of a running solve."""
+
+    def __init__(self, path, instance, elapsed=0.0, stop_at=None, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.instance = instance
+        self.elapsed = elapsed      # runtime of earlier, interrupted attempts
+        self.stop_at = stop_at      # bound proven by an earlier attempt
+        self.interval = interval
+        self.state = _read_pickle(path) or {"tours": None, "objective": None, "bound": None}
+        self.last_write = 0.0
+        self.stopped = False
+        self.lazy_seen = 0
+
+    def _bound(self, bound):
+        # An earlier attempt may have proven a tighter bound than this one has so far
+        if self.state["bound"] is not None:
+            bound = min(bound, self.state["bound"])
+        self.state["bound"] = bound
+
+    def _write(self, runtime):
+        self.state["elapsed"] = self.elapsed + runtime
+        self.state["time"] = time.time()
+        _write_pickle(self.path, self.state)
+        self.last_write = runtime
+
+    def __call__(self, model, where):
+        if where == GRB.Callback.MIPSOL:
+            lazy_added = getattr(model, "_lazy_added", 0)
+            if lazy_added != self.lazy_seen:
+                # A separation callback ran first and cut this solution off
+                self.lazy_seen = lazy_added
+                return
+            objective = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+            if self.state["objective"] is None or objective > self.state["objective"]:
+                x_val = model.cbGetSolution(list(model._x.values()))
+                self.state["tours"] = Tours.from_x(len(self.instance.xy), model, x_val)
+                self.state["objective"] = objective
+                self._bound(model.cbGet(GRB.Callback.MIPSOL_OBJBND))
+                self._write(model.cbGet(GRB.Callback.RUNTIME))
+            if self.stop_at is not None and objective >= self.stop_at - 1e-6:
+                self.stopped = True
+                model.terminate()
+        elif where == GRB.Callback.MIP:
+            runtime = model.cbGet(GRB.Callback.RUNTIME)
+            if runtime - self.last_write >= self.interval:
+                self._bound(model.cbGet(GRB.Callback.MIP_OBJBND))
+                self._write(runtime)
+
+
+def cached_solve(solve, instance, formulation, m, tmax_override=None, time_limit=300, cache_dir=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, checkpoint=True, **kwargs):
+    """
+    solve(instance, m, ...) through the cache: a finished key returns the
+    stored result, an interrupted one resumes from its checkpoint. The result
+    gets a 'cache' entry with the key and what was reused. checkpoint=False
+    skips the checkpoint callback, for solvers that take no Gurobi callbacks.
+    """
+    tmax = tmax_override if tmax_override is not None else instance['tmax']
+    cache_dir = cache_dir or os.path.join(".cache", "solves")
+    key = solve_key(instance, formulation, m, tmax, time_limit, kwargs)
+    entry = os.path.join(cache_dir, key)
+    os.makedirs(entry, exist_ok=True)
+    result_path = os.path.join(entry, "result.pkl")
+    checkpoint_path = os.path.join(entry, "checkpoint.pkl")
+
+    result = _read_pickle(result_path)
+    if result is not None:
+        result["cache"] = {"key": key, "hit": True, "resumed_after": 0.0}
+        return result
+
+    if not checkpoint:
+        result = solve(instance, m, tmax_override=tmax, time_limit=time_limit, **kwargs)
+        result["cache"] = {"key": key, "hit": False, "resumed_after": 0.0}
+        _write_pickle(result_path, {k: v for k, v in result.items() if k != "model"})
+        return result
+
+    checkpoint = _read_pickle(checkpoint_path)
+    elapsed = checkpoint.get("elapsed", 0.0) if checkpoint else 0.0
+    checkpointer = Checkpointer(checkpoint_path, instance, elapsed=elapsed,
+                                stop_at=checkpoint.get("bound") if checkpoint else None,
+                                interval=checkpoint_interval)
+    if checkpoint and checkpoint.get("tours") is not None and "start" not in kwargs:
+        kwargs["start"] = checkpoint["tours"]
+    kwargs["callbacks"] = tuple(kwargs.get("callbacks", ())) + (checkpointer,)
+
+    result = solve(instance, m, tmax_override=tmax, time_limit=max(time_limit - elapsed, 1.0), **kwargs)
+    result["cache"] = {"key": key, "hit": False, "resumed_after": elapsed}
+    if checkpointer.stop_at is not None and result["objective"] is not None:
+        # The bound proven before the interruption still holds
+        result["bound"] = min(result["bound"], checkpointer.stop_at)
+        result["gap"] = (result["bound"] - result["objective"]) / result["bound"] if result["bound"] else 0.0
+
+    if result["status"] == GRB.INTERRUPTED and not checkpointer.stopped:
+        # Stopped by the user: keep the checkpoint for the next attempt
+        return result
+    _write_pickle(result_path, {k: v for k, v in result.items() if k != "model"})
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return result
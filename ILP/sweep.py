@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel sweep runner: instances x formulations x m_values x tmax_factors on
+a process pool, with the cores split between concurrent solves (e.g. 4 jobs
+x 3 Gurobi threads on a 12-core box). Jobs are started largest-first so the
+long MCF solves on the 70-76 node instances do not end up as a serial tail.
+
+Results are saved exactly like the main*.py scripts do.
+
+    python sweep.py --formulations mtz scf --cores 12 --threads 3
+"""
+
+import argparse
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+from backends import BACKENDS, backend_solver
+from data import load_all_data_files, load_instance
+from formulations import CHECKERS, SOLVERS
+from incremental import PersistentModel, solve_order
+from instrument import solve_instrumented
+from preprocess import model_size, solve_reduced
+from results import ResultStore
+from solvecache import cached_solve
+
+# Configurable parameters (same defaults as mainmtz.py / mainscf.py)
+m_values = [1, 2, 3, 4]
+tmax_factors = [0.5, 0.8, 1.0, 1.2, 1.5]
+time_limit = 900
+
+
+def estimate_difficulty(instance, formulation, m, factor):
+    # Ordering heuristic only: static model size, larger budgets search more routes.
+    # Variants (_sym, _time, _cluster) are sized as their base model, colgen as the smallest (gsec)
+    base = formulation.split("_")[0]
+    variables, rows = model_size(instance, base if base in ("mtz", "scf", "mcf") else "gsec")
+    return (variables + rows) * (1.0 + factor) * (1.0 + 0.1 * m)
+
+
+def make_jobs(instances, paths, formulations, m_values, tmax_factors):
+    jobs = []
+    for inst, path in zip(instances, paths):
+        for formulation in formulations:
+            for m in m_values:
+                for factor in tmax_factors:
+                    jobs.append({
+                        "path": path,
+                        "name": inst["filename"].replace(".data", ""),
+                        "formulation": formulation,
+                        "m": m,
+                        "factor": factor,
+                        "tmax": round(factor * inst["tmax"]),
+                        "difficulty": estimate_difficulty(inst, formulation, m, factor),
+                    })
+    jobs.sort(key=lambda job: job["difficulty"], reverse=True)
+    return jobs
+
+
+def _save(job, inst_copy, result, output_root, store=None):
+    feasible, reason = CHECKERS[job["formulation"]](inst_copy, result)
+
+    # Strip Gurobi model before saving
+    result_to_save = result.copy()
+    if "model" in result_to_save:
+        del result_to_save["model"]
+    result_to_save["feasibility_check"] = {
+        "passed": feasible,
+        "reason": reason
+    }
+
+    formulation = job["formulation"]
+    if result.get("backend", "gurobi") != "gurobi":
+        formulation += f"_{result['backend']}"
+    folder = os.path.join(output_root, f"results_{formulation}")
+    os.makedirs(folder, exist_ok=True)
+    filename = f"{job['name']}_{formulation}_m{job['m']}_tmax{job['tmax']}.pkl"
+    with open(os.path.join(folder, filename), "wb") as f:
+        pickle.dump(result_to_save, f)
+    if store is not None:
+        store.append(job["name"], formulation, result_to_save, num_nodes=len(inst_copy.xy))
+    return feasible
+
+
+def _summary(job):
+    return {key: job[key] for key in ("name", "formulation", "m", "tmax")}
+
+
+def run_job(job, threads, time_limit, builder="matrix", preprocess=False, output_root=".", heuristic=False,
+            store=None, cache_dir=None, instrument=False, backend="gurobi"):
+    """Solve, check and save (to the ResultStore store, if any) one configuration; returns a small summary dict."""
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    summary = _summary(job)
+    try:
+        inst_copy = load_instance(job["path"]).copy()
+        inst_copy["tmax"] = job["tmax"]
+        solve = SOLVERS[job["formulation"]]
+        formulation = job["formulation"]
+        kwargs = dict(tmax_override=job["tmax"], time_limit=time_limit, builder=builder, threads=threads,
+                      heuristic=heuristic)
+        if backend != "gurobi":
+            solve = backend_solver(formulation, backend)
+            formulation += f"_{backend}"
+        if instrument:
+            solve = partial(solve_instrumented, solve)
+        if preprocess:
+            solve = partial(solve_reduced, solve)
+            formulation += "+reduced"
+        if cache_dir is not None:
+            result = cached_solve(solve, inst_copy, formulation, job["m"], cache_dir=cache_dir,
+                                  checkpoint=backend == "gurobi", **kwargs)
+        else:
+            result = solve(inst_copy, job["m"], **kwargs)
+        feasible = _save(job, inst_copy, result, output_root, store)
+        summary.update(objective=result["objective"], status=result["status"], gap=result["gap"],
+                       feasible=feasible, error=None)
+    except Exception as e:
+        summary.update(objective=None, status=None, gap=None, feasible=False, error=str(e))
+    summary["wall"] = time.perf_counter() - wall_start
+    summary["cpu"] = time.process_time() - cpu_start
+    return [summary]
+
+
+def group_jobs(jobs):
+    """One group per (instance, formulation), configurations in incremental.solve_order(), largest group first."""
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job["path"], job["formulation"]), []).append(job)
+    ordered = []
+    for group in groups.values():
+        by_config = {(job["m"], job["tmax"]): job for job in group}
+        ordered.append([by_config[config] for config in solve_order(by_config)])
+    ordered.sort(key=lambda group: sum(job["difficulty"] for job in group), reverse=True)
+    return ordered
+
+
+def run_group(group, threads, time_limit, builder="matrix", output_root=".", propagate_bounds=True,
+              heuristic=False, store=None, instrument=False):
+    """Solve a group of configurations on one PersistentModel; returns one summary per job."""
+    instance = load_instance(group[0]["path"])
+    persistent = PersistentModel(instance, group[0]["formulation"], propagate_bounds=propagate_bounds,
+                                 time_limit=time_limit, builder=builder, threads=threads, heuristic=heuristic,
+                                 instrument=instrument)
+    summaries = []
+    try:
+        for job in group:
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            summary = _summary(job)
+            try:
+                result = persistent.solve(job["m"], job["tmax"])
+                inst_copy = instance.copy()
+                inst_copy["tmax"] = job["tmax"]
+                feasible = _save(job, inst_copy, result, output_root, store)
+                summary.update(objective=result["objective"], status=result["status"], gap=result["gap"],
+                               feasible=feasible, error=None, skipped=result.get("bounds", {}).get("skipped", False))
+            except Exception as e:
+                summary.update(objective=None, status=None, gap=None, feasible=False, error=str(e))
+            summary["wall"] = time.perf_counter() - wall_start
+            summary["cpu"] = time.process_time() - cpu_start
+            summaries.append(summary)
+    finally:
+        persistent.dispose()
+    return summaries
+
+
+def run_sweep(jobs, cores=None, threads=3, time_limit=time_limit, builder="matrix", preprocess=False,
+              output_root=".", incremental=False, propagate_bounds=True, heuristic=False, store=None,
+              cache_dir=None, instrument=False, backend="gurobi"):
+    """
+    Run the jobs on cores // threads worker processes with `threads` Gurobi
+    threads each. With incremental=True each worker re-solves one model per
+    (instance, formulation) over its configurations (incremental.py), passing
+    bounds between them unless propagate_bounds=False. heuristic=True
+    MIP-starts every solve without an earlier incumbent from heuristic.py.
+    Results are pickled like main*.py does and, if store is a path, also
+    appended to that results.ResultStore, opened once here and passed to the
+    workers (it only holds the path, and connects per append). With a cache_dir the (non
+    incremental) solves go through solvecache, so a killed sweep resumes.
+    instrument=True records the trajectory of every solve (instrument.py).
+    backend picks the solver of the non-incremental solves (backends.py).
+    Returns (summaries, totals) where totals compares the wall-clock time
+    with the CPU time summed over all jobs.
+    """
+    if incremental and preprocess:
+        raise ValueError("preprocessing depends on (m, tmax) and cannot be combined with incremental solves")
+    if backend != "gurobi" and (incremental or instrument or builder != "matrix"):
+        raise ValueError("incremental and instrumented solves and the loop builder need the Gurobi backend")
+    cores = cores or os.cpu_count() or 1
+    threads = max(1, min(threads, cores))
+    workers = max(1, cores // threads)
+    if store is not None:
+        store = ResultStore(store)      # create the schema once, before the workers append
+    print(f"Running {len(jobs)} jobs on {workers} workers x {threads} threads")
+
+    wall_start = time.perf_counter()
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if incremental:
+            futures = [pool.submit(run_group, group, threads, time_limit, builder, output_root, propagate_bounds,
+                                   heuristic, store, instrument)
+                       for group in group_jobs(jobs)]
+        else:
+            futures = [pool.submit(run_job, job, threads, time_limit, builder, preprocess, output_root, heuristic,
+                                   store, cache_dir, instrument, backend)
+                       for job in jobs]
+        for future in as_completed(futures):
+            for s in future.result():
+                summaries.append(s)
+                if s["error"]:
+                    print(f"Error solving {s['name']} ({s['formulation']}, m={s['m']}, tmax={s['tmax']}): "
+                          f"{s['error']}")
+                else:
+                    print(f"[{len(summaries)}/{len(jobs)}] {s['name']} {s['formulation']} m={s['m']} "
+                          f"tmax={s['tmax']}: score={s['objective']} wall={s['wall']:.1f}s cpu={s['cpu']:.1f}s")
+    wall = time.perf_counter() - wall_start
+
+    cpu = sum(s["cpu"] for s in summaries)
+    totals = {
+        "jobs": len(summaries),
+        "workers": workers,
+        "threads": threads,
+        "wall": wall,
+        "cpu": cpu,
+        "serial_wall": sum(s["wall"] for s in summaries),
+        "utilization": cpu / (wall * workers * threads) if wall > 0 else None,
+        "skipped": sum(1 for s in summaries if s.get("skipped")),
+    }
+    print(f"\nWall-clock: {wall:.1f}s, total CPU: {cpu:.1f}s, sum of job wall times: {totals['serial_wall']:.1f}s, "
+          f"core utilization: {totals['utilization']:.0%}")
+    if incremental:
+        print(f"Solves skipped on propagated bounds: {totals['skipped']}")
+    return summaries, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", default="instances")
+    parser.add_argument("--formulations", nargs="+", default=["mtz", "scf"], choices=sorted(SOLVERS))
+    parser.add_argument("--m", nargs="+", type=int, default=m_values)
+    parser.add_argument("--tmax-factors", nargs="+", type=float, default=tmax_factors)
+    parser.add_argument("--time-limit", type=float, default=time_limit)
+    parser.add_argument("--cores", type=int, default=None, help="cores to use (default: all)")
+    parser.add_argument("--threads", type=int, default=3, help="Gurobi threads per job")
+    parser.add_argument("--builder", choices=["loop", "matrix"], default="matrix")
+    parser.add_argument("--preprocess", action="store_true", help="solve the reduced instances (preprocess.py)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="re-solve one model per instance and formulation (incremental.py)")
+    parser.add_argument("--no-bounds", action="store_true",
+                        help="with --incremental, do not pass bounds between configurations")
+    parser.add_argument("--heuristic", action="store_true", help="MIP-start from the greedy routes (heuristic.py)")
+    parser.add_argument("--store", default="results.sqlite", help="results database (results.py)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="solve cache for resumable sweeps (solvecache.py), e.g. .cache/solves")
+    parser.add_argument("--instrument", action="store_true",
+                        help="record presolve/root times and the incumbent/bound trajectory (instrument.py)")
+    parser.add_argument("--backend", choices=BACKENDS, default="gurobi", help="solver backend (backends.py)")
+    args = parser.parse_args()
+
+    # Loading through the cache up front means workers only memory-map
+    instances = load_all_data_files(args.instances)
+    paths = [os.path.join(args.instances, inst["filename"]) for inst in instances]
+    jobs = make_jobs(instances, paths, args.formulations, args.m, args.tmax_factors)
+    run_sweep(jobs, cores=args.cores, threads=args.threads, time_limit=args.time_limit,
+              builder=args.builder, preprocess=args.preprocess, incremental=args.incremental,
+              propagate_bounds=not args.no_bounds, heuristic=args.heuristic, store=args.store,
+              cache_dir=args.cache_dir, instrument=args.instrument, backend=args.backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+ILP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ILP_DIR)
+
+
+@pytest.fixture
+def load():
+    """Instance loader by name, e.g. load("pr10s2")."""
+    from data import load_instance
+    return lambda name: load_instance(os.path.join(ILP_DIR, "instances", f"{name}.data"))
@@ -0,0 +1,28 @@
+import warnings
+
+import numpy as np
+import pytest
+
+pytest.importorskip("gurobipy")
+
+from gurobipy import GRB
+
+from colgen import lagrangian_bound, solve_colgen, visit_times
+
+
+def test_lagrangian_bound_skips_unreachable_customers(load):
+    instance = load("eil15s5")
+    dist = np.asarray(instance.dist, dtype=np.int64)
+    h = visit_times(dist, instance["tmax"])
+    weights = np.ones(len(h))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        bound = lagrangian_bound(10.0, weights, 0.0, 5.0, 1, h, instance["tmax"])
+    assert np.isfinite(bound)
+
+
+def test_colgen_proves_the_optimum(load):
+    result = solve_colgen(load("eil15s5"), 1, time_limit=60, threads=1)
+    assert result["colgen"]["lp_optimal"]
+    assert result["status"] == GRB.OPTIMAL
+    assert round(result["objective"]) == 20
@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("gurobipy")
+
+from formulations import SOLVERS
+from incremental import solve_configurations
+from validate import validate
+
+
+def test_per_route_configurations_reuse_only_fitting_incumbents(load):
+    instance = load("pr10s2")
+    tmax = instance["tmax"]
+    configs = [(m, round(factor * tmax)) for m in (1, 2) for factor in (0.3, 0.5, 1.0)]
+    results = list(solve_configurations(instance, "mtz_time", configs, threads=1, time_limit=30))
+
+    assert len(results) == len(configs)
+    assert any(result["bounds"]["skipped"] for result in results)
+    for result in results:
+        m, tmax = result["config"]["m"], result["config"]["tmax"]
+        assert result["config"]["per_route"]
+        assert validate(instance, result)["feasible"]
+        fresh = SOLVERS["mtz_time"](instance, m, tmax_override=tmax, threads=1, time_limit=30)
+        assert round(result["objective"]) == round(fresh["objective"])
@@ -0,0 +1,20 @@
+import pytest
+
+pytest.importorskip("gurobipy")
+
+from gurobipy import GRB
+
+from formulations import SOLVERS
+from validate import validate
+
+
+@pytest.mark.parametrize("builder", ["loop", "matrix"])
+@pytest.mark.parametrize("lazy", [False, True])
+def test_mcf_returns_depot_routes(load, builder, lazy):
+    instance = load("pr10s2")
+    result = SOLVERS["mcf"](instance, 1, builder=builder, lazy=lazy, threads=1, time_limit=60)
+    reference = SOLVERS["gsec"](instance, 1, threads=1, time_limit=60)
+
+    assert result["status"] == GRB.OPTIMAL
+    assert validate(instance, result)["feasible"]
+    assert round(result["objective"]) == round(reference["objective"])
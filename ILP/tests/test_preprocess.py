@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("gurobipy")
+
+from gurobipy import GRB
+
+from formulations import SOLVERS
+from preprocess import solve_reduced
+from validate import validate
+
+ARC_FORMULATIONS = [name for name in SOLVERS if name != "colgen"]
+# the unreduced MCF models only fit pr10s2 under a size-limited license
+SMALL = [name for name in ARC_FORMULATIONS if not name.startswith("mcf")]
+
+CASES = [("pr10s2", 1, None, formulation) for formulation in ARC_FORMULATIONS]
+CASES += [("pr20s5", 2, 8114, formulation) for formulation in SMALL]
+CASES += [("eil15s3", 1, None, formulation) for formulation in SMALL]
+
+
+@pytest.mark.parametrize("name, m, tmax, formulation", CASES)
+def test_reduction_keeps_the_optimum(load, name, m, tmax, formulation):
+    instance = load(name)
+    tmax = tmax if tmax is not None else instance["tmax"]
+    solve = SOLVERS[formulation]
+    kwargs = dict(tmax_override=tmax, threads=1, time_limit=60)
+    full = solve(instance, m, **kwargs)
+    reduced = solve_reduced(solve, instance, m, **kwargs)
+
+    assert full["status"] == reduced["status"] == GRB.OPTIMAL
+    assert round(reduced["objective"]) == round(full["objective"])
+    assert validate(instance, reduced)["feasible"]
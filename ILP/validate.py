@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Solution validator shared by all formulations.
+
+decompose() turns the arcs of a solution into successor arrays with one
+bincount per degree and splits them into depot routes in O(|E|); arcs left
+over after walking every route from the depot are cycles that never reach
+it. validate() checks a result dict against the instance:
+  - in/out degree 1 on visited customers and 0 on the others,
+  - at most m routes, none of them a cycle without the depot,
+  - total travel time within m * tmax, and every route within tmax for
+    results of the per-route formulations (config["per_route"], see
+    modeltime.py) or within route_tmax if given,
+  - claimed clusters fully visited and the objective equal to their score,
+and reports the routes and their times. The check*_solution functions are
+thin wrappers around it.
+
+Batch mode validates stored results on a process pool, one task per
+instance so each worker loads an instance once:
+
+    python validate.py --pickles results_mtz results_scf --workers 8
+    python validate.py --store results.sqlite
+"""
+
+import argparse
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from data import load_instance
+from heuristic import route_time
+from results import ResultStore
+
+
+def decompose(num_nodes, edges):
+    """
+    Successor array, depot routes and depot-free cycles of an arc list, or an
+    error message if some node has more than one outgoing or incoming arc.
+    """
+    arcs = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    tail, head = arcs[:, 0], arcs[:, 1]
+    if len(arcs) and (arcs.min() < 1 or arcs.max() > num_nodes):
+        return None, [], [], "Arc with a node id outside the instance"
+    if np.any(tail == head):
+        return None, [], [], f"Loop at node {tail[tail == head][0]}"
+    out_deg = np.bincount(tail, minlength=num_nodes + 1)
+    in_deg = np.bincount(head, minlength=num_nodes + 1)
+    bad = np.flatnonzero((out_deg[2:] > 1) | (in_deg[2:] != out_deg[2:])) + 2
+    if len(bad):
+        i = bad[0]
+        return None, [], [], f"Node {i} degree violation (in={in_deg[i]}, out={out_deg[i]})"
+    if in_deg[1] != out_deg[1]:
+        return None, [], [], f"Depot degree violation (in={in_deg[1]}, out={out_deg[1]})"
+
+    succ = np.zeros(num_nodes + 1, dtype=np.int64)
+    from_depot = tail == 1
+    succ[tail[~from_depot]] = head[~from_depot]
+    seen = np.zeros(num_nodes + 1, dtype=bool)
+    seen[1] = True
+
+    # with in = out <= 1 on every customer, each depot arc starts a route back to the depot
+    routes = []
+    for i in head[from_depot].tolist():
+        route = []
+        while i != 1:
+            seen[i] = True
+            route.append(i)
+            i = int(succ[i])
+        routes.append(route)
+
+    cycles = []
+    for i in np.flatnonzero((succ != 0) & ~seen).tolist():
+        cycle = []
+        while not seen[i]:
+            seen[i] = True
+            cycle.append(i)
+            i = int(succ[i])
+        if cycle:
+            cycles.append(cycle)
+    return succ, routes, cycles, None
+
+
+def validate(instance, solution, route_tmax=None):
+    """
+    Full report of a result dict: 'feasible', 'reason', 'routes',
+    'route_times', 'cycles', 'total_time'.
+    """
+    num_nodes = len(instance.xy)
+    m = solution['config']['m']
+    tmax = solution['config']['tmax']
+    if route_tmax is None and solution['config'].get('per_route'):
+        route_tmax = tmax
+    report = {"feasible": False, "reason": None, "routes": [], "route_times": [], "cycles": [], "total_time": None}
+
+    succ, routes, cycles, error = decompose(num_nodes, solution['edges_used'])
+    report.update(routes=routes, cycles=cycles)
+    if error is not None:
+        report["reason"] = error
+        return report
+
+    # Degrees: the arcs define the visits, y has to agree with them
+    on_route = succ != 0
+    selected = np.zeros(num_nodes + 1, dtype=bool)
+    selected[np.asarray(solution['selected_nodes'], dtype=np.int64)] = True
+    mismatch = np.flatnonzero(on_route[2:] != selected[2:]) + 2
+    if len(mismatch):
+        i = mismatch[0]
+        state = "visited" if selected[i] else "not visited"
+        report["reason"] = f"Node {i} {state} but degree violation (in={int(on_route[i])}, out={int(on_route[i])})"
+        return report
+
+    if cycles:
+        report["reason"] = f"Subtour not connected to the depot: {cycles[0]}"
+        return report
+    if len(routes) > m:
+        report["reason"] = f"{len(routes)} routes for {m} vehicles"
+        return report
+
+    # Time
+    dist = np.asarray(instance.dist)
+    report["route_times"] = [route_time(dist, route) for route in routes]
+    report["total_time"] = sum(report["route_times"])
+    if report["total_time"] > m * tmax:
+        report["reason"] = f"Total travel time {report['total_time']} exceeds limit {m * tmax}"
+        return report
+    if route_tmax is not None:
+        for route, t in zip(routes, report["route_times"]):
+            if t > route_tmax:
+                report["reason"] = f"Route {route} takes {t} > {route_tmax}"
+                return report
+
+    # Clusters
+    claimed = np.asarray(solution['covered_clusters'], dtype=np.int64)
+    members = np.asarray(instance.cluster_nodes, dtype=np.int64)
+    owner = np.repeat(np.arange(len(instance.scores)), np.diff(instance.cluster_ptr))
+    missing = np.bincount(owner[~on_route[members]], minlength=len(instance.scores))
+    incomplete = claimed[missing[claimed] > 0]
+    if len(incomplete):
+        report["reason"] = f"Cluster {incomplete[0]} counted but not all nodes visited"
+        return report
+    score = int(np.asarray(instance.scores)[claimed].sum())
+    # scores are integral; the objective carries the solver's tolerance on z (IntFeasTol times the score)
+    if solution.get('objective') is not None and round(solution['objective']) != score:
+        report["reason"] = f"Objective {solution['objective']} differs from the claimed clusters' score {score}"
+        return report
+
+    report["feasible"] = True
+    return report
+
+
+def check_solution(instance, solution, label, route_tmax=None):
+    """(feasible, reason) as returned by the check*_solution functions."""
+    report = validate(instance, solution, route_tmax)
+    if report["feasible"]:
+        return True, f"{label} solution is feasible"
+    return False, report["reason"]
+
+
+def _instance_path(instance_dir, name):
+    return os.path.join(instance_dir, f"{name}.data")
+
+
+def _validate_pickles(instance_dir, name, paths):
+    instance = load_instance(_instance_path(instance_dir, name))
+    rows = []
+    for path in paths:
+        with open(path, "rb") as f:
+            result = pickle.load(f)
+        report = validate(instance, result)
+        rows.append({"source": path, "feasible": report["feasible"], "reason": report["reason"],
+                     "route_times": report["route_times"]})
+    return rows
+
+
+def _validate_store(instance_dir, name, store_path, rows):
+    instance = load_instance(_instance_path(instance_dir, name))
+    store = ResultStore(store_path)
+    checked = []
+    for row in rows:
+        # Stored routes keep only depot routes, so a solution with subtours fails the objective check
+        tours = store.tours(row["id"])
+        edges = [(i, j) for route in tours.routes() for i, j in zip([1] + route, route + [1])]
+        config = dict(row["extra"].get("config", {}), m=row["m"], tmax=row["tmax"])
+        result = {"config": config, "edges_used": edges,
+                  "selected_nodes": tours.visited().tolist(),
+                  "covered_clusters": tours.covered_clusters(instance).tolist(), "objective": row["objective"]}
+        report = validate(instance, result)
+        checked.append({"source": f"{store_path}#{row['id']}", "feasible": report["feasible"],
+                        "reason": report["reason"], "route_times": report["route_times"]})
+    return checked
+
+
+def validate_pickles(folders, instance_dir="instances", workers=None):
+    """Validate the result pickles in folders (as written by main*.py / sweep.py)."""
+    by_instance = {}
+    for folder in folders:
+        formulation = os.path.basename(os.path.normpath(folder)).split("_", 1)[1]
+        for filename in sorted(os.listdir(folder)):
+            if filename.endswith(".pkl"):
+                name = filename.split(f"_{formulation}_")[0]
+                by_instance.setdefault(name, []).append(os.path.join(folder, filename))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_validate_pickles, instance_dir, name, paths) for name, paths in by_instance.items()]
+        return [row for future in futures for row in future.result()]
+
+
+def validate_store(store_path, instance_dir="instances", workers=None, latest=True):
+    """Validate the rows of a results.ResultStore (only the newest per key with latest=True)."""
+    df = ResultStore(store_path).load(latest=latest, extra=True)
+    df = df[df["objective"].notna()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_validate_store, instance_dir, name, store_path, group.to_dict("records"))
+                   for name, group in df.groupby("instance")]
+        return [row for future in futures for row in future.result()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", default="instances")
+    parser.add_argument("--pickles", nargs="*", default=[], help="result folders, e.g. results_mtz")
+    parser.add_argument("--store", default=None, help="results database (results.py)")
+    parser.add_argument("--all-rows", action="store_true", help="with --store, check every row, not only the latest")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    rows = []
+    if args.pickles:
+        rows += validate_pickles(args.pickles, args.instances, args.workers)
+    if args.store:
+        rows += validate_store(args.store, args.instances, args.workers, latest=not args.all_rows)
+    failed = [row for row in rows if not row["feasible"]]
+    for row in failed:
+        print(f"{row['source']}: {row['reason']}")
+    print(f"{len(rows) - len(failed)}/{len(rows)} solutions feasible")
+
+
+if __name__ == "__main__":
+    main()